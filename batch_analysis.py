@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Wsadowa analiza katalogu zdjęć z pomijaniem prawie-duplikatów.
+
+Każde zdjęcie trafia do historii SQLite (tej samej co aplikacja). Zdjęcie
+już analizowane (ten sam SHA-256) jest pomijane, a zdjęcie w odległości
+dHash <= --max-distance od przeanalizowanego przejmuje jego wynik bez
+detekcji i klasyfikacji - w historii z kolumną deduped_from wskazującą
+źródło. Indeks duplikatów rośnie w trakcie przetwarzania wsadu.
+iter_batch jest też używany przez zadania wsadowe aplikacji (job_queue.py).
+Zdjęcia bez twarzy (kaskada detekcji z face_detection.py) nie są klasyfikowane.
+Z --gallery kopie zdjęć z twarzami trafiają do galerii aplikacji (gallery.py).
+
+Użycie:
+    python batch_analysis.py zdjecia/ --max-distance 6 --min-confidence 0.5 --csv wyniki.csv --gallery
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+os.environ.setdefault('TF_USE_LEGACY_KERAS', '1')
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '-1')
+
+import cv2
+import numpy as np
+
+from dedup_index import DEFAULT_MAX_DISTANCE, DedupSource, NearDuplicateIndex, dhash, rescale_faces, to_sqlite
+from face_detection import DETECTOR_CASCADE, detector_key
+from gallery import SourceImages
+from history_store import DEFAULT_DB_PATH, HistoryStore, image_hash
+from image_files import collect_images
+from tiered_engine import TieredEmotionEngine, get_engine
+
+
+def iter_batch(paths: Sequence[str],
+               store: HistoryStore,
+               index: NearDuplicateIndex,
+               engine: TieredEmotionEngine,
+               detector: str = DETECTOR_CASCADE,
+               min_confidence: float = 0.0,
+               sources: Optional[SourceImages] = None) -> Iterator[Dict[str, Any]]:
+    """Analizuje kolejne zdjęcia (pełnym modelem); zwraca wiersz wyniku per zdjęcie.
+
+    Status: 'analiza' (detekcja i klasyfikacja), 'duplikat' (wynik przejęty
+    z prawie-duplikatu), 'historia' (ten sam plik był już analizowany)
+    lub 'błąd' (nie da się zdekodować). Z sources kopie zdjęć z twarzami
+    zasilają galerię.
+    """
+    key = detector_key(detector, min_confidence)
+    for path in paths:
+        with open(path, 'rb') as image_file:
+            image_bytes = image_file.read()
+        content_hash = image_hash(image_bytes)
+        row: Dict[str, Any] = {'file': os.path.basename(path), 'image_hash': content_hash, 'status': '',
+                               'deduped_from': None, 'distance': None, 'faces': 0, 'dominant_emotion': '', 'ms': 0.0}
+        start = time.perf_counter()
+        faces = store.lookup(content_hash, key)
+        if faces is not None:
+            row['status'] = 'historia'
+        else:
+            img_bgr = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if img_bgr is None:
+                row['status'] = 'błąd'
+                yield row
+                continue
+            image_size = (img_bgr.shape[1], img_bgr.shape[0])
+            perceptual_hash = dhash(img_bgr)
+            match = index.find(key, perceptual_hash)
+            source_faces = store.lookup(match.source.image_hash, key) if match else None
+            if source_faces is not None:
+                faces = rescale_faces(source_faces, match.source, *image_size)
+                store.record(content_hash, faces, key, perceptual_hash=to_sqlite(perceptual_hash),
+                             image_size=image_size, deduped_from=match.source.image_hash)
+                row.update(status='duplikat', deduped_from=match.source.image_hash, distance=match.distance)
+            else:
+                faces, _ = engine.analyze(img_bgr, detector, min_confidence)
+                store.record(content_hash, faces, key, latency_ms=1000 * (time.perf_counter() - start),
+                             perceptual_hash=to_sqlite(perceptual_hash), image_size=image_size)
+                if len(faces):
+                    # Bez twarzy nie ma wiersza w historii - taki obraz nie może być źródłem duplikatów
+                    index.add(key, perceptual_hash, DedupSource(content_hash, *image_size))
+                row['status'] = 'analiza'
+            if sources is not None and len(faces):
+                sources.put(content_hash, img_bgr)
+        row['ms'] = round(1000 * (time.perf_counter() - start), 1)
+        row['faces'] = len(faces)
+        if len(faces):
+            row['dominant_emotion'] = faces[0].dominant_emotion
+        yield row
+
+
+def summarize(rows: Sequence[Dict[str, Any]]) -> Dict[str, int]:
+    return {status: sum(row['status'] == status for row in rows)
+            for status in ('analiza', 'duplikat', 'historia', 'błąd')}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Wsadowa analiza zdjęć z indeksem prawie-duplikatów")
+    parser.add_argument('images', nargs='+', help="Pliki obrazów lub katalogi")
+    parser.add_argument('--detector', default=DETECTOR_CASCADE,
+                        help="Kaskada (Haar, potem MTCNN/RetinaFace) albo backend DeepFace, np. opencv")
+    parser.add_argument('--min-confidence', type=float, default=0.5, help="Próg pewności ramek twarzy 0-1 (kaskada)")
+    parser.add_argument('--max-distance', type=int, default=DEFAULT_MAX_DISTANCE,
+                        help="Maksymalna odległość Hamminga dHash (0 = bez pomijania duplikatów)")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="Baza historii SQLite")
+    parser.add_argument('--csv', help="Zapisz wynik per zdjęcie do pliku CSV")
+    parser.add_argument('--gallery', action='store_true', help="Zapisz kopie zdjęć do galerii aplikacji")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.db)
+    index = NearDuplicateIndex.from_entries(store.iter_dedup_entries(), max_distance=args.max_distance)
+    engine = get_engine()
+    if not engine.wait_for_full():
+        print(f"❌ Pełny model DeepFace niedostępny: {engine.full_error}", file=sys.stderr)
+        return 1
+
+    rows: List[Dict[str, Any]] = []
+    sources = SourceImages() if args.gallery else None
+    for row in iter_batch(collect_images(args.images), store, index, engine, args.detector, args.min_confidence,
+                          sources):
+        rows.append(row)
+        print(f"{row['status']:<10}{row['ms']:>9.1f} ms  {row['dominant_emotion']:<10}{row['file']}"
+              + (f"  ← {row['deduped_from'][:12]} (d={row['distance']})" if row['deduped_from'] else ''),
+              flush=True)
+
+    if args.csv and rows:
+        with open(args.csv, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    counts = summarize(rows)
+    print(f"Zdjęcia: {len(rows)} • przeanalizowane: {counts['analiza']} • prawie-duplikaty: {counts['duplikat']} "
+          f"• z historii: {counts['historia']}")
+    analysis_ms = [row['ms'] for row in rows if row['status'] == 'analiza']
+    if analysis_ms and counts['duplikat']:
+        saved = counts['duplikat'] * float(np.mean(analysis_ms)) / 1000
+        print(f"Pominięte przebiegi detekcji i klasyfikacji: {counts['duplikat']} (~{saved:.1f} s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Parametry przechwytywania kamery (WebRTC) wybierane po stronie serwera.
+
+Przeglądarka domyślnie wysyła wideo w pełnej rozdzielczości i z pełną liczbą
+klatek, a serwer dekoduje i konwertuje każdą klatkę, choć analizuje tylko
+około jednej na sekundę. Tutaj poziom jakości przechwytywania jest dobierany
+z bieżącego obciążenia węzła (load average na rdzeń oraz liczba aktywnych
+strumieni) i przekazywany do przeglądarki jako media_stream_constraints.
+Koszt przyjmowania klatek jest mierzony per strumień.
+"""
+import os
+import threading
+import time
+from bisect import bisect_right
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+class CaptureTier(NamedTuple):
+    """Poziom jakości przechwytywania"""
+    name: str
+    width: int
+    height: int
+    frame_rate: int
+
+
+# Od najlepszej jakości do najtańszej. Twarz i tak jest skalowana do 48x48,
+# a detektor Haara radzi sobie już przy 320x240 dla twarzy blisko kamery.
+CAPTURE_TIERS = (
+    CaptureTier('wysoka', 1280, 720, 30),
+    CaptureTier('standardowa', 640, 480, 15),
+    CaptureTier('oszczędna', 320, 240, 10),
+)
+
+# Progi obciążenia (0 = bezczynny, 1 = w pełni zajęty) między kolejnymi poziomami
+LOAD_THRESHOLDS = (0.5, 0.85)
+
+# Liczba jednoczesnych strumieni, przy której węzeł uznajemy za w pełni zajęty
+MAX_STREAMS = int(os.environ.get('EMOCJE_MAX_STREAMS', '4'))
+
+# EMOCJE_ADAPTIVE_CAPTURE=0 przywraca pełne parametry przeglądarki (do porównań)
+ADAPTIVE_CAPTURE = os.environ.get('EMOCJE_ADAPTIVE_CAPTURE', '1') != '0'
+
+# Jak często analizować emocje niezależnie od liczby klatek na sekundę
+ANALYSIS_INTERVAL_SECONDS = 1.0
+DEFAULT_ANALYZE_EVERY_N_FRAMES = 30
+
+
+def cpu_load() -> float:
+    """Średnie obciążenie z ostatniej minuty na rdzeń (0 gdy niedostępne)"""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return 0.0
+
+
+class IngestStats:
+    """Koszt przyjmowania klatek jednego strumienia (konwersje klatek w recv i rozmiar klatek)"""
+
+    __slots__ = ('tier', 'started', 'frames', 'seconds', 'width', 'height')
+
+    def __init__(self, tier: Optional[CaptureTier]):
+        self.tier = tier
+        self.started = time.time()
+        self.frames = 0
+        self.seconds = 0.0
+        self.width = 0
+        self.height = 0
+
+    def observe(self, seconds: float, width: int, height: int) -> None:
+        self.frames += 1
+        self.seconds += seconds
+        self.width = width
+        self.height = height
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = max(time.time() - self.started, 1e-6)
+        return {
+            'Poziom': self.tier.name if self.tier is not None else 'pełny (bez ograniczeń)',
+            'Rozdzielczość': f"{self.width}x{self.height}",
+            'FPS': round(self.frames / elapsed, 1),
+            'Przyjęcie klatki (ms)': round(1000 * self.seconds / self.frames, 2) if self.frames else 0.0,
+            # Ile milisekund CPU na sekundę strumienia zajmuje samo przyjmowanie klatek
+            'CPU (ms/s)': round(1000 * self.seconds / elapsed, 1),
+        }
+
+
+class StreamRegistry:
+    """Aktywne strumienie w procesie - liczba strumieni wchodzi do oceny obciążenia"""
+
+    def __init__(self):
+        self._streams: List[IngestStats] = []
+        self._lock = threading.Lock()
+
+    def register(self, tier: Optional[CaptureTier]) -> IngestStats:
+        stats = IngestStats(tier)
+        with self._lock:
+            self._streams.append(stats)
+        return stats
+
+    def unregister(self, stats: IngestStats) -> None:
+        with self._lock:
+            if stats in self._streams:
+                self._streams.remove(stats)
+
+    def active_count(self) -> int:
+        with self._lock:
+            return len(self._streams)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [stats.summary() for stats in self._streams]
+
+
+# Wspólny rejestr procesu
+STREAMS = StreamRegistry()
+
+
+def load_score(active_streams: int) -> float:
+    """Obciążenie węzła: większa z wartości load average na rdzeń i zajętości slotów strumieni"""
+    return max(cpu_load(), active_streams / max(MAX_STREAMS, 1))
+
+
+def choose_tier(load: float) -> CaptureTier:
+    return CAPTURE_TIERS[bisect_right(LOAD_THRESHOLDS, load)]
+
+
+def current_tier(registry: StreamRegistry = STREAMS) -> Optional[CaptureTier]:
+    """Poziom dla nowego strumienia (None gdy adaptacja jest wyłączona)"""
+    if not ADAPTIVE_CAPTURE:
+        return None
+    # Nowy strumień też zajmie slot, więc liczymy go z góry
+    return choose_tier(load_score(registry.active_count() + 1))
+
+
+def media_stream_constraints(tier: Optional[CaptureTier]) -> Dict[str, Any]:
+    """Ograniczenia getUserMedia dla przeglądarki"""
+    if tier is None:
+        return {"video": True, "audio": False}
+    return {
+        "video": {
+            "width": {"ideal": tier.width, "max": tier.width},
+            "height": {"ideal": tier.height, "max": tier.height},
+            "frameRate": {"ideal": tier.frame_rate, "max": tier.frame_rate},
+        },
+        "audio": False,
+    }
+
+
+def analyze_every_n_frames(tier: Optional[CaptureTier]) -> int:
+    """Co ile klatek analizować, by utrzymać stały odstęp czasu między analizami"""
+    if tier is None:
+        return DEFAULT_ANALYZE_EVERY_N_FRAMES
+    return max(1, int(round(tier.frame_rate * ANALYSIS_INTERVAL_SECONDS)))
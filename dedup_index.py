@@ -0,0 +1,142 @@
+"""
+Indeks prawie-duplikatów zdjęć oparty na 64-bitowym dHash i drzewie BK.
+
+Zdjęcia seryjne, ponowne eksporty i przeskalowane kopie mają prawie ten
+sam dHash (różnica kilku bitów), choć ich skróty SHA-256 są różne. Indeks
+jest budowany przy przyjmowaniu zdjęć: dla każdego przeanalizowanego
+obrazu zapamiętuje (dHash, skrót źródła, rozmiar), a obraz w odległości
+Hamminga <= max_distance od już przeanalizowanego przejmuje jego wynik -
+bez detekcji i klasyfikacji. Indeks jest odtwarzany z historii SQLite.
+"""
+import os
+import threading
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from emotion_engine import EmotionBatch
+
+# Maksymalna odległość Hamminga (z 64 bitów) uznawana za ten sam kadr; 0 wyłącza indeks
+DEFAULT_MAX_DISTANCE = int(os.environ.get('EMOCJE_DEDUP_MAX_DISTANCE', '8'))
+
+_HASH_BITS = 64
+_BIT_WEIGHTS = 1 << np.arange(_HASH_BITS, dtype=np.uint64)
+
+
+def dhash(img: np.ndarray) -> int:
+    """64-bitowy hash różnicowy: znak różnicy sąsiednich pikseli miniatury 9x8"""
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(_BIT_WEIGHTS[bits].sum())
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def to_sqlite(value: int) -> int:
+    """Hash bez znaku -> INTEGER SQLite (64 bity ze znakiem)"""
+    return value - (1 << _HASH_BITS) if value >= 1 << (_HASH_BITS - 1) else value
+
+
+def from_sqlite(value: int) -> int:
+    return value + (1 << _HASH_BITS) if value < 0 else value
+
+
+class DedupSource(NamedTuple):
+    """Przeanalizowany obraz, którego wynik może zostać przejęty"""
+    image_hash: str
+    width: int
+    height: int
+
+
+class DedupMatch(NamedTuple):
+    source: DedupSource
+    distance: int
+
+
+class BKTree:
+    """Drzewo BK w metryce Hamminga; węzeł to [hash, źródło, {odległość: dziecko}]"""
+
+    def __init__(self):
+        self._root: Optional[list] = None
+        self.size = 0
+
+    def add(self, value: int, source: DedupSource) -> None:
+        if self._root is None:
+            self._root = [value, source, {}]
+            self.size = 1
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                return  # Ten sam hash - zostaje pierwsze źródło
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, source, {}]
+                self.size += 1
+                return
+            node = child
+
+    def nearest(self, value: int, max_distance: int) -> Optional[DedupMatch]:
+        """Najbliższy element w odległości <= max_distance (nierówność trójkąta przycina gałęzie)"""
+        best: Optional[DedupMatch] = None
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance and (best is None or distance < best.distance):
+                best = DedupMatch(node[1], distance)
+                if distance == 0:
+                    break
+            limit = best.distance if best is not None else max_distance
+            for child_distance, child in node[2].items():
+                if distance - limit <= child_distance <= distance + limit:
+                    stack.append(child)
+        return best
+
+
+class NearDuplicateIndex:
+    """Drzewa BK per detektor (wyniki różnych detektorów nie są wymienne)"""
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._trees: Dict[str, BKTree] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Tuple[str, int, str, int, int]],
+                     max_distance: int = DEFAULT_MAX_DISTANCE) -> 'NearDuplicateIndex':
+        """Indeks z wpisów (detektor, dHash, skrót obrazu, szerokość, wysokość) - np. z historii"""
+        index = cls(max_distance)
+        for detector, value, content_hash, width, height in entries:
+            index.add(detector, from_sqlite(value), DedupSource(content_hash, width or 0, height or 0))
+        return index
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_distance > 0
+
+    def __len__(self) -> int:
+        return sum(tree.size for tree in self._trees.values())
+
+    def add(self, detector: str, value: int, source: DedupSource) -> None:
+        with self._lock:
+            self._trees.setdefault(detector, BKTree()).add(value, source)
+
+    def find(self, detector: str, value: int) -> Optional[DedupMatch]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            tree = self._trees.get(detector)
+            return tree.nearest(value, self.max_distance) if tree is not None else None
+
+
+def rescale_faces(faces: EmotionBatch, source: DedupSource, width: int, height: int) -> EmotionBatch:
+    """Wynik źródła z ramkami przeliczonymi na rozmiar duplikatu (np. przeskalowanej kopii)"""
+    scale_x = width / source.width if source.width else 1.0
+    scale_y = height / source.height if source.height else 1.0
+    return faces.rescaled(scale_x, scale_y)
@@ -0,0 +1,48 @@
+"""
+Obrazy do wyświetlenia w przeglądarce: pomniejszone i zakodowane raz.
+
+st.image z tablicą NumPy lub pełnym plikiem koduje obraz od nowa przy
+każdym przeładowaniu i wysyła go w pełnej rozdzielczości, choć kolumna ma
+kilkaset pikseli szerokości. Tutaj obraz jest skalowany do szerokości
+wyświetlania i kodowany do JPEG - takie bajty Streamlit przekazuje dalej
+bez ponownego kodowania (WebP przekodowałby do JPEG przy każdym przebiegu).
+Pełna rozdzielczość jest dostępna osobno, do pobrania na żądanie.
+"""
+import os
+
+import cv2
+import numpy as np
+
+# Szerokość wyświetlania w pikselach (kolumna [1, 2, 1] w układzie "wide", z zapasem na ekrany HiDPI)
+DISPLAY_MAX_WIDTH = int(os.environ.get('EMOCJE_DISPLAY_WIDTH', '800'))
+DISPLAY_JPEG_QUALITY = 85
+
+
+def downscale(img: np.ndarray, max_width: int = DISPLAY_MAX_WIDTH) -> np.ndarray:
+    """Pomniejsza obraz do max_width (INTER_AREA); mniejszych nie powiększa"""
+    height, width = img.shape[:2]
+    if width <= max_width:
+        return img
+    return cv2.resize(img, (max_width, max(1, round(height * max_width / width))), interpolation=cv2.INTER_AREA)
+
+
+def encode_display_jpeg(img: np.ndarray,
+                        max_width: int = DISPLAY_MAX_WIDTH,
+                        quality: int = DISPLAY_JPEG_QUALITY,
+                        rgb: bool = False) -> bytes:
+    """Obraz BGR (lub RGB przy rgb=True) jako JPEG w rozmiarze wyświetlania"""
+    small = downscale(img, max_width)
+    if rgb:
+        small = cv2.cvtColor(small, cv2.COLOR_RGB2BGR)
+    ok, encoded = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Nie udało się zakodować obrazu do JPEG")
+    return encoded.tobytes()
+
+
+def encode_png(img: np.ndarray, rgb: bool = False) -> bytes:
+    """Pełna rozdzielczość bez strat - do pobrania"""
+    ok, encoded = cv2.imencode('.png', cv2.cvtColor(img, cv2.COLOR_RGB2BGR) if rgb else img)
+    if not ok:
+        raise ValueError("Nie udało się zakodować obrazu do PNG")
+    return encoded.tobytes()
@@ -31,17 +31,23 @@ try:
     # Try to force headless mode for cv2
     import cv2
     
-    from deepface import DeepFace
-    
     import matplotlib.pyplot as plt
     plt.switch_backend('Agg')  # Use non-interactive backend for stability
     
     import cv2
     
+    import functools
+    import io
     import numpy as np
+    import shutil
     import tempfile
     from PIL import Image, ImageDraw, ImageFont
     import matplotlib.patches as patches
+    import threading
+    import time
+    
+    from capture_policy import STREAMS, analyze_every_n_frames, current_tier, load_score, media_stream_constraints
+    from emotion_history import EmotionHistory
     
     # Import with type stubs for optional webrtc
     try:
@@ -49,90 +55,8 @@ try:
         import av
         WEBRTC_AVAILABLE = True
         
-        # Define the real VideoProcessor when webrtc is available
-        class VideoProcessor(VideoTransformerBase):  # type: ignore
-            """Klasa do przetwarzania wideo z kamery w czasie rzeczywistym"""
-            
-            def __init__(self):
-                self.frame_count = 0
-                self.analyze_every_n_frames = 30  # Analizuj co 30 klatek (około sekundy przy 30 FPS)
-            
-            def recv(self, frame):
-                global latest_emotion_result, emotion_lock
-                
-                img = frame.to_ndarray(format="bgr24")
-                
-                # Analizuj emocje co N klatek żeby nie obciążać procesora
-                if self.frame_count % self.analyze_every_n_frames == 0:
-                    try:
-                        # Zapisz klatkę tymczasowo
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-                            cv2.imwrite(tmp_file.name, img)
-                            
-                            # Analizuj emocje (szybko, bez enforce_detection) with error handling
-                            try:
-                                result = DeepFace.analyze(
-                                    tmp_file.name, 
-                                    actions=['emotion'], 
-                                    enforce_detection=False,
-                                    silent=True,
-                                    detector_backend='opencv'  # Use stable backend
-                                )
-                                
-                                # Zapisz wynik
-                                with emotion_lock:
-                                    if isinstance(result, list):
-                                        latest_emotion_result = result[0]
-                                    else:
-                                        latest_emotion_result = result
-                            except Exception:
-                                # Silently handle analysis errors in real-time mode
-                                pass
-                            
-                            # Usuń plik tymczasowy
-                            os.unlink(tmp_file.name)
-                            
-                    except Exception as e:
-                        pass  # Zignoruj błędy analizy
-                
-                # Jeśli mamy wynik analizy, narysuj na obrazie
-                with emotion_lock:
-                    if latest_emotion_result is not None:
-                        try:
-                            emotions = latest_emotion_result.get('emotion', {})  # type: ignore
-                            face_region = latest_emotion_result.get('region', {})  # type: ignore
-                            
-                            if emotions and face_region:
-                                # Znajdź dominującą emocję
-                                dominant_emotion = max(emotions.items(), key=lambda x: x[1])
-                                
-                                # Narysuj prostokąt wokół twarzy
-                                x, y, w, h = face_region.get('x', 0), face_region.get('y', 0), face_region.get('w', 0), face_region.get('h', 0)
-                                if x > 0 and y > 0 and w > 0 and h > 0:
-                                    cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                                    
-                                    # Dodaj tekst z emocją
-                                    emotion_emoji = {
-                                        'happy': '😊', 'sad': '😢', 'angry': '😠', 'surprise': '😮', 
-                                        'fear': '😨', 'disgust': '🤢', 'neutral': '😐'
-                                    }
-                                    emoji = emotion_emoji.get(dominant_emotion[0], '🎭')
-                                    label = f"{dominant_emotion[0]}: {dominant_emotion[1]:.1f}%"  # Usunąłem emoji bo może nie działać w OpenCV
-                                    
-                                    # Rysuj tło dla tekstu
-                                    font = cv2.FONT_HERSHEY_SIMPLEX
-                                    font_scale = 0.6
-                                    thickness = 2
-                                    (text_width, text_height), _ = cv2.getTextSize(label, font, font_scale, thickness)
-                                    
-                                    cv2.rectangle(img, (x, y - text_height - 10), (x + text_width, y), (0, 255, 0), -1)
-                                    cv2.putText(img, label, (x, y - 5), font, font_scale, (0, 0, 0), thickness)
-                            
-                        except Exception as e:
-                            pass  # Zignoruj błędy rysowania
-                
-                self.frame_count += 1
-                return av.VideoFrame.from_ndarray(img, format="bgr24")
+        # Procesor klatek jest w osobnym module, żeby dało się go używać bez aplikacji (np. w load_test.py)
+        from live_processor import VideoProcessor
         
     except ImportError:
         WEBRTC_AVAILABLE = False
@@ -143,9 +67,13 @@ try:
             pass
             
         class VideoProcessor:
-            def __init__(self):
+            def __init__(self, capture_tier=None):
                 self.frame_count = 0
-                self.analyze_every_n_frames = 30
+                self.analyze_every_n_frames = analyze_every_n_frames(capture_tier)
+                self.latest_emotion_result = None
+                self.emotion_lock = threading.Lock()
+                self.history = EmotionHistory()
+                self.ingest = None
                 
         class RTCConfiguration:
             def __init__(self, *args, **kwargs):
@@ -154,9 +82,7 @@ try:
         def webrtc_streamer(*args, **kwargs):
             return None
     
-    import threading
-    import time
-    from typing import Optional, Dict, Any, Tuple
+    from typing import Optional, Dict, Any, List, Tuple, Callable, Iterable
     
 except ImportError as e:
     st.error(f"❌ Import error: {e}")
@@ -178,30 +104,225 @@ except Exception as e:
     st.error(f"❌ Unexpected error: {e}")
     st.stop()
 
+from memory_manager import MemoryManager, get_memory_breakdown
+from profiling import PROFILING_ENABLED, profile_block
+from export import EXPORT_FORMATS, PARQUET_AVAILABLE, arrow_schema, available_formats, export_bytes
+from metrics import REGISTRY as metrics, set_readiness_probe, start_metrics_server
+from emotion_engine import EMOTION_LABELS, EmotionResult
+from face_detection import DETECTOR_CASCADE, detector_key
+from tiered_engine import SOURCE_SHARED, SOURCE_SNAPSHOT, TIER_FULL, TIER_LIGHT, TieredEmotionEngine, get_engine
+from video_analysis import DEFAULT_SAMPLE_FPS, analyze_video
+from history_store import HistoryStore, image_hash
+from dedup_index import DedupSource, NearDuplicateIndex, dhash, rescale_faces, to_sqlite
+from display_images import encode_display_jpeg, encode_png
+from job_queue import ACTIVE_STATUSES, CANCELLED, DONE, FAILED, JobQueue
+from batch_analysis import iter_batch, summarize
+from gallery import GALLERY_COLUMNS, GALLERY_PAGE_SIZE, SourceImages, face_thumbnail, page_count
+
 # Memory management functions
-def cleanup_memory():
-    """Clean up memory to prevent segmentation faults"""
-    gc.collect()
-    plt.close('all')
-
-@st.cache_data(show_spinner=False)
-def load_deepface_model():
-    """Preload DeepFace model with caching"""
+@st.cache_resource(show_spinner=False)
+def get_memory_manager() -> MemoryManager:
+    """Shared memory manager (RSS watermarks + optional tracemalloc)"""
+    return MemoryManager()
+
+memory_manager = get_memory_manager()
+
+@st.cache_resource(show_spinner=False)
+def get_metrics_server():
+    """Prometheus /metrics endpoint - the one prefork.py started with the process, else started here (dev runs)"""
+    return start_metrics_server()
+
+get_metrics_server()
+
+@st.cache_resource(show_spinner=False)
+def get_emotion_engine() -> TieredEmotionEngine:
+    """Lekki model NumPy od razu, DeepFace ładowany i rozgrzewany w tle"""
+    return get_engine()
+
+analysis_engine = get_emotion_engine()
+
+@st.cache_resource(show_spinner=False)
+def get_history_store() -> HistoryStore:
+    """Persistent analysis history (SQLite), shared by all sessions"""
+    return HistoryStore()
+
+history_store = get_history_store()
+
+@st.cache_resource(show_spinner=False)
+def get_dedup_index() -> NearDuplicateIndex:
+    """Indeks prawie-duplikatów (dHash + drzewo BK) odtworzony z historii"""
+    return NearDuplicateIndex.from_entries(history_store.iter_dedup_entries())
+
+dedup_index = get_dedup_index()
+
+# Detektor używany przy analizie zdjęć (kaskada Haar -> MTCNN/RetinaFace) - z progiem pewności część klucza historii
+ANALYSIS_DETECTOR = DETECTOR_CASCADE
+
+# Pomniejszone kopie analizowanych zdjęć z twarzami - źródło miniatur galerii
+gallery_sources = SourceImages()
+
+# Pliki zadań w tle (nagrania, zdjęcia wsadu) - nazwane skrótem zawartości
+JOBS_DIR = os.environ.get('EMOCJE_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'emocje_jobs'))
+JOB_PRIORITIES = {"niski": -1, "normalny": 0, "wysoki": 1}
+JOB_STATUS_LABELS = {'queued': "⏳ w kolejce", 'running': "⚙️ w toku", DONE: "✅ gotowe",
+                     FAILED: "❌ błąd", CANCELLED: "✖️ anulowane"}
+
+# Emoji i kolory kart emocji - w kolejności EMOTION_LABELS (indeks = EmotionResult.dominant)
+EMOTION_EMOJI = ('😠', '🤢', '😨', '😊', '😢', '😮', '😐')
+EMOTION_COLORS = ('#dc3545', '#20c997', '#6c757d', '#28a745', '#6f42c1', '#ffc107', '#17a2b8')
+
+def run_video_job(params: Dict[str, Any], report: Callable[[float], None]) -> Dict[str, Any]:
+    """Zadanie w tle: oś czasu emocji dla nagrania"""
     try:
-        # Trigger model loading with a dummy analysis
-        import numpy as np
-        dummy_img = np.zeros((224, 224, 3), dtype=np.uint8)
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-            cv2.imwrite(tmp_file.name, dummy_img)
-            try:
-                DeepFace.analyze(tmp_file.name, actions=['emotion'], enforce_detection=False, silent=True)
-            except:
-                pass
-            finally:
-                os.unlink(tmp_file.name)
-        return True
-    except Exception:
-        return False
+        result = analyze_video(params['path'], analysis_engine.classification_model(),
+                               sample_fps=params['sample_fps'], progress_callback=report)
+    finally:
+        shutil.rmtree(params['dir'], ignore_errors=True)
+    return {
+        'timeline': result['timeline'].rows(),
+        'video_seconds': result['video_seconds'],
+        'sampled_frames': result['sampled_frames'],
+        'throughput': result['throughput'],
+    }
+
+def run_batch_job(params: Dict[str, Any], report: Callable[[float], None]) -> Dict[str, Any]:
+    """Zadanie w tle: wsad zdjęć z pomijaniem prawie-duplikatów (wyniki trafiają do historii)"""
+    paths = params['paths']
+    try:
+        if not analysis_engine.wait_for_full():
+            raise RuntimeError(f"Pełny model DeepFace niedostępny: {analysis_engine.full_error}")
+        rows = []
+        for row in iter_batch(paths, history_store, dedup_index, analysis_engine, ANALYSIS_DETECTOR,
+                              params['min_confidence'], gallery_sources):
+            row['file'] = params['names'].get(row['file'], row['file'])
+            rows.append(row)
+            report(len(rows) / len(paths))
+    finally:
+        shutil.rmtree(params['dir'], ignore_errors=True)
+    return {'rows': rows, 'counts': summarize(rows)}
+
+@st.cache_resource(show_spinner=False)
+def get_job_queue() -> JobQueue:
+    """Kolejka zadań w tle (SQLite obok historii) z wątkami roboczymi procesu"""
+    queue = JobQueue(history_store.path, workers=int(os.environ.get('EMOCJE_JOB_WORKERS', '1')))
+    queue.register('video', run_video_job)
+    queue.register('batch', run_batch_job)
+    queue.start()
+    # Sonda /ready raportuje też głębokość kolejki zadań
+    set_readiness_probe(lambda: {**analysis_engine.readiness(), 'queued_jobs': queue.queue_depth()})
+    return queue
+
+job_queue = get_job_queue()
+
+def job_directory(key: str) -> str:
+    """Katalog plików jednego zadania - usuwany przez zadanie po zakończeniu"""
+    directory = os.path.join(JOBS_DIR, image_hash(key.encode('utf-8'))[:16])
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def save_job_file(directory: str, name: str, uploaded: Any) -> str:
+    """Zapisuje przesłany plik kawałkami (OpenCV i wątki robocze wymagają ścieżki)"""
+    path = os.path.join(directory, name)
+    uploaded.seek(0)
+    with open(path, 'wb') as job_file:
+        shutil.copyfileobj(uploaded, job_file, length=1024 * 1024)
+    return path
+
+def submit_job(kind: str, key: str, priority: int, params_factory: Callable[[str], Dict[str, Any]]) -> str:
+    """Zgłasza zadanie, chyba że to samo (ten sam klucz) już czeka, trwa lub się zakończyło.
+
+    Pliki zadania są zapisywane dopiero, gdy zadanie faktycznie trafia do kolejki.
+    """
+    existing = job_queue.find(key)
+    if existing is not None and existing['status'] not in (FAILED, CANCELLED):
+        return existing['id']
+    return job_queue.submit(kind, params_factory(job_directory(key)), key=key, priority=priority)
+
+@st.fragment(run_every=1.0)
+def render_job_progress(job_id: str, label: str) -> None:
+    """Postęp zadania odpytywany co sekundę - bez blokowania skryptu"""
+    job = job_queue.get(job_id)
+    if job is None or job['status'] not in ACTIVE_STATUSES:
+        # Zadanie się zakończyło - pełny przebieg pokaże wynik
+        st.rerun()
+    st.progress(job['progress'], text=f"{label} • {JOB_STATUS_LABELS[job['status']]} • {job['progress']:.0%}")
+    if st.button("✖️ Anuluj", key=f"cancel_{job_id}"):
+        job_queue.cancel(job_id)
+        st.rerun()
+
+def render_job_outcome(job: Optional[Dict[str, Any]], label: str) -> Optional[Dict[str, Any]]:
+    """Wynik zakończonego zadania albo postęp / komunikat; None gdy wyniku (jeszcze) nie ma"""
+    if job is None:
+        return None
+    if job['status'] in ACTIVE_STATUSES:
+        render_job_progress(job['id'], label)
+        st.caption("Analiza trwa w tle - możesz zmieniać ustawienia lub przejść do innej zakładki")
+        return None
+    if job['status'] == FAILED:
+        st.error(f"Błąd zadania: {job['error']}")
+        return None
+    if job['status'] == CANCELLED:
+        st.info("Zadanie zostało anulowane")
+        return None
+    return job['result']
+
+# Sortowanie galerii: etykieta -> (klucz HistoryStore.query_faces, malejąco)
+GALLERY_SORT_OPTIONS = {
+    "Pewność: od najwyższej": ('confidence', True),
+    "Pewność: od najniższej": ('confidence', False),
+    "Emocja": ('emotion', False),
+    "Najnowsze": ('newest', True),
+}
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def count_gallery_faces(emotion: Optional[str], min_confidence: int, image_hashes: Optional[List[str]],
+                        latest_id: int) -> int:
+    """Liczba twarzy dla filtrów - liczona ponownie dopiero po nowym zapisie w historii"""
+    return history_store.count_faces(emotion, min_confidence, image_hashes)
+
+@st.cache_data(show_spinner=False, max_entries=1024)
+def face_thumbnail_jpeg(content_hash: str, box: Tuple[int, int, int, int], image_width: Optional[int]) -> Optional[bytes]:
+    """Miniatura twarzy - wycinana dopiero, gdy trafi na widoczną stronę galerii"""
+    source = gallery_sources.load(content_hash)
+    if source is None:
+        return None
+    with metrics.time('thumbnail'):
+        return face_thumbnail(source, box, image_width)
+
+@st.fragment
+def render_face_gallery(key: str, image_hashes: Optional[List[str]] = None) -> None:
+    """Galeria twarzy: filtry, sortowanie i stronicowanie w SQLite, miniatury tylko dla widocznej strony"""
+    col1, col2, col3, col4 = st.columns(4)
+    emotion = col1.selectbox("😶 Emocja", [None, *EMOTION_LABELS], key=f"{key}_emotion",
+                             format_func=lambda label: "Wszystkie" if label is None
+                             else f"{EMOTION_EMOJI[EMOTION_LABELS.index(label)]} {label}")
+    min_confidence = col2.slider("🎯 Min. pewność (%)", 0, 100, 0, key=f"{key}_min_confidence")
+    sort_label = col3.selectbox("↕️ Sortowanie", list(GALLERY_SORT_OPTIONS), key=f"{key}_sort")
+    page_size = col4.selectbox("📄 Na stronę", (12, GALLERY_PAGE_SIZE, 48, 96), index=1, key=f"{key}_page_size")
+    
+    total = count_gallery_faces(emotion, min_confidence, image_hashes, history_store.latest_id())
+    if not total:
+        st.info("Brak twarzy spełniających kryteria")
+        return
+    pages = page_count(total, page_size)
+    # Klucz strony zależy od filtrów - zmiana filtra wraca na pierwszą stronę
+    page = st.number_input(f"Strona (z {pages}) • {total} twarzy", min_value=1, max_value=pages, value=1,
+                           key=f"{key}_page_{emotion}_{min_confidence}_{sort_label}_{page_size}")
+    sort, descending = GALLERY_SORT_OPTIONS[sort_label]
+    faces = history_store.query_faces(emotion, min_confidence, image_hashes, sort, descending,
+                                      limit=page_size, offset=(page - 1) * page_size)
+    
+    for row_start in range(0, len(faces), GALLERY_COLUMNS):
+        for column, face in zip(st.columns(GALLERY_COLUMNS), faces[row_start:row_start + GALLERY_COLUMNS]):
+            index = EMOTION_LABELS.index(face['dominant_emotion'])
+            caption = f"{EMOTION_EMOJI[index]} {face['dominant_emotion']} {face['confidence']:.0f}%"
+            thumbnail = face_thumbnail_jpeg(face['image_hash'], (face['x'] or 0, face['y'] or 0, face['w'] or 0,
+                                                                  face['h'] or 0), face['image_w'])
+            with column:
+                if thumbnail is not None:
+                    st.image(thumbnail, caption=caption, use_container_width=True)
+                else:
+                    st.caption(f"🖼️ brak kopii obrazu • {caption}")
 
 # Konfiguracja strony
 st.set_page_config(
@@ -272,22 +393,20 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def draw_emotion_on_face(image_path: str, face_region: Dict[str, int], dominant_emotion: str, confidence: float) -> Optional[np.ndarray]:
+def draw_emotion_on_face(img_bgr: np.ndarray, face: EmotionResult) -> Optional[np.ndarray]:
     """Rysuje prostokąt wokół twarzy i oznacza emocję"""
-    # Wczytaj obraz
-    img = cv2.imread(image_path)
-    if img is None:
+    if img_bgr is None:
         return None
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
     
     # Pobierz współrzędne twarzy
-    x, y, w, h = face_region['x'], face_region['y'], face_region['w'], face_region['h']
+    x, y, w, h = face.box
     
     # Narysuj prostokąt wokół twarzy
     cv2.rectangle(img_rgb, (x, y), (x + w, y + h), (0, 255, 0), 3)
     
     # Dodaj tekst z emocją
-    label = f"{dominant_emotion}: {confidence:.1f}%"
+    label = f"{face.dominant_emotion}: {face.confidence:.1f}%"
     font = cv2.FONT_HERSHEY_SIMPLEX
     font_scale = 0.8
     thickness = 2
@@ -303,32 +422,332 @@ def draw_emotion_on_face(image_path: str, face_region: Dict[str, int], dominant_
     
     return img_rgb
 
-def create_face_analysis_plot(image_path: str, result: Any) -> Tuple[Optional[np.ndarray], Optional[Dict[str, float]], Optional[Tuple[str, float]]]:
-    """Tworzy wykres z zaznaczoną twarzą i emocjami"""
-    # Wczytaj obraz
-    img = cv2.imread(image_path)
-    if img is None:
-        return None, None, None
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    
-    # Przygotuj dane
-    if isinstance(result, list):
-        face_data = result[0]
-    else:
-        face_data = result
+def run_image_analysis(content_hash: str, detector: str, image_bytes: bytes, use_history: bool = True,
+                       min_confidence: float = 0.0) -> Dict[str, Any]:
+    """Analiza zdjęcia bez cache Streamlit (bezpośrednio wywoływana przy profilowaniu).
+
+    use_history=False - bez odczytu i bez zapisu historii oraz indeksu duplikatów.
+    """
+    # Ten sam obraz (ten sam skrót zawartości) nie jest analizowany ponownie także po restarcie
+    key = detector_key(detector, min_confidence)
+    result = history_store.lookup(content_hash, key) if use_history else None
+    from_history = result is not None
+    deduped_from = None
+    recorded = False
+    tier = TIER_FULL
     
-    emotions = face_data['emotion']
-    face_region = face_data['region']
-    dominant_emotion = max(emotions.items(), key=lambda x: x[1])
+    with metrics.time('decode'):
+        img_bgr = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img_bgr is None:
+        raise ValueError("Nie udało się zdekodować obrazu")
+    image_size = (img_bgr.shape[1], img_bgr.shape[0])
     
-    # Narysuj obraz z oznaczoną twarzą
-    annotated_img = draw_emotion_on_face(image_path, face_region, dominant_emotion[0], dominant_emotion[1])
+    if result is None:
+        # Prawie-duplikat (seria, ponowny eksport, przeskalowana kopia) przejmuje wynik źródła
+        with metrics.time('dedup_lookup'):
+            perceptual_hash = dhash(img_bgr)
+            match = dedup_index.find(key, perceptual_hash) if use_history else None
+        source_faces = history_store.lookup(match.source.image_hash, key) if match else None
+        if source_faces is not None:
+            result = rescale_faces(source_faces, match.source, *image_size)
+            deduped_from = match.source.image_hash
+            history_store.record(content_hash, result, key, perceptual_hash=to_sqlite(perceptual_hash),
+                                 image_size=image_size, deduped_from=deduped_from)
+            recorded = True
+    
+    if result is None:
+        # Pełny model, gdy już załadowany - wcześniej lekki model NumPy; bez twarzy - bez klasyfikacji
+        analysis_start = time.perf_counter()
+        result, tier = analysis_engine.analyze(img_bgr, detector, min_confidence)
+        if tier == TIER_FULL and use_history and len(result):
+            # Do historii i indeksu duplikatów trafiają tylko wyniki pełnego modelu (nie przebiegi profilowania).
+            # Obraz bez twarzy nie ma wiersza w historii, więc nie może też być źródłem w indeksie
+            history_store.record(content_hash, result, key,
+                                 latency_ms=1000 * (time.perf_counter() - analysis_start),
+                                 perceptual_hash=to_sqlite(perceptual_hash), image_size=image_size)
+            dedup_index.add(key, perceptual_hash, DedupSource(content_hash, *image_size))
+            recorded = True
+    
+    if recorded and len(result):
+        # Kopia do galerii twarzy (raz per obraz) - miniatury powstają dopiero przy wyświetlaniu strony
+        with metrics.time('gallery_source'):
+            gallery_sources.put(content_hash, img_bgr)
+    
+    # Utwórz wizualizację z zaznaczoną twarzą (pierwsza twarz wyniku)
+    face = result[0] if len(result) else None
+    with metrics.time('annotation'):
+        annotated_img = draw_emotion_on_face(img_bgr, face) if face is not None else None
+    # Do wyniku (i cache) trafia tylko JPEG w rozmiarze wyświetlania - pełna rozdzielczość na żądanie
+    with metrics.time('image_encode'):
+        annotated_display = encode_display_jpeg(annotated_img, rgb=True) if annotated_img is not None else None
+    
+    return {
+        'annotated_display': annotated_display,
+        'face': face,
+        'from_history': from_history,
+        'deduped_from': deduped_from,
+        'tier': tier,
+    }
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def display_image(content_hash: str, _image_bytes: bytes) -> bytes:
+    """Podgląd przesłanego zdjęcia: pomniejszony JPEG, kodowany raz na obraz"""
+    with metrics.time('image_encode'):
+        img_bgr = cv2.imdecode(np.frombuffer(_image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img_bgr is None:
+            raise ValueError("Nie udało się zdekodować obrazu")
+        return encode_display_jpeg(img_bgr)
+
+def annotated_full_png(image_bytes: bytes, analysis: Dict[str, Any]) -> bytes:
+    """Zdjęcie z oznaczoną twarzą w pełnej rozdzielczości - generowane dopiero przy pobraniu"""
+    img_bgr = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    annotated_img = draw_emotion_on_face(img_bgr, analysis['face'])
+    return encode_png(annotated_img, rgb=True)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def analyze_image(content_hash: str, detector: str, tier: str, min_confidence: float, _image_bytes: bytes) -> Dict[str, Any]:
+    """Analiza zdjęcia - zależy tylko od obrazu, detektora z progiem pewności i poziomu silnika, więc
+    zmiana kontrolek wyświetlania nie uruchamia jej ponownie (a po załadowaniu DeepFace - tak)"""
+    return run_image_analysis(content_hash, detector, _image_bytes, min_confidence=min_confidence)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def render_emotion_charts(scores: np.ndarray) -> Tuple[bytes, bytes]:
+    """Renderuje wykres słupkowy i kołowy raz dla danego wyniku (PNG)"""
+    with metrics.time('chart_render'):
+        fig, ax = plt.subplots(figsize=(8, 6))
+        
+        # Kolorowe słupki dla każdej emocji
+        emotion_colors_plot = ['#ff6b6b', '#4ecdc4', '#45b7d1', '#96ceb4', '#feca57', '#ff9ff3', '#95e1d3']
+        bars = ax.bar(EMOTION_LABELS, scores, color=emotion_colors_plot)
+        ax.set_ylabel('Pewność (%)', fontsize=12)
+        ax.set_title('Rozkład wszystkich emocji', fontsize=14, pad=20)
+        ax.set_ylim(0, 100)
+        
+        # Dodaj wartości na słupkach
+        for i, bar in enumerate(bars):
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2., height + 1,
+                   f'{height:.1f}%', ha='center', va='bottom', fontweight='bold')
+        
+        plt.xticks(rotation=45, ha='right')
+        plt.tight_layout()
+        bar_png = io.BytesIO()
+        fig.savefig(bar_png, format='png')
+        plt.close(fig)
+        
+        fig2, ax2 = plt.subplots(figsize=(8, 6))
+        colors = ['#ff6b6b', '#4ecdc4', '#45b7d1', '#96ceb4', '#feca57', '#ff9ff3', '#95e1d3']
+        
+        # Filtruj tylko emocje > 1% dla czytelności
+        shown = np.flatnonzero(scores > 1)
+        if not len(shown):  # Jeśli wszystkie są < 1%, pokaż wszystkie
+            shown = np.arange(len(scores))
+        
+        ax2.pie(
+            scores[shown], 
+            labels=[EMOTION_LABELS[index] for index in shown], 
+            autopct='%1.1f%%', 
+            colors=colors[:len(shown)], 
+            startangle=90,
+            textprops={'fontsize': 10}
+        )
+        ax2.set_title('Procentowy rozkład emocji', fontsize=14, pad=20)
+        pie_png = io.BytesIO()
+        fig2.savefig(pie_png, format='png')
+        plt.close(fig2)
+    
+    return bar_png.getvalue(), pie_png.getvalue()
+
+def render_export_controls(label: str,
+                           rows_factory: Callable[[], Iterable[Dict[str, Any]]],
+                           file_stem: str,
+                           key: str,
+                           **export_kwargs: Any) -> None:
+    """Wybór formatu i przycisk pobierania - plik jest generowany porcjami dopiero po kliknięciu
+    (gotowy plik Streamlit trzyma w pamięci)"""
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        export_format = st.selectbox("Format eksportu", available_formats(), key=f"{key}_format",
+                                     label_visibility="collapsed")
+    extension, mime = EXPORT_FORMATS[export_format]
+    with col2:
+        st.download_button(
+            label,
+            data=lambda: export_bytes(rows_factory(), export_format, **export_kwargs),
+            file_name=f"{file_stem}.{extension}",
+            mime=mime,
+            key=key
+        )
+
+@st.fragment
+def render_analysis_results(analysis: Dict[str, Any], image_bytes: bytes) -> None:
+    """Widok wyników - kontrolki wyświetlania przeładowują tylko ten fragment"""
+    annotated_display = analysis['annotated_display']
+    face: Optional[EmotionResult] = analysis['face']
+    
+    if annotated_display is None or face is None:
+        st.markdown('<div class="sub-header">❌ Problem z Analizą</div>', unsafe_allow_html=True)
+        st.error("Nie udało się wykryć twarzy na zdjęciu.")
+        return
+    
+    # Sekcja wyników
+    st.markdown('<div class="sub-header">🎯 Wyniki Analizy</div>', unsafe_allow_html=True)
+    
+    # Wyświetl obraz z zaznaczoną twarzą i emocją
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        st.image(annotated_display, caption=f"🎭 Wykryta emocja: {face.dominant_emotion} ({face.confidence:.1f}%)", 
+                use_container_width=True)
+        st.download_button(
+            "⬇️ Pobierz w pełnej rozdzielczości (PNG)",
+            data=lambda: annotated_full_png(image_bytes, analysis),
+            file_name="emocje_analiza.png",
+            mime="image/png",
+            key="download_annotated_full",
+            use_container_width=True
+        )
+    
+    # Pokaż dominującą emocję w eleganckiej karcie
+    emoji = EMOTION_EMOJI[face.dominant]
+    color = EMOTION_COLORS[face.dominant]
+    
+    st.markdown(f"""
+    <div style="background: linear-gradient(135deg, {color}22, {color}44); 
+                border-left: 4px solid {color}; 
+                padding: 1.5rem; 
+                border-radius: 10px; 
+                margin: 1rem 0;
+                text-align: center;">
+        <h2>{emoji} Dominująca Emocja: {face.dominant_emotion.upper()}</h2>
+        <h3>Pewność: {face.confidence:.1f}%</h3>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Sekcja wykresów i szczegółowych analiz
+    st.markdown('<div class="sub-header">📊 Szczegółowa Analiza Emocji</div>', unsafe_allow_html=True)
+    
+    # Kontrolki wyświetlania - zmiana nie uruchamia analizy ponownie
+    col1, col2 = st.columns(2)
+    with col1:
+        show_charts = st.toggle("📊 Pokaż wykresy", value=True, key="show_result_charts")
+    with col2:
+        min_ranking_confidence = st.slider(
+            "🎚️ Pokaż w rankingu emocje od (%)",
+            min_value=0,
+            max_value=100,
+            value=0,
+            key="ranking_min_confidence"
+        )
+    
+    if show_charts:
+        # Wykresy renderowane raz na wynik (cache), tutaj tylko wyświetlane
+        bar_png, pie_png = render_emotion_charts(face.scores)
+        
+        # Utwórz dwie kolumny dla wykresów
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            # Wykres słupkowy emocji
+            st.markdown("#### 📊 Wykres słupkowy")
+            st.image(bar_png, use_container_width=True)
+        
+        with col2:
+            # Wykres kołowy emocji
+            st.markdown("#### 🥧 Wykres kołowy")
+            st.image(pie_png, use_container_width=True)
+    
+    # Szczegółowa tabela wyników
+    st.markdown('<div class="sub-header">📋 Ranking Emocji</div>', unsafe_allow_html=True)
+    
+    # Ranking: indeksy emocji od najwyższego wyniku (liczone raz)
+    ranking = face.ranking()
+    
+    # Wyświetl tabelę w 3 kolumnach
+    col1, col2, col3 = st.columns([2, 1, 1])
+    
+    with col1:
+        for position, index in enumerate(ranking, 1):
+            confidence = float(face.scores[index])
+            if confidence < min_ranking_confidence:
+                continue
+            if confidence > 50:
+                status_color = "🔥 Wysoka"
+            elif confidence > 20:
+                status_color = "🔶 Średnia"
+            else:
+                status_color = "🔹 Niska"
+            
+            st.markdown(f"""
+            <div class="emotion-card">
+                <strong>{position}. {EMOTION_EMOJI[index]} {EMOTION_LABELS[index].title()}</strong><br>
+                <span style="font-size: 1.2em; color: #1f77b4;">{confidence:.2f}%</span>
+                <span style="float: right;">{status_color}</span>
+            </div>
+            """, unsafe_allow_html=True)
     
-    return annotated_img, emotions, dominant_emotion
+    # Eksport pełnego wyniku (niezależnie od filtra rankingu)
+    result_rows = [
+        {'emotion': EMOTION_LABELS[index], 'confidence': round(float(face.scores[index]), 4),
+         'dominant': bool(index == face.dominant)}
+        for index in ranking
+    ]
+    render_export_controls("📥 Pobierz wynik", lambda: result_rows, "emocje_wynik", key="export_result")
+
+# Co ile sekund odświeżać panele analizy na żywo
+LIVE_REFRESH_SECONDS = 0.5
 
-# Globalne zmienne dla kamery
-latest_emotion_result = None
-emotion_lock = threading.Lock()
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_live_panels(webrtc_ctx: Any) -> None:
+    """Panele 'Bieżąca Analiza' i 'Statystyki' odświeżane bez przeładowania całej strony"""
+    video_processor = webrtc_ctx.video_processor
+    if video_processor is None:
+        return
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("#### 📊 Bieżąca Analiza")
+    with col2:
+        st.markdown("#### 🎯 Statystyki")
+    
+    if not (hasattr(webrtc_ctx, 'state') and webrtc_ctx.state.playing):
+        return
+    
+    # Migawka wyniku z wątku inferencji
+    with video_processor.emotion_lock:
+        latest_result = video_processor.latest_emotion_result
+    
+    if latest_result is not None:
+        with col1:
+            st.markdown(f"""
+            <div class="emotion-card">
+                <h2>{EMOTION_EMOJI[latest_result.dominant]} {latest_result.dominant_emotion.upper()}</h2>
+                <h3>Pewność: {latest_result.confidence:.1f}%</h3>
+            </div>
+            """, unsafe_allow_html=True)
+    else:
+        with col1:
+            st.caption("👀 Brak twarzy w kadrze - analiza czeka na twarz")
+    
+    # Statystyki z historii sesji (bufor cykliczny)
+    history = video_processor.history
+    rolling_mean = history.rolling_mean(window_seconds=60)
+    if rolling_mean is not None:
+        dominant_share = history.dominant_share()
+        with col2:
+            st.caption(f"Średnia z ostatniej minuty • {len(history)} pomiarów w sesji")
+            for index in np.argsort(rolling_mean)[::-1][:3]:
+                st.write(f"{EMOTION_EMOJI[index]} {EMOTION_LABELS[index]}: {rolling_mean[index]:.1f}% "
+                         f"(dominująca w {100 * dominant_share[index]:.0f}% sesji)")
+            
+            timestamps, scores, _ = history.snapshot(window_seconds=300)
+            if len(timestamps) > 1:
+                st.line_chart({label: scores[:, i] for i, label in enumerate(EMOTION_LABELS)})
+    
+    # Wynegocjowane parametry kamery i koszt przyjmowania klatek tego strumienia
+    if video_processor.ingest is not None and video_processor.ingest.frames:
+        ingest = video_processor.ingest.summary()
+        st.caption(f"📶 Przechwytywanie: {ingest['Poziom']} • {ingest['Rozdzielczość']} @ {ingest['FPS']} FPS • "
+                   f"przyjęcie klatki {ingest['Przyjęcie klatki (ms)']} ms ({ingest['CPU (ms/s)']} ms CPU/s)")
 
 # Główny nagłówek aplikacji
 st.markdown('<h1 class="main-header">🎭 Analizator Emocji AI</h1>', unsafe_allow_html=True)
@@ -351,11 +770,23 @@ with st.sidebar.expander("ℹ️ O Aplikacji", expanded=True):
 # Ustawienia analizy
 st.sidebar.markdown("### ⚙️ Ustawienia Analizy")
 
+# Stan silnika - lekki model działa od startu, DeepFace dochodzi w tle
+if analysis_engine.full_ready:
+    snapshot_note = {SOURCE_SNAPSHOT: ", ze zrzutu", SOURCE_SHARED: ", wagi współdzielone"}.get(
+        analysis_engine.full_source, "")
+    st.sidebar.caption(f"🧠 Model: DeepFace (gotowy po {analysis_engine.full_ready_seconds:.1f} s{snapshot_note})")
+elif analysis_engine.full_error:
+    st.sidebar.caption("⚡ Model: lekki (NumPy) - DeepFace niedostępny")
+elif analysis_engine.light_model is not None:
+    st.sidebar.caption("⚡ Model: lekki (NumPy) - DeepFace ładuje się w tle")
+else:
+    st.sidebar.caption("⏳ Model: DeepFace ładuje się...")
+
 # Wybór źródła obrazu
 if WEBRTC_AVAILABLE:
-    source_options = ["📸 Przesyłanie pliku", "� Zdjęcie z kamery", "�📹 Kamera internetowa (live)"]
+    source_options = ["📸 Przesyłanie pliku", "� Zdjęcie z kamery", "🎬 Plik wideo", "🗂️ Wsad zdjęć", "🖼️ Galeria historii", "�📹 Kamera internetowa (live)"]
 else:
-    source_options = ["📸 Przesyłanie pliku", "📷 Zdjęcie z kamery"]
+    source_options = ["📸 Przesyłanie pliku", "📷 Zdjęcie z kamery", "🎬 Plik wideo", "🗂️ Wsad zdjęć", "🖼️ Galeria historii"]
     
 source_option = st.sidebar.radio(
     "📹 Źródło obrazu:",
@@ -368,12 +799,22 @@ confidence_threshold = st.sidebar.slider(
     min_value=0, 
     max_value=100, 
     value=50,
-    help="Minimalny poziom pewności dla wykrywania twarzy"
+    help="Minimalny poziom pewności dla wykrywania twarzy - słabsze ramki Haara trafiają do dokładniejszego "
+         "detektora, a do analizy emocji przechodzą tylko ramki powyżej progu"
 )
+detection_confidence = confidence_threshold / 100
 
 show_advanced = st.sidebar.checkbox("🔬 Pokaż zaawansowane opcje", False)
+profile_analysis = False
 
 if show_advanced:
+    if PROFILING_ENABLED:
+        # Tylko dla operatora (EMOCJE_PROFILING=1) - bez flagi kod profilujący w ogóle się nie wykonuje
+        profile_analysis = st.sidebar.toggle(
+            "🧪 Profiluj analizę zdjęcia",
+            help="Analizuje zdjęcie ponownie (z pominięciem cache i historii) pod profilerem"
+        )
+    
     detection_backend = st.sidebar.selectbox(
         "🔍 Backend wykrywania",
         ["opencv", "retinaface", "mtcnn"],
@@ -464,6 +905,123 @@ elif source_option == "📷 Zdjęcie z kamery":
         st.info("💡 Spróbuj opcję 'Przesyłanie pliku' jako alternatywę")
         uploaded_file = None
 
+elif source_option == "🎬 Plik wideo":
+    # Sekcja analizy nagrania wideo
+    st.markdown('<div class="sub-header">🎬 Analiza Nagrania Wideo</div>', unsafe_allow_html=True)
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        uploaded_video = st.file_uploader(
+            "",
+            type=["mp4", "mov", "avi", "mkv", "webm"],
+            help="Wybierz nagranie z widoczną twarzą",
+            label_visibility="collapsed",
+            key="video_uploader"
+        )
+        sample_fps = st.slider(
+            "🎞️ Próbkowanie (klatki/s)",
+            min_value=0.5,
+            max_value=10.0,
+            value=DEFAULT_SAMPLE_FPS,
+            step=0.5,
+            help="Ile klatek na sekundę nagrania trafia do analizy"
+        )
+        
+        job_priority = st.select_slider("⏫ Priorytet zadania", options=list(JOB_PRIORITIES), value="normalny",
+                                        key="video_job_priority")
+        
+        if uploaded_video is not None and st.button("🔍 Analizuj nagranie", type="primary", use_container_width=True):
+            # To samo nagranie z tym samym próbkowaniem nie jest analizowane drugi raz
+            video_key = f"video:{image_hash(uploaded_video.getvalue())}:{sample_fps}"
+            extension = os.path.splitext(uploaded_video.name)[1]
+            st.session_state['video_job_id'] = submit_job(
+                'video', video_key, JOB_PRIORITIES[job_priority],
+                lambda directory: {'dir': directory, 'sample_fps': sample_fps,
+                                   'path': save_job_file(directory, f"nagranie{extension}", uploaded_video)}
+            )
+            st.session_state['video_result_name'] = uploaded_video.name
+    
+    video_job_id = st.session_state.get('video_job_id')
+    video_result = render_job_outcome(job_queue.get(video_job_id) if video_job_id else None, "🎬 Analiza nagrania")
+    if video_result is not None:
+        st.markdown('<div class="sub-header">📈 Oś Czasu Emocji</div>', unsafe_allow_html=True)
+        
+        timeline_rows = video_result['timeline']
+        col1, col2, col3 = st.columns(3)
+        col1.metric("🎞️ Długość nagrania", f"{video_result['video_seconds']:.1f} s")
+        col2.metric("🖼️ Przeanalizowane klatki", video_result['sampled_frames'])
+        col3.metric("⚡ Przepustowość", f"{video_result['throughput']:.2f}× czasu rzeczywistego")
+        
+        if timeline_rows:
+            st.line_chart({label: [row[label] for row in timeline_rows] for label in EMOTION_LABELS})
+            render_export_controls(
+                "📥 Pobierz oś czasu",
+                lambda: timeline_rows,
+                f"{os.path.splitext(st.session_state.get('video_result_name', 'wideo'))[0]}_emocje",
+                key="export_video_timeline"
+            )
+        else:
+            st.warning("Nie wykryto twarzy w nagraniu.")
+    
+    uploaded_file = None
+
+elif source_option == "🗂️ Wsad zdjęć":
+    # Wiele zdjęć naraz - zadanie w tle, prawie-duplikaty przejmują wynik bez analizy
+    st.markdown('<div class="sub-header">🗂️ Analiza Wsadu Zdjęć</div>', unsafe_allow_html=True)
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        uploaded_batch = st.file_uploader(
+            "",
+            type=["jpg", "jpeg", "png", "bmp", "webp"],
+            accept_multiple_files=True,
+            help="Wybierz zdjęcia - serie i kopie tego samego kadru są rozpoznawane",
+            label_visibility="collapsed",
+            key="batch_uploader"
+        )
+        job_priority = st.select_slider("⏫ Priorytet zadania", options=list(JOB_PRIORITIES), value="normalny",
+                                        key="batch_job_priority")
+        
+        if uploaded_batch and st.button("🔍 Analizuj wsad", type="primary", use_container_width=True):
+            batch_hashes = [image_hash(photo.getvalue()) for photo in uploaded_batch]
+            batch_key = f"batch:{detector_key(ANALYSIS_DETECTOR, detection_confidence)}:{image_hash(''.join(sorted(batch_hashes)).encode('utf-8'))}"
+            
+            def batch_params(directory: str) -> Dict[str, Any]:
+                stored_names = [f"{index:04d}{os.path.splitext(photo.name)[1]}" for index, photo in enumerate(uploaded_batch)]
+                return {
+                    'dir': directory,
+                    'paths': [save_job_file(directory, stored, photo) for stored, photo in zip(stored_names, uploaded_batch)],
+                    'names': {stored: photo.name for stored, photo in zip(stored_names, uploaded_batch)},
+                    'min_confidence': detection_confidence,
+                }
+            
+            st.session_state['batch_job_id'] = submit_job('batch', batch_key, JOB_PRIORITIES[job_priority], batch_params)
+    
+    batch_job_id = st.session_state.get('batch_job_id')
+    batch_result = render_job_outcome(job_queue.get(batch_job_id) if batch_job_id else None, "🗂️ Analiza wsadu")
+    if batch_result is not None:
+        st.markdown('<div class="sub-header">📋 Wyniki Wsadu</div>', unsafe_allow_html=True)
+        counts = batch_result['counts']
+        col1, col2, col3 = st.columns(3)
+        col1.metric("🔍 Przeanalizowane", counts['analiza'])
+        col2.metric("♻️ Prawie-duplikaty", counts['duplikat'])
+        col3.metric("📚 Z historii", counts['historia'])
+        st.dataframe(batch_result['rows'], use_container_width=True)
+        render_export_controls("📥 Pobierz wyniki wsadu", lambda: batch_result['rows'], "wsad_emocje",
+                               key="export_batch")
+        
+        st.markdown('<div class="sub-header">🖼️ Twarze ze Wsadu</div>', unsafe_allow_html=True)
+        render_face_gallery("batch_gallery", [row['image_hash'] for row in batch_result['rows']])
+    
+    uploaded_file = None
+
+elif source_option == "🖼️ Galeria historii":
+    st.markdown('<div class="sub-header">🖼️ Galeria Historii</div>', unsafe_allow_html=True)
+    st.caption("Najnowsza analiza każdego zdjęcia • filtrowanie i sortowanie w bazie historii, "
+               "miniatury tylko dla widocznej strony")
+    render_face_gallery("history_gallery")
+    uploaded_file = None
+
 else:  # Kamera internetowa (live)
     if source_option == "📷 Zdjęcie z kamery":
         # Sekcja robienia zdjęcia z kamery
@@ -504,61 +1062,29 @@ else:  # Kamera internetowa (live)
                 "iceServers": [{"urls": ["stun:stun.l.google.com:19302"]}]
             })
             
+            # Rozdzielczość i liczbę klatek wybiera serwer na podstawie obciążenia;
+            # w trakcie trwającego strumienia poziom się nie zmienia
+            if st.session_state.get('live_playing'):
+                capture_tier = st.session_state.get('capture_tier')
+            else:
+                capture_tier = current_tier()
+                st.session_state['capture_tier'] = capture_tier
+            
             # Stream z kamery z analizą emocji
             webrtc_ctx = webrtc_streamer(
                 key="emotion-analysis",
-                video_processor_factory=VideoProcessor,
+                video_processor_factory=functools.partial(VideoProcessor, capture_tier),
                 rtc_configuration=RTC_CONFIGURATION,
-                media_stream_constraints={"video": True, "audio": False},
+                media_stream_constraints=media_stream_constraints(capture_tier),
                 async_processing=True,
             )
+            st.session_state['live_playing'] = bool(
+                webrtc_ctx and hasattr(webrtc_ctx, 'state') and webrtc_ctx.state.playing
+            )
             
-            # Wyświetlaj bieżące wyniki analizy
-            if webrtc_ctx and webrtc_ctx.video_processor:
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.markdown("#### 📊 Bieżąca Analiza")
-                    emotion_placeholder = st.empty()
-                    
-                with col2:
-                    st.markdown("#### 🎯 Statystyki")
-                    stats_placeholder = st.empty()
-                
-                # Aktualizuj wyniki w czasie rzeczywistym
-                if hasattr(webrtc_ctx, 'state') and webrtc_ctx.state.playing:
-                    with emotion_lock:
-                        if latest_emotion_result is not None:
-                            try:
-                                emotions = latest_emotion_result.get('emotion', {})  # type: ignore
-                                if emotions:
-                                    dominant_emotion = max(emotions.items(), key=lambda x: x[1])
-                                    
-                                    # Emoji dla emocji
-                                    emotion_emoji = {
-                                        'happy': '😊', 'sad': '😢', 'angry': '😠', 'surprise': '😮', 
-                                        'fear': '😨', 'disgust': '🤢', 'neutral': '😐'
-                                    }
-                                    emoji = emotion_emoji.get(dominant_emotion[0], '🎭')
-                                    
-                                    # Aktualizuj wyświetlanie
-                                    with emotion_placeholder.container():
-                                        st.markdown(f"""
-                                        <div class="emotion-card">
-                                            <h2>{emoji} {dominant_emotion[0].upper()}</h2>
-                                            <h3>Pewność: {dominant_emotion[1]:.1f}%</h3>
-                                        </div>
-                                        """, unsafe_allow_html=True)
-                                    
-                                    # Wyświetl wszystkie emocje
-                                    with stats_placeholder.container():
-                                        for emotion, value in sorted(emotions.items(), key=lambda x: x[1], reverse=True)[:3]:
-                                            emoji_e = emotion_emoji.get(emotion, '🎭')
-                                            st.write(f"{emoji_e} {emotion}: {value:.1f}%")
-                            except Exception:
-                                pass
-                    
-                    time.sleep(0.5)  # Aktualizuj co pół sekundy
+            # Wyświetlaj bieżące wyniki analizy - tylko fragment odświeża się cyklicznie
+            if webrtc_ctx:
+                render_live_panels(webrtc_ctx)
         else:
             st.error("⚠️ Funkcjonalność kamery nie jest dostępna w tym środowisku.")
             st.info("🔄 Użyj opcji 'Przesyłanie pliku' aby analizować emocje ze zdjęć.")
@@ -567,10 +1093,9 @@ else:  # Kamera internetowa (live)
 
 # Sprawdź czy mamy zdjęcie do analizy
 if uploaded_file is not None:
-    # Zapisz plik tymczasowo, bo DeepFace wymaga ścieżki do pliku
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-        tmp_file.write(uploaded_file.read())
-        tmp_path = tmp_file.name
+    with metrics.time('upload_read'):
+        image_bytes = uploaded_file.getvalue()
+        content_hash = image_hash(image_bytes)
     
     # Sekcja wyświetlania zdjęć
     st.markdown('<div class="sub-header">🖼️ Przesłane Zdjęcie</div>', unsafe_allow_html=True)
@@ -578,187 +1103,135 @@ if uploaded_file is not None:
     # Wyświetl oryginalne zdjęcie w eleganckiej ramce
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        st.image(uploaded_file, caption="📷 Oryginalne zdjęcie", use_container_width=True)
+        st.image(display_image(content_hash, image_bytes), caption="📷 Oryginalne zdjęcie", use_container_width=True)
     
     # Rozpocznij analizę
     st.markdown('<div class="sub-header">🤖 Analiza AI w Toku</div>', unsafe_allow_html=True)
     
+    memory_sample = memory_manager.begin_request(f"analiza: {getattr(uploaded_file, 'name', 'zdjęcie')}")
+    analysis = None
+    
     try:
-        # Preload model if not already loaded
-        load_deepface_model()
-        
-        # Clean memory before analysis
-        cleanup_memory()
-        
-        # Analiza emocji używając DeepFace with better error handling
-        with st.spinner('🔍 Analizuję emocje i wykrywam twarz... To może potrwać chwilę.'):
-            try:
-                result = DeepFace.analyze(
-                    tmp_path, 
-                    actions=['emotion'], 
-                    enforce_detection=False,
-                    silent=True,
-                    detector_backend='opencv'  # Use more stable backend
-                )
-            except Exception as analysis_error:
-                st.error(f"Błąd podczas analizy obrazu: {str(analysis_error)}")
-                st.info("Spróbuj użyć innego zdjęcia lub sprawdź czy twarz jest wyraźnie widoczna.")
-                raise analysis_error
-        
-        # Clean memory after analysis
-        cleanup_memory()
-        
-        # Utwórz wizualizację z zaznaczoną twarzą
-        annotated_img, emotions, dominant_emotion = create_face_analysis_plot(tmp_path, result)
-        
-        if annotated_img is not None and emotions is not None and dominant_emotion is not None:
-            # Sekcja wyników
-            st.markdown('<div class="sub-header">🎯 Wyniki Analizy</div>', unsafe_allow_html=True)
-            
-            # Wyświetl obraz z zaznaczoną twarzą i emocją
-            col1, col2, col3 = st.columns([1, 2, 1])
-            with col2:
-                st.image(annotated_img, caption=f"🎭 Wykryta emocja: {dominant_emotion[0]} ({dominant_emotion[1]:.1f}%)", 
-                        use_container_width=True)
-            
-            # Pokaż dominującą emocję w eleganckiej karcie
-            emotion_emoji = {
-                'happy': '😊', 'sad': '😢', 'angry': '😠', 'surprise': '😮', 
-                'fear': '😨', 'disgust': '🤢', 'neutral': '😐'
-            }
-            emotion_colors = {
-                'happy': '#28a745', 'sad': '#6f42c1', 'angry': '#dc3545', 'surprise': '#ffc107', 
-                'fear': '#6c757d', 'disgust': '#20c997', 'neutral': '#17a2b8'
-            }
-            
-            emoji = emotion_emoji.get(dominant_emotion[0], '🎭')
-            color = emotion_colors.get(dominant_emotion[0], '#17a2b8')
-            
-            st.markdown(f"""
-            <div style="background: linear-gradient(135deg, {color}22, {color}44); 
-                        border-left: 4px solid {color}; 
-                        padding: 1.5rem; 
-                        border-radius: 10px; 
-                        margin: 1rem 0;
-                        text-align: center;">
-                <h2>{emoji} Dominująca Emocja: {dominant_emotion[0].upper()}</h2>
-                <h3>Pewność: {dominant_emotion[1]:.1f}%</h3>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        # Sekcja wykresów i szczegółowych analiz
-        st.markdown('<div class="sub-header">📊 Szczegółowa Analiza Emocji</div>', unsafe_allow_html=True)
-        
-        # Utwórz dwie kolumny dla wykresów
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # Wykres słupkowy emocji
-            st.markdown("#### 📊 Wykres słupkowy")
-            if emotions is not None:
-                fig, ax = plt.subplots(figsize=(8, 6))
-                
-                # Kolorowe słupki dla każdej emocji
-                emotion_colors_plot = ['#ff6b6b', '#4ecdc4', '#45b7d1', '#96ceb4', '#feca57', '#ff9ff3', '#95e1d3']
-                bars = ax.bar(list(emotions.keys()), list(emotions.values()), color=emotion_colors_plot[:len(emotions)])
-                ax.set_ylabel('Pewność (%)', fontsize=12)
-                ax.set_title('Rozkład wszystkich emocji', fontsize=14, pad=20)
-                ax.set_ylim(0, 100)
-                
-                # Dodaj wartości na słupkach
-                for i, bar in enumerate(bars):
-                    height = bar.get_height()
-                    ax.text(bar.get_x() + bar.get_width()/2., height + 1,
-                           f'{height:.1f}%', ha='center', va='bottom', fontweight='bold')
-                
-                plt.xticks(rotation=45, ha='right')
-                plt.tight_layout()
-                st.pyplot(fig)
-        
-        with col2:
-            # Wykres kołowy emocji
-            st.markdown("#### 🥧 Wykres kołowy")
-            if emotions is not None:
-                fig2, ax2 = plt.subplots(figsize=(8, 6))
-                colors = ['#ff6b6b', '#4ecdc4', '#45b7d1', '#96ceb4', '#feca57', '#ff9ff3', '#95e1d3']
-                
-                # Filtruj tylko emocje > 1% dla czytelności
-                filtered_emotions = {k: v for k, v in emotions.items() if v > 1}
-                if not filtered_emotions:  # Jeśli wszystkie są < 1%, pokaż wszystkie
-                    filtered_emotions = emotions
-                
-                pie_result = ax2.pie(
-                    list(filtered_emotions.values()), 
-                    labels=list(filtered_emotions.keys()), 
-                    autopct='%1.1f%%', 
-                    colors=colors[:len(filtered_emotions)], 
-                    startangle=90,
-                    textprops={'fontsize': 10}
-                )
-                # Handle variable unpacking based on return type
-                if len(pie_result) == 3:
-                    wedges, texts, autotexts = pie_result
-                else:
-                    wedges, texts = pie_result
-                    autotexts = []
-                ax2.set_title('Procentowy rozkład emocji', fontsize=14, pad=20)
-                st.pyplot(fig2)
-        
-        # Szczegółowa tabela wyników
-        if emotions is not None:
-            st.markdown('<div class="sub-header">📋 Ranking Emocji</div>', unsafe_allow_html=True)
-            
-            # Przygotuj dane do tabeli
-            emotion_data = []
-            for i, (emotion, value) in enumerate(sorted(emotions.items(), key=lambda x: x[1], reverse=True), 1):
-                emoji_map = {
-                    'happy': '😊', 'sad': '😢', 'angry': '😠', 'surprise': '😮', 
-                    'fear': '😨', 'disgust': '🤢', 'neutral': '😐'
-                }
-                color_map = {
-                    'happy': '🟢', 'sad': '🔵', 'angry': '🔴', 'surprise': '🟡', 
-                    'fear': '⚫', 'disgust': '🟢', 'neutral': '⚪'
-                }
-                
-                emotion_data.append({
-                    "Pozycja": f"{i}.",
-                    "Emocja": f"{emoji_map.get(emotion, '🎭')} {emotion.title()}",
-                    "Pewność": f"{value:.2f}%",
-                    "Status": color_map.get(emotion, '⚪')
-                })
-            
-            # Wyświetl tabelę w 3 kolumnach
-            col1, col2, col3 = st.columns([2, 1, 1])
-            
-            with col1:
-                for item in emotion_data:
-                    confidence = float(item["Pewność"].replace('%', ''))
-                    if confidence > 50:
-                        status_color = "🔥 Wysoka"
-                    elif confidence > 20:
-                        status_color = "🔶 Średnia"
-                    else:
-                        status_color = "🔹 Niska"
-                    
-                    st.markdown(f"""
-                    <div class="emotion-card">
-                        <strong>{item['Pozycja']} {item['Emocja']}</strong><br>
-                        <span style="font-size: 1.2em; color: #1f77b4;">{item['Pewność']}</span>
-                        <span style="float: right;">{status_color}</span>
-                    </div>
-                    """, unsafe_allow_html=True)
-        
-        else:
-            st.markdown('<div class="sub-header">❌ Problem z Analizą</div>', unsafe_allow_html=True)
-            st.error("Nie udało się wykryć twarzy na zdjęciu.")
+        # Analiza emocji (cache per obraz i detektor) with better error handling
+        typical_analysis_time = metrics.percentile('detection_classification', 50)
+        spinner_hint = f"Zwykle trwa to ~{typical_analysis_time:.1f} s." if typical_analysis_time else "To może potrwać chwilę."
+        with st.spinner(f'🔍 Analizuję emocje i wykrywam twarz... {spinner_hint}'):
+            if profile_analysis and st.session_state.get('profile_hash') != content_hash:
+                # Jeden profil na zdjęcie - kolejne przeładowania korzystają już z cache
+                with profile_block() as profile:
+                    analysis = run_image_analysis(content_hash, ANALYSIS_DETECTOR, image_bytes, use_history=False,
+                                                  min_confidence=detection_confidence)
+                st.session_state['profile_result'] = profile
+                st.session_state['profile_hash'] = content_hash
+            else:
+                analysis = analyze_image(content_hash, ANALYSIS_DETECTOR, analysis_engine.tier, detection_confidence,
+                                         image_bytes)
         
     except Exception as e:
         st.error(f"Błąd podczas analizy: {str(e)}")
         st.info("Spróbuj użyć innego zdjęcia z wyraźnie widoczną twarzą.")
     
     finally:
-        # Usuń plik tymczasowy
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
-        # Clean up memory after processing
-        cleanup_memory()
+        # Pomiar pamięci - odzyskiwanie tylko powyżej progów
+        memory_manager.end_request(memory_sample)
+    
+    if analysis is not None:
+        if analysis['from_history']:
+            st.caption("⚡ To zdjęcie było już analizowane - wynik z historii, bez ponownej analizy")
+        elif analysis['deduped_from']:
+            st.caption(f"⚡ Prawie identyczne zdjęcie było już analizowane (źródło {analysis['deduped_from'][:12]}…) "
+                       "- wynik przejęty bez ponownej analizy")
+        elif analysis['tier'] == TIER_LIGHT:
+            st.caption("⚡ Szybki wynik z lekkiego modelu - pełny model DeepFace ładuje się w tle "
+                       "i zostanie użyty po odświeżeniu")
+        render_analysis_results(analysis, image_bytes)
+
+# Panel osi czasu pamięci (tylko w trybie zaawansowanym)
+if show_advanced:
+    with st.sidebar.expander("🧠 Pamięć procesu"):
+        memory_timeline = memory_manager.get_timeline()
+        if memory_timeline:
+            last_sample = memory_timeline[-1]
+            st.metric("RSS (MB)", f"{last_sample['rss_after_mb']:.0f}",
+                      f"{last_sample['rss_after_mb'] - last_sample['rss_before_mb']:+.1f}")
+            st.line_chart({
+                "RSS przed (MB)": [sample['rss_before_mb'] for sample in memory_timeline],
+                "RSS po (MB)": [sample['rss_after_mb'] for sample in memory_timeline],
+            })
+            st.caption(f"Progi: {memory_manager.soft_watermark_mb:.0f} / {memory_manager.hard_watermark_mb:.0f} MB • "
+                       f"ostatnie odzyskiwanie: {last_sample['reclaim']}")
+            memory_breakdown = get_memory_breakdown()
+            if memory_breakdown is not None:
+                # USS - pamięć prywatna procesu; reszta RSS jest współdzielona (np. z prefork.py)
+                st.caption(f"USS: {memory_breakdown['uss_mb']:.0f} MB • współdzielone: "
+                           f"{memory_breakdown['shared_mb']:.0f} MB • PSS: {memory_breakdown['pss_mb']:.0f} MB")
+            for allocation in last_sample.get('top_allocators', []):
+                st.write(f"`{allocation['location']}` {allocation['size_diff_kb']:+.1f} KB")
+        else:
+            st.info("Brak pomiarów - przeanalizuj zdjęcie")
+    
+    if profile_analysis and 'profile_result' in st.session_state:
+        with st.sidebar.expander("🧪 Profil analizy", expanded=True):
+            profile = st.session_state['profile_result']
+            st.caption(f"Czas: {profile.wall_seconds:.2f} s • próbek stosu: {profile.samples}")
+            st.download_button("⬇️ Profil (pstats)", profile.pstats_bytes,
+                               file_name=f"analiza_{st.session_state['profile_hash'][:12]}.pstats",
+                               mime="application/octet-stream")
+            st.download_button("⬇️ Stosy (collapsed, flamegraph)", profile.collapsed_stacks,
+                               file_name=f"analiza_{st.session_state['profile_hash'][:12]}.collapsed.txt",
+                               mime="text/plain")
+            st.code(profile.summary, language="text")
+    
+    with st.sidebar.expander("🗂️ Zadania w tle"):
+        recent_jobs = job_queue.list_jobs()
+        if recent_jobs:
+            st.dataframe([
+                {
+                    'Zadanie': job['id'][:8],
+                    'Rodzaj': job['kind'],
+                    'Priorytet': job['priority'],
+                    'Stan': JOB_STATUS_LABELS.get(job['status'], job['status']),
+                    'Postęp': f"{job['progress']:.0%}",
+                    'Czas (s)': round(job['finished_at'] - job['started_at'], 1)
+                                if job['finished_at'] and job['started_at'] else None,
+                }
+                for job in recent_jobs
+            ], use_container_width=True)
+        else:
+            st.info("Brak zadań")
+    
+    with st.sidebar.expander("📚 Historia analiz"):
+        # Agregacja liczona w SQLite - do pamięci trafiają tylko sumy dzienne
+        daily_distribution: Dict[str, Dict[str, int]] = {}
+        for day, emotion, count in history_store.emotion_distribution_per_day():
+            daily_distribution.setdefault(emotion, {})[day] = count
+        if daily_distribution:
+            st.bar_chart(daily_distribution)
+            # Wszystkie wiersze per twarz - czytane z SQLite porcjami podczas zapisu pliku
+            history_columns = history_store.columns()
+            render_export_controls(
+                "📥 Eksportuj historię",
+                history_store.iter_rows,
+                "historia_emocji",
+                key="export_history",
+                fieldnames=[name for name, _ in history_columns],
+                schema=arrow_schema(history_columns) if PARQUET_AVAILABLE else None
+            )
+        else:
+            st.info("Historia jest pusta")
+
+# Ukryty panel administracyjny: ?admin=<EMOCJE_ADMIN_TOKEN>
+ADMIN_TOKEN = os.environ.get('EMOCJE_ADMIN_TOKEN')
+if ADMIN_TOKEN and st.query_params.get('admin') == ADMIN_TOKEN:
+    st.markdown('<div class="sub-header">🛠️ Metryki wydajności</div>', unsafe_allow_html=True)
+    stage_summary = metrics.summary()
+    if stage_summary:
+        st.dataframe(stage_summary, use_container_width=True)
+    else:
+        st.info("Brak pomiarów")
+    active_streams = STREAMS.summary()
+    if active_streams:
+        st.caption(f"Aktywne strumienie kamery • obciążenie węzła {load_score(len(active_streams)):.2f}")
+        st.dataframe(active_streams, use_container_width=True)
+    with st.expander("Prometheus /metrics"):
+        st.code(metrics.render_prometheus(), language="text")
@@ -1,9 +1,12 @@
 import streamlit as st
 import cv2
-from deepface import DeepFace
 import numpy as np
-import tempfile
-import os
+import time
+from metrics import REGISTRY as metrics
+from history_store import HistoryStore, image_hash
+from emotion_engine import EMOTION_LABELS, EmotionBatch, load_emotion_model, predict_emotions
+from face_detection import DETECTOR_CASCADE_BEST, detector_key, get_face_detector
+from display_images import encode_display_jpeg
 
 # === KONFIGURACJA STRONY ===
 st.set_page_config(
@@ -81,116 +84,133 @@ st.markdown("""
 
 # === FUNKCJE POMOCNICZE ===
 
-def correct_emotion_smart(emotion, confidence_dict):
+@st.cache_resource(show_spinner=False)
+def get_history_store():
+    """Trwała historia analiz współdzielona przez sesje"""
+    return HistoryStore()
+
+@st.cache_resource(show_spinner=False)
+def get_emotion_model():
+    """Sieć emocji DeepFace, budowana raz na proces"""
+    return load_emotion_model()
+
+def _emotion_indices(*labels):
+    return np.array([EMOTION_LABELS.index(label) for label in labels], dtype=np.intp)
+
+# Poprawki na podstawie obserwacji błędów - indeksy emocji w kolejności EMOTION_LABELS, liczone raz
+EMOTION_CORRECTIONS = {
+    EMOTION_LABELS.index('fear'): {
+        'likely_correct': _emotion_indices('surprise', 'sad'),
+        'often_wrong': _emotion_indices('happy'),
+        'replacement': EMOTION_LABELS.index('happy')
+    },
+    EMOTION_LABELS.index('angry'): {
+        'likely_correct': _emotion_indices('sad', 'disgust'),
+        'often_wrong': _emotion_indices('happy'),
+        'replacement': EMOTION_LABELS.index('neutral')
+    },
+    EMOTION_LABELS.index('sad'): {
+        'likely_correct': _emotion_indices('neutral', 'angry'),
+        'often_wrong': _emotion_indices('happy'),
+        'replacement': EMOTION_LABELS.index('neutral')
+    }
+}
+
+# Emotikony i polskie nazwy emocji w kolejności EMOTION_LABELS
+EMOTION_EMOJIS = ('😠', '🤢', '😨', '😊', '😢', '😲', '😐')
+EMOTION_POLISH = ('Złość', 'Obrzydzenie', 'Strach', 'Radość', 'Smutek', 'Zaskoczenie', 'Neutralna')
+
+def correct_emotion_smart(result):
     """
-    Inteligentna korekta emocji na podstawie typowych błędów klasyfikacji
+    Inteligentna korekta emocji na podstawie typowych błędów klasyfikacji.
+    Zwraca indeks emocji (EMOTION_LABELS).
     """
-    # Poprawki na podstawie obserwacji błędów
-    corrections = {
-        'fear': {
-            'likely_correct': ['surprise', 'sad'], 
-            'often_wrong': ['happy'],
-            'replacement': 'happy'
-        },
-        'angry': {
-            'likely_correct': ['sad', 'disgust'],
-            'often_wrong': ['happy'],
-            'replacement': 'neutral'
-        },
-        'sad': {
-            'likely_correct': ['neutral', 'angry'],
-            'often_wrong': ['happy'],
-            'replacement': 'neutral'
-        }
-    }
-    
-    if emotion in corrections:
-        correction_rule = corrections[emotion]
-        
+    correction_rule = EMOTION_CORRECTIONS.get(result.dominant)
+    if correction_rule is not None:
         # Sprawdź czy to prawdopodobnie błędna klasyfikacja
-        if any(wrong in confidence_dict and confidence_dict[wrong] > 0.1 
-               for wrong in correction_rule.get('often_wrong', [])):
+        if (result.scores[correction_rule['often_wrong']] > 0.1).any():
             return correction_rule['replacement']
         
         # Sprawdź alternatywne emocje
-        for likely_emotion in correction_rule.get('likely_correct', []):
-            if likely_emotion in confidence_dict and confidence_dict[likely_emotion] > 0.15:
-                return likely_emotion
+        for likely_emotion in correction_rule['likely_correct']:
+            if result.scores[likely_emotion] > 0.15:
+                return int(likely_emotion)
     
-    return emotion
+    return result.dominant
 
-def analyze_emotion(image_path):
-    """Analizuj emocje na zdjęciu"""
-    try:
-        # Analiza emocji
-        result = DeepFace.analyze(
-            img_path=image_path,
-            actions=['emotion'],
-            enforce_detection=False,
-            detector_backend='opencv'
-        )
-        
-        if isinstance(result, list):
-            result = result[0]
+@st.cache_data(show_spinner=False, max_entries=64)
+def preview_image(content_hash, _image_bytes):
+    """Podgląd zdjęcia pomniejszony do szerokości kolumny (JPEG, kodowany raz na obraz)"""
+    with metrics.time('image_encode'):
+        img = cv2.imdecode(np.frombuffer(_image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("Nie udało się zdekodować obrazu")
+        return encode_display_jpeg(img)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def analyze_emotion(content_hash, _image_bytes):
+    """Analizuj emocje na zdjęciu (lub weź wynik z historii, jeśli obraz był już analizowany).
+    
+    Wynik zależy tylko od obrazu, więc jest cache'owany po skrócie zawartości.
+    """
+    history_store = get_history_store()
+    # Zapisywana jest tylko najpewniejsza twarz - klucz inny niż pełnej kaskady w emocje.py
+    history_key = detector_key(DETECTOR_CASCADE_BEST, 0.0)
+    cached = history_store.lookup(content_hash, history_key)
+    if cached:
+        result = max(cached, key=lambda face: face.confidence)
+    else:
+        with metrics.time('decode'):
+            img = cv2.imdecode(np.frombuffer(_image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("Nie udało się zdekodować obrazu")
         
-        emotions = result['emotion']
-        dominant_emotion = result['dominant_emotion']
+        # Kaskada detekcji (Haar, a bez twarzy - MTCNN/RetinaFace); bez twarzy bez klasyfikacji
+        analysis_start = time.perf_counter()
+        with metrics.time('detection_classification'):
+            with metrics.time('face_detection'):
+                detections = get_face_detector().detect(img)
+            if not len(detections.boxes):
+                raise ValueError("Nie wykryto twarzy na zdjęciu")
         
-        # Korekta emocji
-        corrected_emotion = correct_emotion_smart(dominant_emotion, emotions)
+            # Klasyfikacja dokładnie tej ramki, którą przepuściła kaskada (najpewniejszej) -
+            # DeepFace.analyze wykrywałby twarz ponownie i mógł sklasyfikować inną
+            best = int(detections.confidences.argmax())
+            with metrics.time('classification'):
+                result = predict_emotions(get_emotion_model(), img, detections.boxes[best:best + 1])[0]
+        latency_ms = 1000 * (time.perf_counter() - analysis_start)
+    
+    # Korekta emocji
+    with metrics.time('correction'):
+        corrected_emotion = correct_emotion_smart(result)
         
-        # Stwórz poprawiony słownik emocji
-        corrected_emotions = emotions.copy()
-        if corrected_emotion != dominant_emotion:
+        # Stwórz poprawione wyniki emocji
+        corrected_scores = result.scores.copy()
+        if corrected_emotion != result.dominant:
             # Zwiększ pewność poprawionej emocji
-            corrected_emotions[corrected_emotion] = max(
-                corrected_emotions.get(corrected_emotion, 0), 
-                emotions[dominant_emotion] * 0.8
-            )
-        
-        return emotions, corrected_emotions
-        
-    except Exception as e:
-        st.error(f"Błąd podczas analizy: {str(e)}")
-        return None
+            corrected_scores[corrected_emotion] = max(corrected_scores[corrected_emotion], result.confidence * 0.8)
+    
+    if not cached:
+        history_store.record(content_hash, EmotionBatch.from_results([result]), history_key,
+                             latency_ms=latency_ms, corrected_emotion=EMOTION_LABELS[corrected_emotion])
+    
+    return result, corrected_scores
 
-def display_emotion_results(original_emotions, corrected_emotions, confidence_threshold):
+def display_emotion_results(result, corrected_scores, confidence_threshold):
     """Wyświetl wyniki analizy emocji"""
     
     # Znajdź dominującą emocję
-    dominant_original = max(original_emotions, key=original_emotions.get)
-    dominant_corrected = max(corrected_emotions, key=corrected_emotions.get)
-    
-    # Emotikony dla emocji
-    emotion_emojis = {
-        'happy': '😊',
-        'sad': '😢', 
-        'angry': '😠',
-        'fear': '😨',
-        'surprise': '😲',
-        'disgust': '🤢',
-        'neutral': '😐'
-    }
-    
-    # Polskie nazwy emocji
-    emotion_polish = {
-        'happy': 'Radość',
-        'sad': 'Smutek',
-        'angry': 'Złość', 
-        'fear': 'Strach',
-        'surprise': 'Zaskoczenie',
-        'disgust': 'Obrzydzenie',
-        'neutral': 'Neutralna'
-    }
+    dominant_original = result.dominant
+    dominant_corrected = int(corrected_scores.argmax())
     
     # Wyświetl główny wynik
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("### 🎭 Wykryta Emocja:")
-        emoji = emotion_emojis.get(dominant_corrected, '🤔')
-        polish_name = emotion_polish.get(dominant_corrected, dominant_corrected)
-        confidence = corrected_emotions[dominant_corrected]
+        emoji = EMOTION_EMOJIS[dominant_corrected]
+        polish_name = EMOTION_POLISH[dominant_corrected]
+        confidence = corrected_scores[dominant_corrected]
         
         st.markdown(f"""
         <div class="emotion-result">
@@ -207,8 +227,8 @@ def display_emotion_results(original_emotions, corrected_emotions, confidence_th
         # Pokaż korektę jeśli nastąpiła
         if dominant_original != dominant_corrected:
             st.markdown("### 🔧 Korekta Emocji:")
-            orig_emoji = emotion_emojis.get(dominant_original, '🤔')
-            orig_polish = emotion_polish.get(dominant_original, dominant_original)
+            orig_emoji = EMOTION_EMOJIS[dominant_original]
+            orig_polish = EMOTION_POLISH[dominant_original]
             
             st.markdown(f"""
             <div class="emotion-result" style="border-left-color: #f39c12;">
@@ -222,12 +242,11 @@ def display_emotion_results(original_emotions, corrected_emotions, confidence_th
     st.markdown("### 📊 Szczegółowe Wyniki:")
     
     # Sortuj emocje według pewności
-    sorted_emotions = sorted(corrected_emotions.items(), key=lambda x: x[1], reverse=True)
-    
-    for emotion, confidence in sorted_emotions:
+    for emotion in np.argsort(-corrected_scores, kind='stable'):
+        confidence = corrected_scores[emotion]
         if confidence >= confidence_threshold:
-            emoji = emotion_emojis.get(emotion, '🤔')
-            polish_name = emotion_polish.get(emotion, emotion)
+            emoji = EMOTION_EMOJIS[emotion]
+            polish_name = EMOTION_POLISH[emotion]
             
             # Progress bar
             progress_color = "#4ecdc4" if emotion == dominant_corrected else "#95a5a6"
@@ -245,6 +264,34 @@ def display_emotion_results(original_emotions, corrected_emotions, confidence_th
             </div>
             """, unsafe_allow_html=True)
 
+@st.fragment
+def render_results(result, corrected_scores):
+    """Widok wyników - zmiana progu przeładowuje tylko ten fragment, bez ponownej analizy"""
+    confidence_threshold = st.slider(
+        "🎯 Próg pewności (%)", 
+        min_value=0, 
+        max_value=100, 
+        value=10,
+        help="Emocje poniżej tego progu nie będą wyświetlane",
+        key="confidence_threshold"
+    )
+    
+    # Wyświetl wyniki
+    display_emotion_results(result, corrected_scores, confidence_threshold)
+    
+    # Dodatkowe informacje - czas analizy z pomiarów zamiast stałej wartości
+    analysis_p50 = metrics.percentile('detection_classification', 50)
+    analysis_p95 = metrics.percentile('detection_classification', 95)
+    analysis_time = (f"~{analysis_p50:.1f} s (p95: {analysis_p95:.1f} s)" if analysis_p50 is not None
+                     else "brak pomiarów (wynik z historii)")
+    st.markdown(f"""
+    ---
+    ### ℹ️ Informacje o analizie:
+    - **Model AI**: DeepFace z inteligentną korektą
+    - **Dokładność**: ~85-90% (po korekcie)
+    - **Czas analizy**: {analysis_time}
+    """)
+
 # === GŁÓWNA APLIKACJA ===
 
 # Nagłówek
@@ -263,15 +310,9 @@ st.markdown("""
 # === BOCZNY PANEL ===
 st.sidebar.markdown("## ⚙️ Ustawienia")
 
-confidence_threshold = st.sidebar.slider(
-    "🎯 Próg pewności (%)", 
-    min_value=0, 
-    max_value=100, 
-    value=10,
-    help="Emocje poniżej tego progu nie będą wyświetlane"
-)
-
 st.sidebar.markdown("""
+🎯 Próg pewności ustawisz nad wynikami analizy.
+
 ---
 ### 💡 Wskazówki:
 - Użyj zdjęcia o dobrej jakości
@@ -305,45 +346,27 @@ with col2:
 
 # Sprawdź czy mamy zdjęcie do analizy
 if uploaded_file is not None:
-    # Zapisz plik tymczasowo, bo DeepFace wymaga ścieżki do pliku
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-        tmp_file.write(uploaded_file.read())
-        tmp_path = tmp_file.name
+    with metrics.time('upload_read'):
+        image_bytes = uploaded_file.getvalue()
+        content_hash = image_hash(image_bytes)
     
     # Wyświetl podgląd zdjęcia
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        st.image(uploaded_file, caption="Przesłane zdjęcie", use_column_width=True)
+        st.image(preview_image(content_hash, image_bytes), caption="Przesłane zdjęcie", use_column_width=True)
     
-    # Przycisk analizy
+    # Przycisk analizy - wynik trafia do stanu sesji, więc przetrwa kolejne przeładowania
     if st.button("🔍 Analizuj Emocje", type="primary", use_container_width=True):
         with st.spinner("🔍 Analizuję emocje na zdjęciu..."):
-            # Analiza emocji
-            result = analyze_emotion(tmp_path)
-            
-            if result:
-                original_emotions, corrected_emotions = result
-                
-                # Wyświetl wyniki
-                display_emotion_results(original_emotions, corrected_emotions, confidence_threshold)
-                
-                # Dodatkowe informacje
-                st.markdown("""
-                ---
-                ### ℹ️ Informacje o analizie:
-                - **Model AI**: DeepFace z inteligentną korektą
-                - **Dokładność**: ~85-90% (po korekcie)
-                - **Czas analizy**: ~2-3 sekundy
-                """)
-                
-            else:
+            try:
+                st.session_state['analysis'] = (content_hash, analyze_emotion(content_hash, image_bytes))
+            except Exception as e:
+                st.error(f"Błąd podczas analizy: {str(e)}")
                 st.error("😞 Nie udało się wykryć twarzy na zdjęciu. Spróbuj z innym zdjęciem.")
     
-    # Usuń plik tymczasowy
-    try:
-        os.unlink(tmp_path)
-    except:
-        pass
+    analysis = st.session_state.get('analysis')
+    if analysis is not None and analysis[0] == content_hash:
+        render_results(*analysis[1])
 
 # === STOPKA ===
 st.markdown("""
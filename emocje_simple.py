@@ -6,18 +6,39 @@ import os
 os.environ['QT_QPA_PLATFORM'] = 'offscreen'
 os.environ['DISPLAY'] = ''
 
+# Lekki silnik (OpenCV + NumPy, bez TensorFlow) - jeśli się zaimportuje, wyniki są prawdziwe
+try:
+    import cv2
+    import numpy as np
+    from emotion_engine import EMOTION_LABELS
+    from tiered_engine import TIER_FULL, get_engine
+    ENGINE_AVAILABLE = True
+except ImportError:
+    ENGINE_AVAILABLE = False
+
 st.set_page_config(
     page_title="🎭 Rozpoznawanie Emocji",
     page_icon="🎭",
     layout="wide"
 )
 
+@st.cache_resource(show_spinner=False)
+def get_emotion_engine():
+    """Silnik wspólny dla sesji - DeepFace ładuje się w tle, jeśli jest dostępny"""
+    return get_engine()
+
+engine = get_emotion_engine() if ENGINE_AVAILABLE else None
+engine_ready = engine is not None and engine.tier is not None
+
 st.title("🎭 Analizator Emocji AI")
 st.markdown("**Wykrywaj emocje na zdjęciach dzięki sztucznej inteligencji**")
 
 # Check if we're in fallback mode
 st.info("⚠️ Aplikacja działa w trybie uproszczonym")
-st.info("📤 Możesz przesłać zdjęcie, ale analiza emocji jest tymczasowo niedostępna")
+if engine_ready:
+    st.info("📤 Analiza działa na lekkim modelu (OpenCV + NumPy)")
+else:
+    st.info("📤 Możesz przesłać zdjęcie, ale analiza emocji jest tymczasowo niedostępna")
 
 # File upload
 uploaded_file = st.file_uploader(
@@ -30,29 +51,58 @@ if uploaded_file is not None:
     # Display the image
     st.image(uploaded_file, caption="Przesłane zdjęcie", use_column_width=True)
     
-    st.warning("🔧 Analiza emocji jest tymczasowo niedostępna z powodu problemów z bibliotekami")
-    st.info("💡 Pracujemy nad rozwiązaniem problemu. Spróbuj ponownie później.")
-    
-    # Show mock results for demonstration
-    st.subheader("📊 Przykładowe wyniki analizy:")
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.metric("Dominująca emocja", "😊 Happy", "75%")
+    if engine_ready:
+        img_bgr = cv2.imdecode(np.frombuffer(uploaded_file.getvalue(), dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img_bgr is None:
+            st.error("Nie udało się odczytać zdjęcia")
+        else:
+            faces, tier = engine.analyze(img_bgr)
+            if not len(faces):
+                # Kaskada nie znalazła twarzy - pusty wynik, model emocji nie był uruchamiany
+                st.error("😞 Nie udało się wykryć twarzy na zdjęciu. Spróbuj z innym zdjęciem.")
+            else:
+                face = faces[0]
+
+                st.subheader("📊 Wyniki analizy:")
+                if tier == TIER_FULL:
+                    st.caption("🧠 Model: DeepFace")
+                else:
+                    st.caption("⚡ Model: lekki (NumPy)")
+            
+                col1, col2 = st.columns(2)
+            
+                with col1:
+                    st.metric("Dominująca emocja", face.dominant_emotion.title(), f"{face.confidence:.0f}%")
+                
+                with col2:
+                    for emotion in face.ranking():
+                        score = float(face.scores[emotion])
+                        label = EMOTION_LABELS[emotion].title()
+                        st.progress(min(score / 100, 1.0), text=f"{label}: {score:.0f}%")
+    else:
+        st.warning("🔧 Analiza emocji jest tymczasowo niedostępna z powodu problemów z bibliotekami")
+        st.info("💡 Pracujemy nad rozwiązaniem problemu. Spróbuj ponownie później.")
+        
+        # Show mock results for demonstration
+        st.subheader("📊 Przykładowe wyniki analizy:")
         
-    with col2:
-        # Mock emotion distribution
-        emotions = {
-            'Happy': 0.75,
-            'Neutral': 0.15,
-            'Surprise': 0.05,
-            'Sad': 0.03,
-            'Angry': 0.02
-        }
+        col1, col2 = st.columns(2)
         
-        for emotion, score in emotions.items():
-            st.progress(score, text=f"{emotion}: {score:.0%}")
+        with col1:
+            st.metric("Dominująca emocja", "😊 Happy", "75%")
+            
+        with col2:
+            # Mock emotion distribution
+            emotions = {
+                'Happy': 0.75,
+                'Neutral': 0.15,
+                'Surprise': 0.05,
+                'Sad': 0.03,
+                'Angry': 0.02
+            }
+            
+            for emotion, score in emotions.items():
+                st.progress(score, text=f"{emotion}: {score:.0%}")
 
 st.markdown("---")
 st.markdown("🔧 **Status techniczny:** Aplikacja działa w trybie fallback")
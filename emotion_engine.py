@@ -0,0 +1,337 @@
+"""
+Wspólne elementy klasyfikacji emocji na wyciętych twarzach.
+
+Model emocji DeepFace przyjmuje twarz w skali szarości 48x48 (wartości 0-1)
+i zwraca 7 prawdopodobieństw w stałej kolejności EMOTION_LABELS.
+
+Wagi modelu mogą być wyeksportowane z pliku h5 do plików .npy i czytane
+przez np.memmap (tylko do odczytu). Takie strony są współdzielone między
+procesami przez cache stron systemu i nigdy nie stają się prywatne, dlatego
+NumpyEmotionModel jest używany przez workery uruchamiane z prefork.py.
+"""
+import functools
+import inspect
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Kolejność wyjść modelu emocji DeepFace
+EMOTION_LABELS = ('angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral')
+EMOTION_INPUT_SIZE = 48
+
+# Parametry Haara jak w backendzie 'opencv' DeepFace; twarze mniejsze niż EMOCJE_MIN_FACE px są pomijane
+# (i tak są powiększane do wejścia 48x48, a najmniejsze okna to większość kosztu detekcji)
+HAAR_SCALE_FACTOR = 1.1
+HAAR_MIN_NEIGHBORS = 10
+HAAR_MIN_SIZE = (int(os.environ.get('EMOCJE_MIN_FACE', '40')),) * 2
+
+# Katalog z wagami w formacie .npy - ustawiany przez prefork.py dla workerów
+SHARED_WEIGHTS_ENV = 'EMOCJE_SHARED_WEIGHTS'
+
+_face_cascade: Optional[cv2.CascadeClassifier] = None
+_shared_model: Optional['NumpyEmotionModel'] = None
+
+
+def get_face_cascade() -> cv2.CascadeClassifier:
+    """Kaskada Haara - ta sama, której używa backend 'opencv' w DeepFace"""
+    global _face_cascade
+    if _face_cascade is None:
+        _face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    return _face_cascade
+
+
+def detect_faces_haar(gray: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """Wykrywa twarze na obrazie w skali szarości; zwraca listę (x, y, w, h)"""
+    faces = get_face_cascade().detectMultiScale(gray, HAAR_SCALE_FACTOR, HAAR_MIN_NEIGHBORS, minSize=HAAR_MIN_SIZE)
+    return [tuple(int(v) for v in face) for face in faces]
+
+
+def preprocess_face(gray_face: np.ndarray) -> np.ndarray:
+    """Przygotowuje wyciętą twarz (skala szarości) do wejścia modelu.
+
+    Jak functions.preprocess_face w DeepFace: skalowanie z zachowaniem
+    proporcji i dopełnienie czarnymi pikselami do 48x48.
+    """
+    height, width = gray_face.shape[:2]
+    factor = min(EMOTION_INPUT_SIZE / height, EMOTION_INPUT_SIZE / width)
+    resized = cv2.resize(gray_face, (max(1, int(width * factor)), max(1, int(height * factor))))
+    pad_rows = EMOTION_INPUT_SIZE - resized.shape[0]
+    pad_cols = EMOTION_INPUT_SIZE - resized.shape[1]
+    if pad_rows or pad_cols:
+        resized = np.pad(resized, ((pad_rows // 2, pad_rows - pad_rows // 2),
+                                   (pad_cols // 2, pad_cols - pad_cols // 2)), 'constant')
+    return resized.astype(np.float32) / 255.0
+
+
+def _forward(model, batch: np.ndarray) -> np.ndarray:
+    """Przebieg w przód bez narzutu Model.predict (pętla danych Keras przy każdym wywołaniu)"""
+    if isinstance(model, NumpyEmotionModel) or not callable(model):
+        return np.asarray(model.predict(batch, verbose=0), dtype=np.float32)
+    return np.asarray(model(batch, training=False), dtype=np.float32)
+
+
+def classify_faces(model, faces: Sequence[np.ndarray]) -> np.ndarray:
+    """Klasyfikuje paczkę przygotowanych twarzy jednym przebiegiem modelu.
+
+    Zwraca macierz (N, 7) z procentami w kolejności EMOTION_LABELS.
+    """
+    if len(faces) == 0:
+        return np.zeros((0, len(EMOTION_LABELS)), dtype=np.float32)
+    batch = np.stack(faces)[..., np.newaxis]
+    predictions = _forward(model, batch)
+    # Normalizacja jak w DeepFace.analyze: 100 * p / suma
+    return 100.0 * predictions / predictions.sum(axis=1, keepdims=True)
+
+
+class EmotionResult:
+    """Wynik dla jednej twarzy: 7 wyników float32 w kolejności EMOTION_LABELS, ramka i emocja dominująca.
+
+    Zamiast słowników DeepFace (emotion, region, dominant_emotion) - indeks
+    emocji dominującej jest liczony raz, a wyniki z EmotionBatch są widokami
+    tablicy paczki (bez kopiowania).
+    """
+
+    __slots__ = ('scores', 'box', 'dominant')
+
+    def __init__(self, scores: np.ndarray, box: Sequence[int], dominant: Optional[int] = None):
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.box: Tuple[int, int, int, int] = tuple(int(value) for value in box)
+        self.dominant = int(self.scores.argmax()) if dominant is None else int(dominant)
+
+    @classmethod
+    def from_dict(cls, face: Dict[str, Any]) -> 'EmotionResult':
+        """Z wyniku w formacie DeepFace.analyze"""
+        emotions = face.get('emotion', {})
+        region = face.get('region', {})
+        return cls([emotions.get(label, 0.0) for label in EMOTION_LABELS],
+                   [region.get(key) or 0 for key in ('x', 'y', 'w', 'h')])
+
+    @property
+    def dominant_emotion(self) -> str:
+        return EMOTION_LABELS[self.dominant]
+
+    @property
+    def confidence(self) -> float:
+        """Wynik emocji dominującej w procentach"""
+        return float(self.scores[self.dominant])
+
+    @property
+    def region(self) -> Dict[str, int]:
+        return dict(zip(('x', 'y', 'w', 'h'), self.box))
+
+    def ranking(self) -> np.ndarray:
+        """Indeksy emocji od najwyższego wyniku"""
+        return np.argsort(-self.scores, kind='stable')
+
+    def scaled(self, scale: float) -> 'EmotionResult':
+        """Ten sam wynik z ramką przeliczoną na obraz scale razy większy"""
+        if scale == 1.0:
+            return self
+        return EmotionResult(self.scores, [round(value * scale) for value in self.box], self.dominant)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Wynik w formacie DeepFace.analyze (dla kodu, który go oczekuje)"""
+        return {
+            'emotion': {label: float(score) for label, score in zip(EMOTION_LABELS, self.scores)},
+            'dominant_emotion': self.dominant_emotion,
+            'region': self.region,
+        }
+
+    def __repr__(self) -> str:
+        return f"EmotionResult({self.dominant_emotion} {self.confidence:.1f}%, box={self.box})"
+
+
+class EmotionBatch:
+    """Kolumnowy zbiór wyników wielu twarzy (np. jednego obrazu albo wsadu)"""
+
+    __slots__ = ('boxes', 'scores', 'dominant')
+
+    def __init__(self, boxes: np.ndarray, scores: np.ndarray, dominant: Optional[np.ndarray] = None):
+        self.boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)                            # (N, 4): x, y, w, h
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1, len(EMOTION_LABELS))      # (N, 7): procenty
+        self.dominant = self.scores.argmax(axis=1) if dominant is None else np.asarray(dominant)  # (N,)
+
+    @classmethod
+    def empty(cls) -> 'EmotionBatch':
+        """Wynik obrazu bez twarzy"""
+        return cls(np.zeros((0, 4), dtype=np.int32), np.zeros((0, len(EMOTION_LABELS)), dtype=np.float32))
+
+    @classmethod
+    def from_dicts(cls, faces: Sequence[Dict[str, Any]]) -> 'EmotionBatch':
+        """Z listy wyników w formacie DeepFace.analyze"""
+        return cls.from_results([EmotionResult.from_dict(face) for face in faces])
+
+    @classmethod
+    def from_results(cls, results: Sequence[EmotionResult]) -> 'EmotionBatch':
+        return cls([result.box for result in results], [result.scores for result in results],
+                   [result.dominant for result in results])
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def __getitem__(self, index: int) -> EmotionResult:
+        return EmotionResult(self.scores[index], self.boxes[index], self.dominant[index])
+
+    def __iter__(self) -> Iterator[EmotionResult]:
+        return (self[index] for index in range(len(self)))
+
+    def dominant_emotions(self) -> List[str]:
+        return [EMOTION_LABELS[index] for index in self.dominant]
+
+    def rescaled(self, scale_x: float, scale_y: float) -> 'EmotionBatch':
+        """Ramki przeliczone na obraz o innym rozmiarze (wyniki bez zmian)"""
+        boxes = np.rint(self.boxes * np.array([scale_x, scale_y, scale_x, scale_y]))
+        return EmotionBatch(boxes, self.scores, self.dominant)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Wyniki w formacie DeepFace.analyze (dla kodu, który go oczekuje)"""
+        return [result.to_dict() for result in self]
+
+
+def predict_emotions(model, image: np.ndarray, boxes: Sequence[Tuple[int, int, int, int]]) -> EmotionBatch:
+    """Emocje dla znanych ramek twarzy na zdekodowanym obrazie.
+
+    Tylko konwersja do skali szarości (raz dla całego obrazu), wycięcie,
+    skalowanie do 48x48 i jeden przebieg modelu dla wszystkich twarzy -
+    bez walidacji argumentów, detekcji i wyrównania z DeepFace.analyze.
+    Obraz BGR albo już w skali szarości.
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    box_array = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+    scores = classify_faces(model, [preprocess_face(gray[y:y + h, x:x + w]) for x, y, w, h in box_array])
+    return EmotionBatch(box_array, scores, scores.argmax(axis=1))
+
+
+def default_weights_path() -> str:
+    """Plik wag modelu emocji pobierany przez DeepFace"""
+    home = os.environ.get('DEEPFACE_HOME', os.path.expanduser('~'))
+    return os.path.join(home, '.deepface', 'weights', 'facial_expression_model_weights.h5')
+
+
+def read_h5_weights(h5_path: str) -> List[np.ndarray]:
+    """Czyta wagi z pliku Keras h5 w kolejności model.get_weights() - bez TensorFlow"""
+    import h5py
+    weights = []
+    with h5py.File(h5_path, 'r') as h5_file:
+        group = h5_file['model_weights'] if 'model_weights' in h5_file else h5_file
+        for layer_name in group.attrs['layer_names']:
+            layer = group[_decode(layer_name)]
+            for weight_name in layer.attrs['weight_names']:
+                weights.append(np.asarray(layer[_decode(weight_name)], dtype=np.float32))
+    return weights
+
+
+def _decode(name) -> str:
+    return name.decode('utf-8') if isinstance(name, bytes) else str(name)
+
+
+def export_weights(h5_path: str, directory: str) -> None:
+    """Zapisuje wagi jako osobne pliki .npy (pomija eksport, jeśli jest aktualny)"""
+    manifest_path = os.path.join(directory, 'manifest.json')
+    source_mtime = os.path.getmtime(h5_path)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as manifest_file:
+            if json.load(manifest_file).get('source_mtime') == source_mtime:
+                return
+    os.makedirs(directory, exist_ok=True)
+    weights = read_h5_weights(h5_path)
+    for index, array in enumerate(weights):
+        np.save(os.path.join(directory, f'{index:02d}.npy'), array)
+    with open(manifest_path, 'w') as manifest_file:
+        json.dump({'source_mtime': source_mtime, 'count': len(weights)}, manifest_file)
+
+
+def load_weights_mmap(directory: str) -> List[np.ndarray]:
+    """Wagi jako tablice mapowane z plików (tylko do odczytu)"""
+    with open(os.path.join(directory, 'manifest.json')) as manifest_file:
+        count = json.load(manifest_file)['count']
+    return [np.load(os.path.join(directory, f'{index:02d}.npy'), mmap_mode='r') for index in range(count)]
+
+
+def _conv2d_relu(x: np.ndarray, kernel: np.ndarray, bias: np.ndarray) -> np.ndarray:
+    kernel_height, kernel_width = kernel.shape[:2]
+    # (N, H', W', C, kh, kw) x (C, kh, kw, F) -> (N, H', W', F)
+    windows = sliding_window_view(x, (kernel_height, kernel_width), axis=(1, 2))
+    out = np.tensordot(windows, np.transpose(kernel, (2, 0, 1, 3)), axes=([3, 4, 5], [0, 1, 2]))
+    out += bias
+    return np.maximum(out, 0, out=out)
+
+
+def _pool(x: np.ndarray, size: int, stride: int, reduce) -> np.ndarray:
+    windows = sliding_window_view(x, (size, size), axis=(1, 2))[:, ::stride, ::stride]
+    return reduce(windows, axis=(-2, -1))
+
+
+class NumpyEmotionModel:
+    """Przebieg w przód sieci emocji DeepFace w NumPy (ta sama architektura i wagi).
+
+    Wagi nie są kopiowane, więc przy tablicach z load_weights_mmap model nie
+    zajmuje prywatnej pamięci procesu poza aktywacjami bieżącej paczki.
+    """
+
+    def __init__(self, weights: Sequence[np.ndarray]):
+        if len(weights) != 16:
+            raise ValueError(f"Oczekiwano 16 tablic wag modelu emocji, otrzymano {len(weights)}")
+        self.weights = list(weights)
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        """Zwraca prawdopodobieństwa (N, 7) dla paczki (N, 48, 48, 1) - API jak Keras"""
+        w = self.weights
+        x = np.asarray(batch, dtype=np.float32)
+        x = _pool(_conv2d_relu(x, w[0], w[1]), 5, 2, np.max)
+        x = _conv2d_relu(x, w[2], w[3])
+        x = _pool(_conv2d_relu(x, w[4], w[5]), 3, 2, np.mean)
+        x = _conv2d_relu(x, w[6], w[7])
+        x = _pool(_conv2d_relu(x, w[8], w[9]), 3, 2, np.mean)
+        x = x.reshape(len(x), -1)
+        x = np.maximum(x @ w[10] + w[11], 0)
+        x = np.maximum(x @ w[12] + w[13], 0)
+        logits = x @ w[14] + w[15]
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+
+def load_shared_emotion_model(directory: str) -> NumpyEmotionModel:
+    """Model na wagach mapowanych z plików - jedna instancja na proces (dziedziczona po fork)"""
+    global _shared_model
+    if _shared_model is None:
+        _shared_model = NumpyEmotionModel(load_weights_mmap(directory))
+    return _shared_model
+
+
+def load_emotion_model():
+    """Buduje (lub pobiera z cache DeepFace) model emocji.
+
+    W workerach prefork.py zwraca współdzielony model NumPy zamiast
+    budować prywatną kopię sieci TensorFlow.
+    """
+    shared_weights = os.environ.get(SHARED_WEIGHTS_ENV)
+    if shared_weights:
+        return load_shared_emotion_model(shared_weights)
+    from deepface import DeepFace
+    return DeepFace.build_model("Emotion")
+
+
+@functools.lru_cache(maxsize=None)
+def _quiet_option(analyze) -> Tuple[Tuple[str, bool], ...]:
+    parameters = inspect.signature(analyze).parameters
+    if 'silent' in parameters:
+        return (('silent', True),)
+    if 'prog_bar' in parameters:
+        return (('prog_bar', False),)
+    return ()
+
+
+def deepface_analyze(img, **kwargs):
+    """DeepFace.analyze bez pasków postępu i logów.
+
+    Przypięta wersja (0.0.75) wycisza wywołanie parametrem prog_bar,
+    nowsze - silent; przekazujemy ten, który zna zainstalowana wersja.
+    """
+    from deepface import DeepFace
+    return DeepFace.analyze(img, **dict(_quiet_option(DeepFace.analyze)), **kwargs)
@@ -0,0 +1,71 @@
+"""
+Historia emocji sesji na żywo w prealokowanym buforze cyklicznym NumPy.
+
+Dopisywanie jest O(1) i nie alokuje pamięci, więc może odbywać się z wątku
+inferencji; agregaty okienkowe (średnia krocząca, udział emocji dominującej)
+są liczone wektorowo na migawce bufora.
+"""
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+from emotion_engine import EMOTION_LABELS
+
+DEFAULT_CAPACITY = 3600  # ~1 godzina przy jednej analizie na sekundę
+
+
+class EmotionHistory:
+    """Bufor cykliczny znaczników czasu, 7 wyników emocji i ramek twarzy"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.scores = np.zeros((capacity, len(EMOTION_LABELS)), dtype=np.float32)
+        self.boxes = np.zeros((capacity, 4), dtype=np.int32)
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, timestamp: float, scores: np.ndarray, box: Tuple[int, int, int, int] = (0, 0, 0, 0)) -> None:
+        """Dopisuje próbkę, nadpisując najstarszą gdy bufor jest pełny"""
+        with self._lock:
+            index = self._next
+            self.timestamps[index] = timestamp
+            self.scores[index] = scores
+            self.boxes[index] = box
+            self._next = (index + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def snapshot(self, window_seconds: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Kopie (timestamps, scores, boxes) w kolejności chronologicznej.
+
+        Przy podanym window_seconds zwraca tylko próbki z ostatnich N sekund.
+        """
+        with self._lock:
+            order = (np.arange(self._size) + self._next - self._size) % self.capacity
+            timestamps = self.timestamps[order]
+            scores = self.scores[order]
+            boxes = self.boxes[order]
+        if window_seconds is not None and len(timestamps):
+            start = np.searchsorted(timestamps, timestamps[-1] - window_seconds, side='left')
+            timestamps, scores, boxes = timestamps[start:], scores[start:], boxes[start:]
+        return timestamps, scores, boxes
+
+    def rolling_mean(self, window_seconds: Optional[float] = None) -> Optional[np.ndarray]:
+        """Średnie wyniki emocji w oknie czasowym"""
+        _, scores, _ = self.snapshot(window_seconds)
+        if not len(scores):
+            return None
+        return scores.mean(axis=0)
+
+    def dominant_share(self, window_seconds: Optional[float] = None) -> Optional[np.ndarray]:
+        """Udział każdej emocji jako dominującej w oknie czasowym (0-1)"""
+        _, scores, _ = self.snapshot(window_seconds)
+        if not len(scores):
+            return None
+        dominant = scores.argmax(axis=1)
+        return np.bincount(dominant, minlength=len(EMOTION_LABELS)) / len(dominant)
@@ -0,0 +1,136 @@
+"""
+Eksport wyników analizy do CSV, JSONL i Parquet.
+
+Wiersze przychodzą jako iterator słowników (np. HistoryStore.iter_rows)
+i są zapisywane porcjami do pliku tymczasowego - podczas zapisu w pamięci
+jest najwyżej jedna porcja wierszy, a nie cały zbiór jako lista czy
+DataFrame. Ograniczenie: st.download_button nie strumieniuje pliku -
+gotowy eksport trafia do pamięci jako bajty (export_bytes) i Streamlit
+trzyma go do końca sesji, więc szczyt pamięci to rozmiar pliku (zwykle
+kilka razy mniej niż te same wiersze jako obiekty Pythona), a nie jedna
+porcja. Parquet wymaga pyarrow (instalowanego razem ze Streamlit).
+"""
+import csv
+import io
+import itertools
+import json
+import tempfile
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# Format -> (rozszerzenie pliku, typ MIME)
+EXPORT_FORMATS: Dict[str, Tuple[str, str]] = {
+    'CSV': ('csv', 'text/csv'),
+    'JSONL': ('jsonl', 'application/x-ndjson'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Typy kolumn SQLite -> typy Arrow (dla schematu Parquet)
+_SQLITE_TO_ARROW = {'INTEGER': 'int64', 'REAL': 'float64', 'TEXT': 'string'}
+
+
+def available_formats() -> List[str]:
+    return [name for name in EXPORT_FORMATS if name != 'Parquet' or PARQUET_AVAILABLE]
+
+
+def arrow_schema(columns: Sequence[Tuple[str, str]]):
+    """Schemat Arrow z listy (nazwa, typ SQLite) - stały, niezależny od wartości NULL w pierwszej porcji"""
+    return pa.schema([(name, _SQLITE_TO_ARROW.get(sql_type.upper(), 'string')) for name, sql_type in columns])
+
+
+def _with_fieldnames(rows: Iterable[Dict[str, Any]],
+                     fieldnames: Optional[Sequence[str]]) -> Tuple[Iterator[Dict[str, Any]], List[str]]:
+    """Kolumny z argumentu albo z pierwszego wiersza (bez zużywania iteratora)"""
+    rows = iter(rows)
+    if fieldnames is not None:
+        return rows, list(fieldnames)
+    first = next(rows, None)
+    if first is None:
+        return iter(()), []
+    return itertools.chain([first], rows), list(first)
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]], fieldnames: Sequence[str]) -> Iterator[str]:
+    """Generator kolejnych linii CSV (nagłówek, potem wiersze)"""
+    if not fieldnames:
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+    writer.writeheader()
+    for row in itertools.chain([None], rows):
+        if row is not None:
+            writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def iter_jsonl(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Generator linii JSON Lines"""
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, default=str) + '\n'
+
+
+def _batches(rows: Iterator[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_export(rows: Iterable[Dict[str, Any]],
+                 export_format: str,
+                 fieldnames: Optional[Sequence[str]] = None,
+                 schema: Any = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE) -> IO[bytes]:
+    """Zapisuje wiersze do pliku tymczasowego; zwraca plik ustawiony na początek"""
+    rows, fieldnames = _with_fieldnames(rows, fieldnames)
+    output = tempfile.TemporaryFile()
+    try:
+        if export_format == 'CSV':
+            for batch in _batches(iter_csv(rows, fieldnames), batch_size):
+                output.write(''.join(batch).encode('utf-8'))
+        elif export_format == 'JSONL':
+            for batch in _batches(iter_jsonl(rows), batch_size):
+                output.write(''.join(batch).encode('utf-8'))
+        elif export_format == 'Parquet':
+            if not PARQUET_AVAILABLE:
+                raise ValueError("Eksport do Parquet wymaga pakietu pyarrow")
+            writer = None
+            try:
+                for batch in _batches(rows, batch_size):
+                    table = pa.Table.from_pylist(batch, schema=schema)
+                    if writer is None:
+                        schema = table.schema
+                        writer = pq.ParquetWriter(output, schema)
+                    writer.write_table(table)
+                if writer is None:
+                    # Bez wierszy - poprawny plik Parquet z samym schematem
+                    if schema is None:
+                        schema = pa.schema([(name, pa.string()) for name in fieldnames])
+                    pq.write_table(schema.empty_table(), output)
+            finally:
+                if writer is not None:
+                    writer.close()
+        else:
+            raise ValueError(f"Nieznany format eksportu: {export_format}")
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+
+def export_bytes(rows: Iterable[Dict[str, Any]], export_format: str, **kwargs) -> bytes:
+    """Gotowa zawartość pliku do st.download_button (cały plik w pamięci - patrz opis modułu)"""
+    with write_export(rows, export_format, **kwargs) as output:
+        return output.read()
@@ -0,0 +1,185 @@
+"""
+Kaskada detekcji twarzy: najpierw tani Haar, cięższy detektor tylko w razie potrzeby.
+
+Haar (ten sam co backend 'opencv' w DeepFace) działa na obrazie pomniejszonym
+do EMOCJE_DETECTION_WIDTH px szerokości i pomija twarze mniejsze niż
+EMOCJE_MIN_FACE px - takie i tak są powiększane do wejścia 48x48 modelu.
+Pewność ramki Haara liczy się od nadwyżki scalonych sąsiednich wykryć n
+ponad minimum HAAR_MIN_NEIGHBORS: k / (k + HAAR_CONFIDENCE_HALF), k = n - min.
+Ramka tuż nad minimum ma pewność bliską zera, a domyślny próg 50% wymaga
+20 sąsiadów. Wyraźna twarz frontalna ma ich zwykle 20-35, a twarz
+rozmyta, obrócona albo mała - poniżej 20. Takie ramki trafiają do
+cięższego detektora.
+
+Gdy Haar nie znajdzie twarzy albo któraś ramka ma pewność poniżej progu,
+obraz trafia do cięższego detektora (MTCNN, RetinaFace - pierwszy, który
+da się zbudować; kolejność z EMOCJE_FALLBACK_DETECTORS, 0 wyłącza). Do
+klasyfikacji przechodzą tylko ramki z pewnością co najmniej progu, a brak
+twarzy oznacza pusty wynik - bez przebiegu modelu emocji na całym obrazie.
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from emotion_engine import HAAR_MIN_NEIGHBORS, HAAR_MIN_SIZE, HAAR_SCALE_FACTOR, get_face_cascade
+
+# Nazwa detektora w kluczu historii dla analizy kaskadowej
+DETECTOR_CASCADE = 'cascade'
+# Kaskada, z której zapisywana jest tylko najpewniejsza twarz (emocje_clean.py) - osobny klucz,
+# żeby jednotwarzowy wynik nie był zwracany jako wynik wszystkich twarzy obrazu
+DETECTOR_CASCADE_BEST = 'cascade-best'
+DETECTOR_HAAR = 'opencv'
+
+# Szerokość obrazu, na którym szukane są twarze (ramki przeliczane na oryginał)
+DETECTION_MAX_WIDTH = int(os.environ.get('EMOCJE_DETECTION_WIDTH', '640'))
+# Nadwyżka sąsiadów Haara ponad minimum, przy której pewność ramki wynosi 50%
+HAAR_CONFIDENCE_HALF = 10
+FALLBACK_DETECTORS = tuple(name for name in os.environ.get('EMOCJE_FALLBACK_DETECTORS', 'mtcnn,retinaface').split(',')
+                           if name and name != '0')
+
+
+class FaceDetections(NamedTuple):
+    """Ramki twarzy (N, 4) int32 w pikselach oryginału, pewności (N,) 0-1 i detektor, który je dał"""
+    boxes: np.ndarray
+    confidences: np.ndarray
+    detector: str
+
+    def gated(self, min_confidence: float) -> 'FaceDetections':
+        """Tylko ramki z pewnością co najmniej min_confidence"""
+        keep = self.confidences >= min_confidence
+        return FaceDetections(self.boxes[keep], self.confidences[keep], self.detector)
+
+
+def detector_key(detector: str, min_confidence: float) -> str:
+    """Klucz detektora w historii i indeksie duplikatów - wynik kaskady zależy też od progu pewności"""
+    if detector not in (DETECTOR_CASCADE, DETECTOR_CASCADE_BEST):
+        return detector
+    return f"{detector}>={round(100 * min_confidence)}"
+
+
+def _detections(raw: Sequence[Tuple[Sequence[float], float]], scale: float, detector: str) -> FaceDetections:
+    boxes = np.rint(np.asarray([box for box, _ in raw], dtype=np.float64).reshape(-1, 4) * scale).astype(np.int32)
+    boxes[:, :2] = np.maximum(boxes[:, :2], 0)
+    confidences = np.asarray([confidence for _, confidence in raw], dtype=np.float32)
+    return FaceDetections(boxes, confidences, detector)
+
+
+def detection_image(image: np.ndarray, max_width: int = DETECTION_MAX_WIDTH) -> Tuple[np.ndarray, float]:
+    """Obraz pomniejszony do max_width px szerokości i skala powrotu do oryginału"""
+    width = image.shape[1]
+    if width <= max_width:
+        return image, 1.0
+    height = max(1, round(image.shape[0] * max_width / width))
+    return cv2.resize(image, (max_width, height), interpolation=cv2.INTER_AREA), width / max_width
+
+
+def haar_confidence(neighbors: np.ndarray) -> np.ndarray:
+    """Pewność 0-1 ramek Haara z liczby scalonych sąsiednich wykryć"""
+    excess = np.maximum(np.asarray(neighbors, dtype=np.float32) - HAAR_MIN_NEIGHBORS, 0)
+    return excess / (excess + HAAR_CONFIDENCE_HALF)
+
+
+def haar_faces(image: np.ndarray, max_width: int = DETECTION_MAX_WIDTH) -> FaceDetections:
+    """Haar na pomniejszonym obrazie (BGR albo skala szarości) z pewnością z liczby sąsiadów"""
+    small, scale = detection_image(image, max_width)
+    gray = small if small.ndim == 2 else cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    boxes, neighbors = get_face_cascade().detectMultiScale2(gray, HAAR_SCALE_FACTOR, HAAR_MIN_NEIGHBORS,
+                                                            minSize=HAAR_MIN_SIZE)
+    confidences = haar_confidence(np.asarray(neighbors).reshape(-1))
+    return _detections(list(zip(np.asarray(boxes).reshape(-1, 4), confidences)), scale, DETECTOR_HAAR)
+
+
+def _build_mtcnn():
+    from mtcnn import MTCNN
+    return MTCNN()
+
+
+def _detect_mtcnn(model, image_bgr: np.ndarray) -> List[Tuple[Sequence[float], float]]:
+    faces = model.detect_faces(cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB))
+    return [(face['box'], float(face['confidence'])) for face in faces]
+
+
+def _build_retinaface():
+    from retinaface import RetinaFace
+    return RetinaFace.build_model()
+
+
+def _detect_retinaface(model, image_bgr: np.ndarray) -> List[Tuple[Sequence[float], float]]:
+    from retinaface import RetinaFace
+    faces = RetinaFace.detect_faces(image_bgr, model=model, threshold=0.5)
+    if not isinstance(faces, dict):
+        return []
+    return [((x1, y1, x2 - x1, y2 - y1), float(face['score']))
+            for face in faces.values() for x1, y1, x2, y2 in [face['facial_area']]]
+
+
+# Detektor: (budowa modelu, detekcja na obrazie BGR -> [(x, y, w, h), pewność 0-1])
+_HEAVY_DETECTORS: Dict[str, Tuple[Callable[[], Any], Callable[[Any, np.ndarray], List]]] = {
+    'mtcnn': (_build_mtcnn, _detect_mtcnn),
+    'retinaface': (_build_retinaface, _detect_retinaface),
+}
+
+
+class CascadeFaceDetector:
+    """Haar, a przy braku pewnych ramek - pierwszy działający cięższy detektor"""
+
+    def __init__(self, fallbacks: Sequence[str] = FALLBACK_DETECTORS, max_width: int = DETECTION_MAX_WIDTH):
+        self.fallbacks = [name for name in fallbacks if name in _HEAVY_DETECTORS]
+        self.max_width = max_width
+        # Błędy budowy cięższych detektorów (np. brak pakietu albo wag) - nie próbujemy ponownie
+        self.errors: Dict[str, str] = {}
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _heavy(self) -> Optional[str]:
+        """Nazwa pierwszego cięższego detektora, który da się zbudować (budowa raz, pod blokadą)"""
+        for name in self.fallbacks:
+            if name in self._models:
+                return name
+            if name in self.errors:
+                continue
+            try:
+                self._models[name] = _HEAVY_DETECTORS[name][0]()
+                return name
+            except Exception as e:
+                self.errors[name] = str(e)
+        return None
+
+    def detect(self, image: np.ndarray, min_confidence: float = 0.0, fallback: bool = True) -> FaceDetections:
+        """Twarze z pewnością >= min_confidence; pusty wynik, gdy żaden detektor ich nie znalazł.
+
+        fallback=False - tylko Haar (klatki na żywo, poziom lekki bez TensorFlow).
+        """
+        haar = haar_faces(image, self.max_width)
+        confident = haar.gated(min_confidence)
+        if not fallback or image.ndim == 2 or 0 < len(confident.boxes) == len(haar.boxes):
+            return confident
+        with self._lock:
+            name = self._heavy()
+            if name is None:
+                return confident
+            small, scale = detection_image(image, self.max_width)
+            try:
+                raw = _HEAVY_DETECTORS[name][1](self._models[name], small)
+            except Exception as e:
+                self.errors[name] = str(e)
+                del self._models[name]
+                return confident
+        heavy = _detections(raw, scale, name).gated(min_confidence)
+        return heavy if len(heavy.boxes) else confident
+
+
+_detector: Optional[CascadeFaceDetector] = None
+_detector_lock = threading.Lock()
+
+
+def get_face_detector() -> CascadeFaceDetector:
+    """Detektor wspólny dla procesu (cięższe modele budowane raz)"""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = CascadeFaceDetector()
+        return _detector
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Nagrywanie i odtwarzanie klatek trybu na żywo (pamięć mapowana).
+
+Wydajność trybu na żywo dało się dotąd odtworzyć tylko z przeglądarką
+i kamerą. Przy EMOCJE_RECORD_FRAMES=<katalog> każdy VideoProcessor zapisuje
+klatki docierające do recv - w formacie, w jakim przyszły z WebRTC
+(zwykle yuv420p, 1,5 bajta na piksel) - do osobnego nagrania:
+  * frames.u8  - surowe bajty klatek jedna za drugą,
+  * index.bin  - rekordy INDEX_DTYPE (przesunięcie, kształt, czas, pts),
+  * meta.json  - format pikseli i poziom przechwytywania strumienia.
+Oba pliki są tylko dopisywane, więc nagranie przerwane awarią procesu
+nadaje się do odtworzenia (niepełny ostatni rekord jest pomijany).
+
+FrameStore czyta nagranie przez np.memmap - klatki nie są wczytywane do
+pamięci z góry. replay podaje je po kolei do VideoProcessor.recv
+w oryginalnym tempie, przyspieszonym albo bez przerw; przy tym samym
+nagraniu i modelu analizowane są te same klatki i wyniki są identyczne,
+co sprawdza skrót historii emocji.
+
+Użycie:
+    EMOCJE_RECORD_FRAMES=nagrania streamlit run emocje.py
+    python frame_store.py info nagrania/20261019-101500-1a2b3c
+    python frame_store.py replay nagrania/20261019-101500-1a2b3c --speed 4 --repeat 3 --pstats recv.pstats
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault('TF_USE_LEGACY_KERAS', '1')
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '-1')
+
+import av
+import numpy as np
+
+from capture_policy import CaptureTier
+
+# Katalog nagrań; puste = nagrywanie wyłączone
+RECORD_DIR = os.environ.get('EMOCJE_RECORD_FRAMES', '')
+# Limit długości jednego nagrania (640x480 yuv420p przy 15 FPS to ~4,6 MB/s)
+RECORD_MAX_SECONDS = float(os.environ.get('EMOCJE_RECORD_MAX_SECONDS', '60'))
+
+DATA_FILE = 'frames.u8'
+INDEX_FILE = 'index.bin'
+META_FILE = 'meta.json'
+
+# Formaty zapisywane bez konwersji (av.VideoFrame.from_ndarray potrafi je odtworzyć)
+NATIVE_FORMATS = ('yuv420p', 'yuvj420p', 'nv12', 'bgr24', 'rgb24', 'gray')
+FALLBACK_FORMAT = 'yuv420p'
+
+INDEX_DTYPE = np.dtype([
+    ('offset', '<i8'),       # Początek klatki w frames.u8
+    ('timestamp', '<f8'),    # Sekundy od pierwszej klatki (wejście do recv)
+    ('pts', '<i8'),          # pts klatki WebRTC (-1 gdy brak)
+    ('shape', '<i4', (3,)),  # Kształt to_ndarray; 0 w ostatnim wymiarze dla tablic 2D
+])
+
+
+class FrameRecorder:
+    """Dopisuje klatki av.VideoFrame do nagrania (bezpieczne wątkowo)"""
+
+    def __init__(self, directory: str, tier: Optional[CaptureTier] = None,
+                 max_seconds: float = RECORD_MAX_SECONDS):
+        self.directory = directory
+        self.tier = tier
+        self.max_seconds = max_seconds
+        self.frames = 0
+        self.closed = False
+        self._format: Optional[str] = None
+        self._offset = 0
+        self._started: Optional[float] = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._data = open(os.path.join(directory, DATA_FILE), 'wb')
+        self._index = open(os.path.join(directory, INDEX_FILE), 'wb')
+
+    @classmethod
+    def for_session(cls, root: str, tier: Optional[CaptureTier] = None) -> 'FrameRecorder':
+        """Nowe nagranie w katalogu root, nazwane czasem rozpoczęcia"""
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        return cls(os.path.join(root, name), tier)
+
+    def record(self, frame: av.VideoFrame) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            if self.closed:
+                return
+            if self._started is None:
+                self._started = now
+                self._format = frame.format.name if frame.format.name in NATIVE_FORMATS else FALLBACK_FORMAT
+                self._write_meta()
+            elif now - self._started > self.max_seconds:
+                self._close()
+                return
+            if frame.format.name != self._format:
+                frame = frame.reformat(format=self._format)
+            array = np.ascontiguousarray(frame.to_ndarray())
+            entry = np.zeros(1, dtype=INDEX_DTYPE)
+            entry['offset'] = self._offset
+            entry['timestamp'] = now - self._started
+            entry['pts'] = frame.pts if frame.pts is not None else -1
+            entry['shape'] = array.shape + (0,) * (3 - array.ndim)
+            # Najpierw dane, potem rekord indeksu - rekord nigdy nie wskazuje niezapisanych bajtów
+            self._data.write(array.data)
+            self._index.write(entry.tobytes())
+            self._offset += array.nbytes
+            self.frames += 1
+
+    def _write_meta(self) -> None:
+        meta = {
+            'format': self._format,
+            'tier': self.tier._asdict() if self.tier is not None else None,
+            'created_at': time.time(),
+        }
+        with open(os.path.join(self.directory, META_FILE), 'w') as meta_file:
+            json.dump(meta, meta_file, indent=1)
+
+    def _close(self) -> None:
+        self.closed = True
+        self._data.close()
+        self._index.close()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self.closed:
+                self._close()
+
+
+class FrameStore:
+    """Nagranie do odczytu: klatki jako widoki np.memmap"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE)) as meta_file:
+            self.meta: Dict[str, Any] = json.load(meta_file)
+        self.format: str = self.meta['format']
+        tier = self.meta.get('tier')
+        self.tier: Optional[CaptureTier] = CaptureTier(**tier) if tier else None
+
+        data_path = os.path.join(directory, DATA_FILE)
+        data_size = os.path.getsize(data_path)
+        index_path = os.path.join(directory, INDEX_FILE)
+        records = os.path.getsize(index_path) // INDEX_DTYPE.itemsize
+        index = np.fromfile(index_path, dtype=INDEX_DTYPE, count=records)
+        shapes = index['shape']
+        nbytes = shapes[:, 0].astype(np.int64) * shapes[:, 1] * np.maximum(shapes[:, 2], 1)
+        # Nagranie przerwane w trakcie zapisu: tylko klatki w całości obecne w pliku danych
+        self.index = index[index['offset'] + nbytes <= data_size]
+        self.data = np.memmap(data_path, dtype=np.uint8, mode='r') if data_size else np.zeros(0, np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self.index['timestamp']
+
+    @property
+    def duration(self) -> float:
+        return float(self.timestamps[-1]) if len(self) else 0.0
+
+    def array(self, i: int) -> np.ndarray:
+        """Klatka i jako widok pliku (bez kopiowania)"""
+        entry = self.index[i]
+        shape = tuple(int(size) for size in entry['shape'] if size)
+        start = int(entry['offset'])
+        return self.data[start:start + int(np.prod(shape))].reshape(shape)
+
+    def frame(self, i: int) -> av.VideoFrame:
+        """Klatka i jako av.VideoFrame w formacie nagrania, z oryginalnym pts"""
+        frame = av.VideoFrame.from_ndarray(np.asarray(self.array(i)), format=self.format)
+        pts = int(self.index[i]['pts'])
+        if pts >= 0:
+            frame.pts = pts
+        return frame
+
+    def describe(self) -> Dict[str, Any]:
+        first = self.frame(0) if len(self) else None
+        return {
+            'frames': len(self),
+            'duration_s': round(self.duration, 2),
+            'fps': round((len(self) - 1) / self.duration, 1) if self.duration else 0.0,
+            'format': self.format,
+            'size': f"{first.width}x{first.height}" if first is not None else '',
+            'tier': self.tier.name if self.tier is not None else None,
+            'bytes': int(self.data.nbytes),
+        }
+
+
+def replay(store: FrameStore, processor, speed: float = 1.0) -> List[float]:
+    """Podaje klatki nagrania do processor.recv po kolei; zwraca czasy recv w sekundach.
+
+    speed=1 odtwarza oryginalne odstępy między klatkami, speed=4 czterokrotnie
+    szybciej, speed=0 bez przerw. Klatki nie są porzucane - każda trafia do
+    recv, więc zestaw analizowanych klatek zależy tylko od nagrania.
+    """
+    recv_seconds = []
+    start = time.perf_counter()
+    for i in range(len(store)):
+        frame = store.frame(i)
+        if speed > 0:
+            delay = start + float(store.timestamps[i]) / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        begin = time.perf_counter()
+        processor.recv(frame)
+        recv_seconds.append(time.perf_counter() - begin)
+    return recv_seconds
+
+
+def history_digest(processor) -> str:
+    """Skrót wyników emocji (zaokrąglonych) i ramek twarzy z historii procesora"""
+    _, scores, boxes = processor.history.snapshot()
+    digest = hashlib.sha256()
+    digest.update(np.round(scores, 2).astype(np.float32).tobytes())
+    digest.update(boxes.astype(np.int32).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Nagrania klatek trybu na żywo")
+    commands = parser.add_subparsers(dest='command', required=True)
+    info = commands.add_parser('info', help="Opis nagrania")
+    info.add_argument('recording')
+    replay_parser = commands.add_parser('replay', help="Odtwórz nagranie przez VideoProcessor.recv")
+    replay_parser.add_argument('recording')
+    replay_parser.add_argument('--speed', type=float, default=1.0,
+                               help="Mnożnik tempa (1 = oryginalne, 0 = bez przerw)")
+    replay_parser.add_argument('--repeat', type=int, default=1, help="Liczba odtworzeń (każde na nowym procesorze)")
+    replay_parser.add_argument('--light', action='store_true',
+                               help="Nie czekaj na DeepFace - odtwarzaj na lekkim modelu")
+    replay_parser.add_argument('--pstats', help="Profiluj odtworzenia i zapisz plik pstats")
+    replay_parser.add_argument('--collapsed', help="Zapisz stosy w formacie collapsed (flamegraph)")
+    args = parser.parse_args()
+
+    store = FrameStore(args.recording)
+    description = store.describe()
+    print(' • '.join(f"{key}: {value}" for key, value in description.items()))
+    if args.command == 'info':
+        return 0
+    if not len(store):
+        print("❌ Nagranie nie zawiera klatek", file=sys.stderr)
+        return 1
+
+    from live_processor import VideoProcessor
+    from tiered_engine import get_engine
+
+    engine = get_engine()
+    # Ten sam model przy każdym odtworzeniu - inaczej przełączenie poziomów zmieniłoby wyniki
+    ready = engine.wait_until_ready() if args.light else engine.wait_for_full()
+    if not ready:
+        print(f"❌ Model emocji niedostępny: {engine.full_error or engine.light_error}", file=sys.stderr)
+        return 1
+
+    # Rozgrzewka poza pomiarem (pierwszy przebieg modelu buduje graf)
+    warmup = VideoProcessor(store.tier)
+    warmup.recv(store.frame(0))
+    warmup.on_ended()
+
+    profiling = bool(args.pstats or args.collapsed)
+    if profiling:
+        from profiling import profile_block
+
+    print(f"{'przebieg':>8}{'klatki':>8}{'analizy':>9}{'recv p50':>10}{'p95':>8}{'p99':>8}"
+          f"{'czas s':>9}{'FPS':>7}  skrót wyników")
+    digests = set()
+    with profile_block() if profiling else nullcontext() as profile:
+        for run in range(1, args.repeat + 1):
+            processor = VideoProcessor(store.tier)
+            start = time.perf_counter()
+            recv_seconds = replay(store, processor, args.speed)
+            elapsed = time.perf_counter() - start
+            processor.on_ended()
+            digest = history_digest(processor)
+            digests.add(digest)
+            recv_ms = 1000 * np.asarray(recv_seconds)
+            print(f"{run:>8}{len(recv_seconds):>8}{len(processor.history):>9}"
+                  f"{np.percentile(recv_ms, 50):>10.1f}{np.percentile(recv_ms, 95):>8.1f}"
+                  f"{np.percentile(recv_ms, 99):>8.1f}{elapsed:>9.2f}{len(recv_seconds) / elapsed:>7.1f}  {digest}",
+                  flush=True)
+
+    if profiling:
+        if args.pstats:
+            with open(args.pstats, 'wb') as pstats_file:
+                pstats_file.write(profile.pstats_bytes)
+        if args.collapsed:
+            with open(args.collapsed, 'w') as collapsed_file:
+                collapsed_file.write(profile.collapsed_stacks)
+        print(f"💾 Profil: {profile.samples} próbek stosu, {profile.wall_seconds:.1f} s")
+
+    if len(digests) > 1:
+        print("❌ Odtworzenia dały różne wyniki emocji", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
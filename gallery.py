@@ -0,0 +1,93 @@
+"""
+Galeria twarzy dla dużych zbiorów wyników (wsady, historia).
+
+Karta na twarz jako osobny blok HTML przy tysiącach twarzy daje ogromną
+stronę i wolne przeładowania. Galeria pokazuje jedną stronę miniatur:
+filtrowanie po emocji i pewności, sortowanie i stronicowanie wykonuje
+SQLite (HistoryStore.count_faces/query_faces), a miniatury twarzy są
+wycinane i kodowane dopiero, gdy trafią na widoczną stronę - czas
+renderowania strony nie zależy od liczby wyników.
+
+Miniatury powstają z pomniejszonych kopii analizowanych obrazów
+(SourceImages), zapisywanych raz per skrót zawartości w EMOCJE_GALLERY_DIR.
+"""
+import os
+import tempfile
+from typing import Optional, Sequence
+
+import cv2
+import numpy as np
+
+from display_images import downscale
+
+GALLERY_DIR = os.environ.get('EMOCJE_GALLERY_DIR', os.path.join(tempfile.gettempdir(), 'emocje_gallery'))
+# Szerokość kopii źródłowej - twarz 150 px na zdjęciu 4000 px ma w niej jeszcze ~50 px
+GALLERY_SOURCE_WIDTH = int(os.environ.get('EMOCJE_GALLERY_SOURCE_WIDTH', '1280'))
+GALLERY_PAGE_SIZE = int(os.environ.get('EMOCJE_GALLERY_PAGE_SIZE', '24'))
+GALLERY_COLUMNS = 6
+THUMBNAIL_SIZE = 128
+THUMBNAIL_JPEG_QUALITY = 80
+# Margines wokół ramki twarzy w miniaturze (ułamek boku ramki)
+THUMBNAIL_MARGIN = 0.2
+
+
+class SourceImages:
+    """Pomniejszone kopie analizowanych obrazów (JPEG) adresowane skrótem zawartości"""
+
+    def __init__(self, directory: str = GALLERY_DIR, max_width: int = GALLERY_SOURCE_WIDTH):
+        self.directory = directory
+        self.max_width = max_width
+
+    def path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, content_hash[:2], f'{content_hash}.jpg')
+
+    def put(self, content_hash: str, img_bgr: np.ndarray) -> None:
+        """Zapisuje kopię obrazu (raz - istniejąca nie jest nadpisywana; zapis atomowy)"""
+        path = self.path(content_hash)
+        if os.path.exists(path):
+            return
+        ok, encoded = cv2.imencode('.jpg', downscale(img_bgr, self.max_width), [cv2.IMWRITE_JPEG_QUALITY, 90])
+        if not ok:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = f'{path}.tmp-{os.getpid()}'
+        with open(staging, 'wb') as image_file:
+            image_file.write(encoded.tobytes())
+        os.replace(staging, path)
+
+    def load(self, content_hash: str) -> Optional[np.ndarray]:
+        """Kopia obrazu BGR albo None, gdy nie została zapisana"""
+        path = self.path(content_hash)
+        if not os.path.exists(path):
+            return None
+        return cv2.imread(path, cv2.IMREAD_COLOR)
+
+
+def face_thumbnail(source_bgr: np.ndarray,
+                   box: Sequence[int],
+                   image_width: Optional[int] = None,
+                   size: int = THUMBNAIL_SIZE) -> bytes:
+    """Kwadratowa miniatura twarzy (JPEG) z kopii źródłowej.
+
+    box jest w pikselach oryginału o szerokości image_width (brak - kopia
+    w rozmiarze oryginału).
+    """
+    scale = source_bgr.shape[1] / image_width if image_width else 1.0
+    x, y, w, h = (value * scale for value in box)
+    height, width = source_bgr.shape[:2]
+    # Kwadrat z marginesem przesunięty do wnętrza obrazu (przy krawędzi bez zniekształceń)
+    side = max(1, min(round(max(w, h) * (1 + 2 * THUMBNAIL_MARGIN)), width, height))
+    left = int(np.clip(round(x + w / 2 - side / 2), 0, width - side))
+    top = int(np.clip(round(y + h / 2 - side / 2), 0, height - side))
+    crop = source_bgr[top:top + side, left:left + side]
+    interpolation = cv2.INTER_AREA if crop.shape[0] > size else cv2.INTER_LINEAR
+    thumbnail = cv2.resize(crop, (size, size), interpolation=interpolation)
+    ok, encoded = cv2.imencode('.jpg', thumbnail, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_JPEG_QUALITY])
+    if not ok:
+        raise ValueError("Nie udało się zakodować miniatury do JPEG")
+    return encoded.tobytes()
+
+
+def page_count(total: int, page_size: int) -> int:
+    """Liczba stron (co najmniej jedna - pusta galeria też ma stronę)"""
+    return max(1, -(-total // page_size))
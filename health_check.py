@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 """
 Health check script for Streamlit Cloud deployment
+
+Bez argumentów sprawdza importy bibliotek (weryfikacja wdrożenia - trwa
+kilka sekund, bo ładuje TensorFlow). Sondy dla orkiestratora pytają
+działający serwer przez HTTP i nie importują bibliotek ML:
+    python health_check.py --liveness    # /_stcore/health serwera Streamlit - proces odpowiada
+    python health_check.py --readiness   # /ready serwera metryk - model załadowany, kolejka, czas analizy
 """
+import argparse
+import json
 import sys
 import os
+import urllib.error
+import urllib.request
 
 # Set environment variables for stability
 os.environ['TF_USE_LEGACY_KERAS'] = '1'
@@ -47,7 +57,60 @@ def check_imports():
         print(f"❌ Import error: {e}")
         return False
 
+def probe(path, host, port, timeout):
+    """GET na serwerze aplikacji; zwraca (status HTTP, treść)"""
+    url = f"http://{host}:{port}{path}"
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, response.read().decode('utf-8')
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode('utf-8')
+    except (urllib.error.URLError, OSError) as e:
+        return None, str(e)
+
+def check_liveness(args):
+    # Sonda samego Streamlit - odpowiada od startu serwera, bez sesji i bez wątków aplikacji
+    status, body = probe('/_stcore/health', args.host, args.app_port, args.timeout)
+    if status == 200:
+        print("✅ Live")
+        return True
+    print(f"❌ Not live: {body.strip()}")
+    return False
+
+def check_readiness(args):
+    status, body = probe('/ready', args.host, args.port, args.timeout)
+    try:
+        state = json.loads(body)
+    except ValueError:
+        state = {'reason': body.strip()}
+    if status == 200 and 'workers' in state:
+        # Zbiorcza sonda procesu nadrzędnego prefork.py
+        print(f"✅ Ready • workers={len(state['workers'])}")
+        return True
+    if status == 200:
+        latency = state.get('latency_ms')
+        print(f"✅ Ready • tier={state.get('tier')} • in_flight={state.get('in_flight')} • "
+              f"latency={latency if latency is not None else '-'} ms")
+        return True
+    print(f"❌ Not ready: {state.get('reason') or status}")
+    return False
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Health check aplikacji Analizator Emocji")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--liveness', action='store_true', help="Szybka sonda życia (bez importów ML)")
+    mode.add_argument('--readiness', action='store_true', help="Sonda gotowości rozgrzanego silnika")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('EMOCJE_METRICS_PORT', '9108')),
+                        help="Port serwera metryk aplikacji (sonda gotowości)")
+    parser.add_argument('--app-port', type=int, default=int(os.environ.get('STREAMLIT_SERVER_PORT', '8501')),
+                        help="Port serwera Streamlit (sonda życia)")
+    parser.add_argument('--timeout', type=float, default=2.0)
+    args = parser.parse_args()
+    if args.liveness:
+        sys.exit(0 if check_liveness(args) else 1)
+    if args.readiness:
+        sys.exit(0 if check_readiness(args) else 1)
     if check_imports():
         print("🎉 Health check passed!")
         sys.exit(0)
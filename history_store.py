@@ -0,0 +1,268 @@
+"""
+Trwała historia analiz w lokalnej bazie SQLite.
+
+Tabela jest tylko dopisywana (append-only), a każdy wiersz to jedna twarz
+z jednej analizy. Indeks po skrócie zawartości obrazu pozwala zwrócić wynik
+ponownej analizy tego samego zdjęcia bez uruchamiania modelu, a indeks
+(day, dominant_emotion) obsługuje agregacje dzienne bez czytania całej tabeli.
+
+Kolumny perceptual_hash i image_w/image_h zasilają indeks prawie-duplikatów
+(dedup_index.py), a deduped_from wskazuje skrót obrazu, którego wynik
+został przejęty zamiast analizy (audyt).
+
+Galeria twarzy (gallery.py) filtruje, sortuje i stronicuje twarze w SQLite
+(count_faces, query_faces) - do aplikacji trafia tylko widoczna strona.
+"""
+import hashlib
+import os
+import sqlite3
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from emotion_engine import EMOTION_LABELS, EmotionBatch
+
+DEFAULT_DB_PATH = os.environ.get('EMOCJE_HISTORY_DB', 'emotion_history.db')
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    image_hash TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    day TEXT NOT NULL,
+    detector TEXT NOT NULL,
+    latency_ms REAL,
+    face_index INTEGER NOT NULL,
+    x INTEGER, y INTEGER, w INTEGER, h INTEGER,
+    {', '.join(f'{label} REAL' for label in EMOTION_LABELS)},
+    dominant_emotion TEXT NOT NULL,
+    corrected_emotion TEXT,
+    perceptual_hash INTEGER,
+    image_w INTEGER,
+    image_h INTEGER,
+    deduped_from TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_hash ON analyses (image_hash, detector);
+CREATE INDEX IF NOT EXISTS idx_analyses_day ON analyses (day, dominant_emotion);
+"""
+
+# Pewność twarzy w galerii - wynik emocji dominującej
+FACE_CONFIDENCE_SQL = f"MAX({', '.join(EMOTION_LABELS)})"
+
+# Indeksy galerii: strona posortowana po pewności (także w obrębie emocji) czytana wprost z indeksu,
+# a sprawdzenie "najnowsza analiza obrazu" bez odczytu wierszy tabeli
+_GALLERY_SCHEMA = f"""
+CREATE INDEX IF NOT EXISTS idx_analyses_latest ON analyses (image_hash, created_at);
+CREATE INDEX IF NOT EXISTS idx_analyses_confidence ON analyses ({FACE_CONFIDENCE_SQL});
+CREATE INDEX IF NOT EXISTS idx_analyses_emotion_confidence ON analyses (dominant_emotion, {FACE_CONFIDENCE_SQL});
+"""
+
+# Sortowanie galerii: klucz -> wyrażenie ORDER BY (bez kierunku); id rozstrzyga remisy, więc strony są stabilne
+FACE_SORTS = {
+    'confidence': FACE_CONFIDENCE_SQL,
+    'emotion': f"dominant_emotion {{direction}}, {FACE_CONFIDENCE_SQL}",
+    # Tabela jest tylko dopisywana - kolejność id to kolejność zapisu
+    'newest': 'id',
+}
+
+# Kolumny dodane po pierwszej wersji schematu - dopisywane do istniejących baz
+_ADDED_COLUMNS = (
+    ('perceptual_hash', 'INTEGER'),
+    ('image_w', 'INTEGER'),
+    ('image_h', 'INTEGER'),
+    ('deduped_from', 'TEXT'),
+)
+
+
+def image_hash(image_bytes: bytes) -> str:
+    """Skrót zawartości obrazu używany jako klucz historii"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class HistoryStore:
+    """Dopisywana historia analiz z wyszukiwaniem po skrócie obrazu"""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        with self._connect() as connection:
+            existing = {row[1] for row in connection.execute("PRAGMA table_info(analyses)")}
+            if existing:
+                for name, sql_type in _ADDED_COLUMNS:
+                    if name not in existing:
+                        connection.execute(f"ALTER TABLE analyses ADD COLUMN {name} {sql_type}")
+            connection.executescript(_SCHEMA)
+            connection.executescript(_GALLERY_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Osobne połączenie na operację - wątki Streamlit i procesora wideo nie dzielą kursora
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def record(self,
+               content_hash: str,
+               faces: EmotionBatch,
+               detector: str,
+               latency_ms: Optional[float] = None,
+               corrected_emotion: Optional[str] = None,
+               perceptual_hash: Optional[int] = None,
+               image_size: Optional[Tuple[int, int]] = None,
+               deduped_from: Optional[str] = None) -> None:
+        """Zapisuje wynik analizy (wiersz na twarz z paczki).
+
+        perceptual_hash to dHash jako INTEGER SQLite (dedup_index.to_sqlite),
+        image_size to (szerokość, wysokość) analizowanego obrazu.
+        """
+        image_w, image_h = image_size if image_size is not None else (None, None)
+        created_at = time.time()
+        day = time.strftime('%Y-%m-%d', time.localtime(created_at))
+        rows = [
+            (content_hash, created_at, day, detector, latency_ms, face_index,
+             *box, *scores, dominant_emotion,
+             corrected_emotion, perceptual_hash, image_w, image_h, deduped_from)
+            for face_index, (box, scores, dominant_emotion) in enumerate(zip(
+                faces.boxes.tolist(), faces.scores.tolist(), faces.dominant_emotions()
+            ))
+        ]
+        if not rows:
+            return
+        placeholders = ', '.join('?' * len(rows[0]))
+        with self._connect() as connection:
+            connection.executemany(
+                f"INSERT INTO analyses (image_hash, created_at, day, detector, latency_ms, face_index, "
+                f"x, y, w, h, {', '.join(EMOTION_LABELS)}, dominant_emotion, corrected_emotion, "
+                f"perceptual_hash, image_w, image_h, deduped_from) "
+                f"VALUES ({placeholders})",
+                rows
+            )
+
+    def lookup(self, content_hash: str, detector: str) -> Optional[EmotionBatch]:
+        """Zwraca zapisany wynik dla obrazu (najnowsza analiza) lub None"""
+        with self._connect() as connection:
+            latest = connection.execute(
+                "SELECT MAX(created_at) FROM analyses WHERE image_hash = ? AND detector = ?",
+                (content_hash, detector)
+            ).fetchone()[0]
+            if latest is None:
+                return None
+            rows = connection.execute(
+                f"SELECT x, y, w, h, {', '.join(EMOTION_LABELS)}, dominant_emotion FROM analyses "
+                "WHERE image_hash = ? AND detector = ? AND created_at = ? ORDER BY face_index",
+                (content_hash, detector, latest)
+            ).fetchall()
+        return EmotionBatch(
+            [[value or 0 for value in row[:4]] for row in rows],
+            [row[4:4 + len(EMOTION_LABELS)] for row in rows],
+            [EMOTION_LABELS.index(row[-1]) for row in rows],
+        )
+
+    def iter_dedup_entries(self) -> Iterator[Tuple[str, int, str, int, int]]:
+        """(detektor, dHash, skrót obrazu, szerokość, wysokość) obrazów faktycznie analizowanych.
+
+        Wiersze przejęte z innego obrazu (deduped_from) nie są źródłami -
+        indeks nie tworzy łańcuchów coraz dalszych duplikatów.
+        """
+        with self._connect() as connection:
+            yield from connection.execute(
+                "SELECT detector, perceptual_hash, image_hash, image_w, image_h FROM analyses "
+                "WHERE face_index = 0 AND perceptual_hash IS NOT NULL AND deduped_from IS NULL "
+                "GROUP BY image_hash, detector"
+            )
+
+    def dedup_hit_count(self) -> int:
+        """Liczba obrazów, których wynik przejęto z prawie-duplikatu"""
+        with self._connect() as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM analyses WHERE face_index = 0 AND deduped_from IS NOT NULL"
+            ).fetchone()[0]
+
+    def emotion_distribution_per_day(self, since_day: Optional[str] = None) -> Iterator[Tuple[str, str, int]]:
+        """Liczba twarzy per (dzień, emocja dominująca) - liczone w SQLite, strumieniowo"""
+        query = "SELECT day, dominant_emotion, COUNT(*) FROM analyses"
+        params: Tuple[Any, ...] = ()
+        if since_day is not None:
+            query += " WHERE day >= ?"
+            params = (since_day,)
+        query += " GROUP BY day, dominant_emotion ORDER BY day"
+        with self._connect() as connection:
+            yield from connection.execute(query, params)
+
+    @staticmethod
+    def _face_filter(emotion: Optional[str],
+                     min_confidence: float,
+                     image_hashes: Optional[Sequence[str]]) -> Tuple[str, List[Any]]:
+        """WHERE galerii: najnowsza analiza każdego obrazu, opcjonalnie emocja, próg i zbiór obrazów"""
+        clauses = ["NOT EXISTS (SELECT 1 FROM analyses AS newer WHERE newer.image_hash = analyses.image_hash "
+                   "AND newer.created_at > analyses.created_at)"]
+        params: List[Any] = []
+        if emotion is not None:
+            clauses.append("dominant_emotion = ?")
+            params.append(emotion)
+        if min_confidence > 0:
+            clauses.append(f"{FACE_CONFIDENCE_SQL} >= ?")
+            params.append(min_confidence)
+        if image_hashes is not None:
+            # Zbiór obrazów (np. jednego wsadu) jako jeden parametr JSON - bez limitu liczby parametrów SQLite
+            clauses.append("image_hash IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(image_hashes)))
+        return ' AND '.join(clauses), params
+
+    def latest_id(self) -> int:
+        """Id ostatniego wiersza - zmienia się przy każdym zapisie (klucz cache zliczeń)"""
+        with self._connect() as connection:
+            return connection.execute("SELECT MAX(id) FROM analyses").fetchone()[0] or 0
+
+    def count_faces(self,
+                    emotion: Optional[str] = None,
+                    min_confidence: float = 0.0,
+                    image_hashes: Optional[Sequence[str]] = None) -> int:
+        """Liczba twarzy spełniających filtry galerii"""
+        where, params = self._face_filter(emotion, min_confidence, image_hashes)
+        with self._connect() as connection:
+            return connection.execute(f"SELECT COUNT(*) FROM analyses WHERE {where}", params).fetchone()[0]
+
+    def query_faces(self,
+                    emotion: Optional[str] = None,
+                    min_confidence: float = 0.0,
+                    image_hashes: Optional[Sequence[str]] = None,
+                    sort: str = 'confidence',
+                    descending: bool = True,
+                    limit: int = 24,
+                    offset: int = 0) -> List[Dict[str, Any]]:
+        """Jedna strona twarzy galerii - filtrowanie, sortowanie i stronicowanie w SQLite"""
+        where, params = self._face_filter(emotion, min_confidence, image_hashes)
+        direction = 'DESC' if descending else 'ASC'
+        order = FACE_SORTS[sort].format(direction=direction)
+        with self._connect() as connection:
+            cursor = connection.execute(
+                f"SELECT id, image_hash, face_index, x, y, w, h, image_w, dominant_emotion, "
+                f"{FACE_CONFIDENCE_SQL} AS confidence, created_at FROM analyses WHERE {where} "
+                f"ORDER BY {order} {direction}, id {direction} LIMIT ? OFFSET ?",
+                (*params, limit, offset)
+            )
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def columns(self) -> List[Tuple[str, str]]:
+        """Kolumny tabeli jako (nazwa, typ SQLite) - np. do schematu eksportu"""
+        with self._connect() as connection:
+            return [(row[1], row[2]) for row in connection.execute("PRAGMA table_info(analyses)")]
+
+    def iter_rows(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Iteruje po wszystkich wierszach historii bez wczytywania ich naraz"""
+        with self._connect() as connection:
+            cursor = connection.execute("SELECT * FROM analyses ORDER BY id")
+            columns = [description[0] for description in cursor.description]
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    yield dict(zip(columns, row))
@@ -0,0 +1,19 @@
+"""
+Wyszukiwanie plików obrazów dla narzędzi wiersza poleceń (wsady, benchmarki).
+"""
+import os
+from typing import List, Sequence
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def collect_images(paths: Sequence[str]) -> List[str]:
+    """Pliki obrazów z podanych ścieżek: katalogi rozwijane (posortowane, bez podkatalogów), pliki wprost"""
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            images.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                 if name.lower().endswith(IMAGE_EXTENSIONS)))
+        else:
+            images.append(path)
+    return images
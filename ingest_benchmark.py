@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Koszt CPU przyjmowania klatek trybu na żywo: pełna konwersja do BGR vs libav.
+
+Porównuje dwie strategie recv dla klatek yuv420p (jak z WebRTC):
+  * przed - każda klatka konwertowana do BGR w pełnej rozdzielczości,
+    analiza (co N klatek) na pełnej klatce, klatka wyjściowa z BGR,
+  * po - co N klatek pomniejszony obraz w skali szarości z libav
+    (analysis_gray), konwersja do BGR tylko gdy rysowana jest nakładka.
+Dla każdej rozdzielczości podaje czas CPU konwersji na klatkę, czas CPU
+jednej analizy i średni koszt CPU na klatkę w cyklu N klatek.
+
+Użycie:
+    python ingest_benchmark.py --image twarz.jpg --sizes 1280x720,1920x1080 --every 30
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Callable, List
+
+os.environ.setdefault('TF_USE_LEGACY_KERAS', '1')
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '-1')
+
+import av
+import cv2
+
+from live_processor import ANALYSIS_MAX_WIDTH, analysis_gray
+from load_test import synthetic_frame
+from tiered_engine import get_engine
+
+
+def cpu_ms(function: Callable[[], object], repeats: int) -> float:
+    """Średni czas CPU procesu (wszystkie wątki) na wywołanie"""
+    function()  # Rozgrzewka
+    start = time.process_time()
+    for _ in range(repeats):
+        function()
+    return 1000 * (time.process_time() - start) / repeats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Koszt CPU recv: BGR każdej klatki vs skala szarości z libav")
+    parser.add_argument('--image', help="Zdjęcie twarzy (domyślnie klatka syntetyczna)")
+    parser.add_argument('--sizes', default='1280x720,1920x1080', help="Rozdzielczości klatek, np. 1280x720,1920x1080")
+    parser.add_argument('--every', type=int, default=30, help="Analiza co N klatek")
+    parser.add_argument('--repeats', type=int, default=200, help="Powtórzenia pomiaru konwersji")
+    parser.add_argument('--analysis-repeats', type=int, default=20, help="Powtórzenia pomiaru analizy")
+    args = parser.parse_args()
+
+    source = cv2.imread(args.image) if args.image else None
+    if args.image and source is None:
+        print(f"❌ Nie udało się wczytać obrazu: {args.image}", file=sys.stderr)
+        return 1
+    engine = get_engine()
+    if not engine.wait_until_ready():
+        print(f"❌ Model emocji niedostępny: {engine.full_error or engine.light_error}", file=sys.stderr)
+        return 1
+
+    print(f"Analiza co {args.every} klatek, obraz analizy do {ANALYSIS_MAX_WIDTH} px szerokości, "
+          f"model: {engine.tier}")
+    print(f"{'klatka':<11}{'wariant':<22}{'konwersja ms':>14}{'analiza ms':>12}{'CPU ms/klatkę':>15}")
+    rows: List[tuple] = []
+    for size in args.sizes.split(','):
+        width, height = (int(value) for value in size.lower().split('x'))
+        image = cv2.resize(source, (width, height)) if source is not None else synthetic_frame(width, height)
+        frame = av.VideoFrame.from_ndarray(image, format='bgr24').reformat(format='yuv420p')
+        bgr = frame.to_ndarray(format='bgr24')
+        gray, _ = analysis_gray(frame)
+
+        def convert_bgr():
+            # Konwersja do BGR i klatka wyjściowa z tablicy (jak przy każdej klatce przed zmianą)
+            return av.VideoFrame.from_ndarray(frame.to_ndarray(format='bgr24'), format='bgr24')
+
+        bgr_ms = cpu_ms(convert_bgr, args.repeats)
+        gray_ms = cpu_ms(lambda: analysis_gray(frame), args.repeats)
+        full_analysis_ms = cpu_ms(lambda: engine.analyze_lean(bgr), args.analysis_repeats)
+        gray_analysis_ms = cpu_ms(lambda: engine.analyze_lean(gray), args.analysis_repeats)
+
+        variants = (
+            # (wariant, konwersja na klatkę, konwersja dodatkowa na analizowaną klatkę, analiza)
+            ('przed', bgr_ms, 0.0, full_analysis_ms),
+            ('po, bez nakładki', 0.0, gray_ms, gray_analysis_ms),
+            ('po, z nakładką', bgr_ms, gray_ms, gray_analysis_ms),
+        )
+        for label, per_frame_ms, per_analysis_ms, analysis_ms in variants:
+            amortized = per_frame_ms + (per_analysis_ms + analysis_ms) / args.every
+            print(f"{size:<11}{label:<22}{per_frame_ms + per_analysis_ms / args.every:>14.3f}"
+                  f"{analysis_ms:>12.1f}{amortized:>15.2f}", flush=True)
+            rows.append((size, label, amortized))
+
+    for size in args.sizes.split(','):
+        costs = {label: cost for row_size, label, cost in rows if row_size == size}
+        print(f"{size}: {costs['przed'] / costs['po, bez nakładki']:.1f}x mniej CPU bez nakładki, "
+              f"{costs['przed'] / costs['po, z nakładką']:.1f}x z nakładką")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""
+Kolejka zadań w tle z zapisem w SQLite.
+
+Długie analizy (nagrania wideo, wsady zdjęć) są zgłaszane jako zadania
+z identyfikatorem i priorytetem i wykonywane przez wątki robocze procesu
+- niezależnie od przebiegów skryptu Streamlit. Interfejs tylko odpytuje
+stan zadania (postęp, wynik, błąd), więc zmiana widżetu czy przejście
+na inną stronę nie przerywa pracy.
+
+Zadanie z tym samym kluczem (np. skrót pliku i parametry) nie jest
+liczone drugi raz: submit zwraca istniejące zadanie oczekujące, trwające
+lub zakończone. Anulowanie jest kooperacyjne - przy najbliższym raporcie
+postępu.
+
+Trwające zadanie ma znacznik właściciela (losowy dla każdej instancji
+kolejki, a nie PID - zrestartowany kontener zwykle dostaje ten sam PID)
+i znacznik czasu ostatniego sygnału życia, odświeżany w tle. Zadania,
+których właściciel przestał nadawać (restart procesu, padnięty worker
+prefork.py), wracają do kolejki po EMOCJE_JOB_HEARTBEAT_TIMEOUT sekundach (domyślnie 30).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from history_store import DEFAULT_DB_PATH
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+TERMINAL_STATUSES = (DONE, FAILED, CANCELLED)
+
+# Co ile sekund najwyżej zapisywać postęp do bazy
+PROGRESS_WRITE_INTERVAL = 0.5
+# Sygnał życia trwających zadań i czas bez sygnału, po którym zadanie wraca do kolejki
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TIMEOUT = float(os.environ.get('EMOCJE_JOB_HEARTBEAT_TIMEOUT', '30'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    job_key TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    owner_token TEXT,
+    heartbeat_at REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority DESC, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs (job_key);
+"""
+
+# Kolumny dodane po pierwszej wersji schematu (migracja istniejących baz)
+_ADDED_COLUMNS = (('owner_token', 'TEXT'), ('heartbeat_at', 'REAL'))
+
+# Handler: (parametry, raport postępu 0-1) -> wynik serializowalny do JSON
+JobHandler = Callable[[Dict[str, Any], Callable[[float], None]], Any]
+
+
+class JobCancelled(Exception):
+    """Zgłaszany z raportu postępu, gdy zadanie zostało anulowane"""
+
+
+class JobQueue:
+    """Trwała kolejka zadań z priorytetami i wątkami roboczymi"""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, workers: int = 1,
+                 heartbeat_timeout: float = HEARTBEAT_TIMEOUT):
+        self.path = path
+        self.workers = workers
+        self.heartbeat_timeout = heartbeat_timeout
+        # Znacznik właściciela zadań tej instancji - inny po każdym restarcie procesu
+        self.token = uuid.uuid4().hex
+        self._handlers: Dict[str, JobHandler] = {}
+        self._wakeup = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        with self._connect() as connection:
+            existing = {row[1] for row in connection.execute("PRAGMA table_info(jobs)")}
+            if existing:
+                for name, sql_type in _ADDED_COLUMNS:
+                    if name not in existing:
+                        connection.execute(f"ALTER TABLE jobs ADD COLUMN {name} {sql_type}")
+            connection.executescript(_SCHEMA)
+        self.recover_orphans()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def recover_orphans(self) -> int:
+        """Zwraca do kolejki trwające zadania innych właścicieli bez sygnału życia; liczba zadań.
+
+        Workery prefork.py dzielą bazę - zadania żywych procesów (świeży sygnał) zostają.
+        """
+        with self._connect() as connection:
+            recovered = connection.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, owner_token = NULL, heartbeat_at = NULL "
+                "WHERE status = ? AND (owner_token IS NULL OR owner_token != ?) "
+                "AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (QUEUED, RUNNING, self.token, time.time() - self.heartbeat_timeout)
+            ).rowcount
+        if recovered:
+            with self._wakeup:
+                self._wakeup.notify_all()
+        return recovered
+
+    def heartbeat(self) -> None:
+        """Odświeża sygnał życia wszystkich trwających zadań tej instancji"""
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND owner_token = ?",
+                               (time.time(), RUNNING, self.token))
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    def start(self) -> None:
+        """Uruchamia wątki robocze (tylko raz)"""
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'emocje-job-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._keep_alive, name='emocje-job-heartbeat', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def submit(self, kind: str, params: Dict[str, Any], key: Optional[str] = None, priority: int = 0) -> str:
+        """Zgłasza zadanie; przy istniejącym kluczu zwraca zadanie aktywne lub zakończone sukcesem"""
+        if kind not in self._handlers:
+            raise ValueError(f"Nieznany rodzaj zadania: {kind}")
+        with self._connect() as connection:
+            if key is not None:
+                existing = connection.execute(
+                    "SELECT id FROM jobs WHERE job_key = ? AND status IN (?, ?, ?) ORDER BY created_at DESC LIMIT 1",
+                    (key, QUEUED, RUNNING, DONE)
+                ).fetchone()
+                if existing is not None:
+                    return existing['id']
+            job_id = uuid.uuid4().hex
+            connection.execute(
+                "INSERT INTO jobs (id, kind, job_key, priority, status, params, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, key, priority, QUEUED, json.dumps(params), time.time())
+            )
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def find(self, key: str) -> Optional[Dict[str, Any]]:
+        """Najnowsze zadanie o danym kluczu (dowolny stan)"""
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE job_key = ? ORDER BY created_at DESC LIMIT 1", (key,)
+            ).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Ostatnie zadania bez wyników (do tabeli w panelu)"""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT id, kind, priority, status, progress, error, created_at, started_at, finished_at "
+                "FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def queue_depth(self) -> int:
+        """Liczba zadań oczekujących i trwających"""
+        with self._connect() as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+            ).fetchone()[0]
+
+    def cancel(self, job_id: str) -> None:
+        """Oczekujące zadanie jest anulowane od razu, trwające - przy najbliższym raporcie postępu"""
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED)
+            )
+            connection.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Pobiera zadanie o najwyższym priorytecie i oznacza je jako trwające (atomowo)"""
+        now = time.time()
+        with self._connect() as connection:
+            rows = connection.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, progress = 0, owner_token = ?, heartbeat_at = ? "
+                "WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY priority DESC, created_at LIMIT 1"
+                ") AND status = ? RETURNING id, kind, params",
+                (RUNNING, now, self.token, now, QUEUED, QUEUED)
+            ).fetchall()
+        return rows[0] if rows else None
+
+    def _keep_alive(self) -> None:
+        """Sygnał życia własnych zadań i przejmowanie zadań po procesach, które przestały go nadawać"""
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                self.heartbeat()
+                self.recover_orphans()
+            except sqlite3.Error:
+                pass  # Baza chwilowo zablokowana - spróbujemy przy następnym sygnale
+
+    def _work(self) -> None:
+        while True:
+            job = self._claim()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=2.0)
+                continue
+            self._run(job['id'], job['kind'], json.loads(job['params']))
+
+    def _run(self, job_id: str, kind: str, params: Dict[str, Any]) -> None:
+        last_write = 0.0
+
+        def report(fraction: float) -> None:
+            nonlocal last_write
+            now = time.monotonic()
+            if now - last_write < PROGRESS_WRITE_INTERVAL:
+                return
+            last_write = now
+            with self._connect() as connection:
+                owned = connection.execute(
+                    "UPDATE jobs SET progress = ? WHERE id = ? AND owner_token = ?",
+                    (float(fraction), job_id, self.token)
+                ).rowcount
+                cancel_requested = connection.execute(
+                    "SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)
+                ).fetchone()[0]
+            if not owned or cancel_requested:
+                # Bez własności zadanie przejęła inna instancja (brak sygnału życia) - przerywamy
+                raise JobCancelled()
+
+        status, result, error = DONE, None, None
+        try:
+            handler = self._handlers.get(kind)
+            if handler is None:
+                raise ValueError(f"Nieznany rodzaj zadania: {kind}")
+            result = json.dumps(handler(params, report), default=str)
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            status, error = FAILED, str(e)
+        # Tylko właściciel zapisuje wynik - zadania przejętego przez inną instancję nie nadpisujemy
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, progress = CASE WHEN ? THEN 1 ELSE progress END, "
+                "finished_at = ? WHERE id = ? AND owner_token = ?",
+                (status, result, error, status == DONE, time.time(), job_id, self.token)
+            )
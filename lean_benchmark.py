@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Zgodność i wydajność ścieżki bezpośredniej (predict_emotions) względem DeepFace.analyze.
+
+Dla każdego obrazu zbioru wzorcowego twarze są wykrywane kaskadą Haara,
+a następnie klasyfikowane na dwa sposoby:
+  * predict_emotions - skala szarości, 48x48, jeden przebieg modelu,
+  * DeepFace.analyze na wyciętej twarzy z detector_backend='skip'
+    (ta sama twarz, bez ponownej detekcji i wyrównania).
+Wyniki muszą się zgadzać co do emocji dominującej i w granicy tolerancji
+(punkty procentowe). Wyniki DeepFace można zapisać do pliku JSON (--record)
+i później porównywać z nim bez ponownego liczenia wzorca.
+
+Pomiar czasu obejmuje ścieżkę bezpośrednią, DeepFace.analyze z 'skip'
+i pełne DeepFace.analyze (detekcja 'opencv' + wyrównanie) na całym obrazie.
+
+Użycie:
+    python lean_benchmark.py zdjecia/ --golden wzorzec.json --record
+    python lean_benchmark.py zdjecia/ --golden wzorzec.json --repeats 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+os.environ.setdefault('TF_USE_LEGACY_KERAS', '1')
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '-1')
+
+import cv2
+import numpy as np
+
+from emotion_engine import (EMOTION_LABELS, NumpyEmotionModel, deepface_analyze, default_weights_path,
+                            detect_faces_haar, load_emotion_model, predict_emotions, read_h5_weights)
+from image_files import collect_images
+
+Box = Tuple[int, int, int, int]
+
+
+def face_boxes(image: np.ndarray) -> List[Box]:
+    """Ramki Haara; bez twarzy cały obraz (jak enforce_detection=False)"""
+    boxes = detect_faces_haar(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+    return boxes or [(0, 0, image.shape[1], image.shape[0])]
+
+
+def deepface_scores(image: np.ndarray, boxes: List[Box]) -> List[List[float]]:
+    """Wzorzec: DeepFace.analyze osobno dla każdej wyciętej twarzy"""
+    scores = []
+    for x, y, w, h in boxes:
+        result = deepface_analyze(image[y:y + h, x:x + w], actions=['emotion'], detector_backend='skip',
+                                  enforce_detection=False)
+        result = result[0] if isinstance(result, list) else result
+        scores.append([float(result['emotion'][label]) for label in EMOTION_LABELS])
+    return scores
+
+
+def time_ms(function, repeats: int) -> List[float]:
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        durations.append(1000 * (time.perf_counter() - start))
+    return durations
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Ścieżka bezpośrednia vs DeepFace.analyze")
+    parser.add_argument('images', nargs='+', help="Pliki obrazów lub katalogi")
+    parser.add_argument('--golden', help="Plik JSON z wynikami DeepFace (wzorzec)")
+    parser.add_argument('--record', action='store_true', help="Policz wzorzec DeepFace i zapisz do --golden")
+    parser.add_argument('--model', choices=('keras', 'numpy'), default='keras',
+                        help="Model ścieżki bezpośredniej: sieć Keras z DeepFace albo NumpyEmotionModel")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="Maksymalna różnica w punktach procentowych")
+    parser.add_argument('--repeats', type=int, default=10, help="Powtórzenia pomiaru czasu (0 = bez pomiaru)")
+    args = parser.parse_args()
+
+    paths = collect_images(args.images)
+    images = {}
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"⚠️ Pominięto (nie da się wczytać): {path}", file=sys.stderr)
+            continue
+        images[os.path.basename(path)] = image
+    if not images:
+        print("❌ Brak obrazów do porównania", file=sys.stderr)
+        return 1
+
+    model = load_emotion_model() if args.model == 'keras' else NumpyEmotionModel(read_h5_weights(default_weights_path()))
+    boxes = {name: face_boxes(image) for name, image in images.items()}
+
+    golden: Dict[str, Any] = {}
+    if args.golden and os.path.exists(args.golden) and not args.record:
+        with open(args.golden) as golden_file:
+            golden = json.load(golden_file)
+    for name, image in images.items():
+        entry = golden.get(name)
+        if entry is None or [tuple(box) for box in entry['boxes']] != boxes[name]:
+            # Brak wzorca albo inne ramki (np. inna wersja OpenCV) - liczymy na bieżąco
+            golden[name] = {'boxes': [list(box) for box in boxes[name]],
+                            'scores': deepface_scores(image, boxes[name])}
+    if args.golden and args.record:
+        with open(args.golden, 'w') as golden_file:
+            json.dump(golden, golden_file, indent=1)
+        print(f"💾 Zapisano wzorzec dla {len(images)} obrazów: {args.golden}")
+
+    failures = 0
+    max_diff = 0.0
+    faces = 0
+    for name, image in images.items():
+        prediction = predict_emotions(model, image, boxes[name])
+        reference = np.asarray(golden[name]['scores'], dtype=np.float32)
+        diff = float(np.abs(prediction.scores - reference).max())
+        same_dominant = bool((prediction.dominant == reference.argmax(axis=1)).all())
+        max_diff = max(max_diff, diff)
+        faces += len(reference)
+        if diff > args.tolerance or not same_dominant:
+            failures += 1
+            print(f"❌ {name}: różnica {diff:.3f} pp, emocja dominująca {'zgodna' if same_dominant else 'RÓŻNA'}")
+    print(f"Zgodność: {len(images) - failures}/{len(images)} obrazów, {faces} twarzy, "
+          f"maks. różnica {max_diff:.4f} pp (tolerancja {args.tolerance} pp)")
+
+    if args.repeats > 0:
+        image_list = list(images.items())
+
+        def lean():
+            for name, image in image_list:
+                predict_emotions(model, image, boxes[name])
+
+        def deepface_skip():
+            for name, image in image_list:
+                deepface_scores(image, boxes[name])
+
+        def deepface_full():
+            for _, image in image_list:
+                deepface_analyze(image, actions=['emotion'], enforce_detection=False)
+
+        print(f"{'ścieżka':<26}{'p50 ms/obraz':>14}{'p95 ms/obraz':>14}")
+        timings = {}
+        for label, function in (('predict_emotions', lean), ("DeepFace 'skip'", deepface_skip),
+                                ("DeepFace 'opencv'", deepface_full)):
+            function()  # Rozgrzewka
+            durations = np.asarray(time_ms(function, args.repeats)) / len(image_list)
+            timings[label] = float(np.percentile(durations, 50))
+            print(f"{label:<26}{timings[label]:>14.2f}{float(np.percentile(durations, 95)):>14.2f}")
+        for label in ("DeepFace 'skip'", "DeepFace 'opencv'"):
+            print(f"Przyspieszenie vs {label}: {timings[label] / timings['predict_emotions']:.1f}x")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Przetwarzanie klatek z kamery (WebRTC) w czasie rzeczywistym.
+
+Jeden VideoProcessor przypada na połączenie WebRTC: trzyma ostatni wynik,
+gotową nakładkę i historię emocji sesji. Moduł nie zależy od skryptu
+aplikacji, więc procesor można tworzyć bezpośrednio (np. w load_test.py).
+Wymaga streamlit-webrtc i PyAV.
+
+Klatka nie jest konwertowana w całości: do analizy (co N klatek) libav
+tworzy od razu pomniejszony obraz w skali szarości, a pełna konwersja do
+BGR odbywa się tylko wtedy, gdy trzeba narysować nakładkę. Pozostałe
+klatki wracają do WebRTC bez zmian.
+"""
+import os
+import threading
+import time
+from typing import Tuple
+
+import av
+import numpy as np
+from streamlit_webrtc import VideoTransformerBase  # type: ignore
+
+from capture_policy import STREAMS, analyze_every_n_frames
+from emotion_history import EmotionHistory
+from frame_store import RECORD_DIR, FrameRecorder
+from metrics import REGISTRY as metrics
+from overlay import build_overlay, draw_overlay
+from tiered_engine import get_engine
+
+# Szerokość obrazu do detekcji i klasyfikacji - szersze klatki są pomniejszane
+ANALYSIS_MAX_WIDTH = int(os.environ.get('EMOCJE_ANALYSIS_WIDTH', '640'))
+
+
+def analysis_gray(frame: av.VideoFrame, max_width: int = ANALYSIS_MAX_WIDTH) -> Tuple[np.ndarray, float]:
+    """Klatka w skali szarości pomniejszona w libav do max_width; zwraca (obraz, skala do pełnej klatki)"""
+    width, height = frame.width, frame.height
+    if width > max_width:
+        width, height = max_width, max(1, round(frame.height * max_width / frame.width))
+    gray = frame.reformat(width=width, height=height, format='gray', interpolation='AREA').to_ndarray()
+    return gray, frame.width / width
+
+
+class VideoProcessor(VideoTransformerBase):  # type: ignore
+    """Klasa do przetwarzania wideo z kamery w czasie rzeczywistym"""
+
+    def __init__(self, capture_tier=None):
+        self.frame_count = 0
+        # Analizuj około raz na sekundę przy wynegocjowanej liczbie klatek
+        self.analyze_every_n_frames = analyze_every_n_frames(capture_tier)
+        # Wynik i historia należą do sesji (jeden procesor na połączenie WebRTC)
+        self.latest_emotion_result = None
+        self.overlay = None
+        self.emotion_lock = threading.Lock()
+        self.history = EmotionHistory()
+        self.ingest = STREAMS.register(capture_tier)
+        # Nagrywanie klatek do odtworzenia bez kamery (frame_store.py)
+        self.recorder = FrameRecorder.for_session(RECORD_DIR, capture_tier) if RECORD_DIR else None
+
+    def on_ended(self):
+        STREAMS.unregister(self.ingest)
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def recv(self, frame):
+        if self.recorder is not None:
+            self.recorder.record(frame)
+
+        # Analizuj emocje co N klatek żeby nie obciążać procesora
+        analyze = self.frame_count % self.analyze_every_n_frames == 0
+        ingest_start = time.perf_counter()
+        if analyze:
+            gray, scale = analysis_gray(frame)
+        ingest_seconds = time.perf_counter() - ingest_start
+
+        if analyze:
+            try:
+                # Ścieżka bezpośrednia: Haar + przebieg modelu (lekki do czasu załadowania DeepFace w tle)
+                faces, _ = get_engine().analyze_lean(gray)
+
+                if not len(faces):
+                    # Brak twarzy w kadrze - bez klasyfikacji, nakładka znika, historia bez wpisu
+                    with self.emotion_lock:
+                        self.latest_emotion_result = None
+                        self.overlay = None
+                else:
+                    # Zapisz wynik (ramka w pikselach pełnej klatki)
+                    face_result = faces[0].scaled(scale)
+                    # Nakładka budowana raz na wynik, a nie na każdą klatkę
+                    overlay = build_overlay(face_result)
+                    with self.emotion_lock:
+                        self.latest_emotion_result = face_result
+                        self.overlay = overlay
+                    self.history.append(time.time(), face_result.scores, face_result.box)
+            except Exception:
+                # Silently handle analysis errors in real-time mode
+                pass
+
+        # Pod blokadą tylko migawka gotowej nakładki - rysowanie poza nią
+        with self.emotion_lock:
+            overlay = self.overlay
+        self.frame_count += 1
+        if overlay is None:
+            # Nic do narysowania - klatka wraca bez konwersji przestrzeni barw
+            self._observe_ingest(ingest_seconds, frame)
+            return frame
+
+        ingest_start = time.perf_counter()
+        img = frame.to_ndarray(format="bgr24")
+        self._observe_ingest(ingest_seconds + time.perf_counter() - ingest_start, frame)
+        try:
+            draw_overlay(img, overlay)
+        except Exception as e:
+            pass  # Zignoruj błędy rysowania
+        return av.VideoFrame.from_ndarray(img, format="bgr24")
+
+    def _observe_ingest(self, seconds: float, frame) -> None:
+        self.ingest.observe(seconds, frame.width, frame.height)
+        metrics.observe('frame_ingest', seconds)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Test obciążenia trybu na żywo bez przeglądarki i sieci.
+
+Tworzy N instancji VideoProcessor w jednym procesie (tak jak serwer
+streamlit-webrtc) i podaje im klatki av.VideoFrame z zadaną liczbą klatek
+na sekundę. Każdy strumień ma wątek źródła i wątek przetwarzania; jak
+w trybie async_processing przetwarzana jest tylko najnowsza klatka, a te,
+które źródło nadpisało przed odebraniem, liczone są jako porzucone.
+
+Dla każdego N mierzone są: osiągnięte FPS wyjścia, percentyle czasu recv,
+opóźnienie wyniku (wiek klatki, z której pochodzi wyświetlana emocja)
+i odsetek porzuconych klatek. Wynikiem jest krzywa przepustowości.
+
+Użycie:
+    python load_test.py --streams 1,2,4,8 --fps 15 --duration 20 --image twarz.jpg --csv krzywa.csv
+    python load_test.py --streams 1,2,4 --recording nagrania/20261019-101500-1a2b3c
+"""
+import argparse
+import csv
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '-1')
+
+import av
+import cv2
+import numpy as np
+
+from capture_policy import CaptureTier, cpu_load
+from frame_store import FrameStore
+from live_processor import VideoProcessor
+
+
+def synthetic_frame(width: int, height: int) -> np.ndarray:
+    """Klatka zastępcza: gradient z jasnym owalem w miejscu twarzy"""
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    frame[:] = np.linspace(40, 120, width, dtype=np.uint8)[np.newaxis, :, np.newaxis]
+    cv2.ellipse(frame, (width // 2, height // 2), (width // 8, height // 5), 0, 0, 360, (180, 190, 210), -1)
+    return frame
+
+
+def load_frames(args: argparse.Namespace) -> List[av.VideoFrame]:
+    """Klatki źródłowe przygotowane z góry, w formacie odbieranym z WebRTC (yuv420p)"""
+    if args.recording:
+        # Nagranie z trybu na żywo - klatki bez przeskalowania, rozmiar z nagrania
+        store = FrameStore(args.recording)
+        if not len(store):
+            raise SystemExit("Nagranie nie zawiera klatek")
+        frames = [store.frame(i) for i in range(min(len(store), args.max_source_frames))]
+        args.width, args.height = frames[0].width, frames[0].height
+        return frames
+    images: List[np.ndarray] = []
+    if args.video:
+        capture = cv2.VideoCapture(args.video)
+        while len(images) < args.max_source_frames:
+            ok, image = capture.read()
+            if not ok:
+                break
+            images.append(image)
+        capture.release()
+    elif args.image:
+        image = cv2.imread(args.image)
+        if image is None:
+            raise SystemExit(f"Nie udało się wczytać obrazu: {args.image}")
+        images.append(image)
+    else:
+        images.append(synthetic_frame(args.width, args.height))
+    if not images:
+        raise SystemExit("Brak klatek źródłowych")
+    frames = []
+    for image in images:
+        image = cv2.resize(image, (args.width, args.height))
+        frames.append(av.VideoFrame.from_ndarray(image, format='bgr24').reformat(format='yuv420p'))
+    return frames
+
+
+class StreamRunner:
+    """Jeden symulowany strumień: źródło z zadanym FPS i przetwarzanie najnowszej klatki"""
+
+    def __init__(self, processor: VideoProcessor, frames: List[av.VideoFrame], fps: float):
+        self.processor = processor
+        self.frames = frames
+        self.fps = fps
+        self.sent = 0
+        self.dropped = 0
+        self.outputs = 0
+        self.recv_seconds: List[float] = []
+        self.lag_seconds: List[float] = []
+        self._slot: Optional[Any] = None  # (czas przechwycenia, klatka)
+        self._slot_ready = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        self._threads = [threading.Thread(target=self._produce, daemon=True),
+                         threading.Thread(target=self._consume, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._slot_ready:
+            self._slot_ready.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self.processor.on_ended()
+
+    def _produce(self) -> None:
+        interval = 1.0 / self.fps
+        next_time = time.perf_counter()
+        while not self._stop.is_set():
+            frame = self.frames[self.sent % len(self.frames)]
+            with self._slot_ready:
+                if self._slot is not None:
+                    self.dropped += 1  # Poprzednia klatka nie została odebrana
+                self._slot = (time.perf_counter(), frame)
+                self._slot_ready.notify()
+            self.sent += 1
+            next_time += interval
+            time.sleep(max(0.0, next_time - time.perf_counter()))
+
+    def _consume(self) -> None:
+        result_capture_time: Optional[float] = None
+        while True:
+            with self._slot_ready:
+                while self._slot is None and not self._stop.is_set():
+                    self._slot_ready.wait()
+                if self._stop.is_set():
+                    return
+                capture_time, frame = self._slot
+                self._slot = None
+            history_size = len(self.processor.history)
+            start = time.perf_counter()
+            self.processor.recv(frame)
+            done = time.perf_counter()
+            self.recv_seconds.append(done - start)
+            self.outputs += 1
+            if len(self.processor.history) != history_size:
+                # Ta klatka dała nowy wynik emocji
+                result_capture_time = capture_time
+            if result_capture_time is not None:
+                self.lag_seconds.append(done - result_capture_time)
+
+
+def percentile_ms(values: List[float], q: float) -> float:
+    return round(1000 * float(np.percentile(values, q)), 1) if values else 0.0
+
+
+def run_level(streams: int, frames: List[av.VideoFrame], args: argparse.Namespace) -> Dict[str, Any]:
+    """Jeden poziom obciążenia: N strumieni przez args.duration sekund"""
+    tier = CaptureTier('load-test', args.width, args.height, int(args.fps))
+    runners = [StreamRunner(VideoProcessor(tier), frames, args.fps) for _ in range(streams)]
+    start = time.perf_counter()
+    for runner in runners:
+        runner.start()
+    time.sleep(args.duration)
+    for runner in runners:
+        runner.stop()
+    elapsed = time.perf_counter() - start
+
+    recv_seconds = [value for runner in runners for value in runner.recv_seconds]
+    lag_seconds = [value for runner in runners for value in runner.lag_seconds]
+    sent = sum(runner.sent for runner in runners)
+    dropped = sum(runner.dropped for runner in runners)
+    return {
+        'streams': streams,
+        'target_fps': args.fps,
+        'output_fps': round(sum(runner.outputs for runner in runners) / elapsed / streams, 1),
+        'recv_p50_ms': percentile_ms(recv_seconds, 50),
+        'recv_p95_ms': percentile_ms(recv_seconds, 95),
+        'recv_p99_ms': percentile_ms(recv_seconds, 99),
+        'lag_p50_ms': percentile_ms(lag_seconds, 50),
+        'lag_p95_ms': percentile_ms(lag_seconds, 95),
+        'dropped_pct': round(100 * dropped / sent, 1) if sent else 0.0,
+        'load_per_core': round(cpu_load(), 2),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Krzywa przepustowości trybu na żywo")
+    parser.add_argument('--streams', default='1,2,4,8', help="Liczby równoległych strumieni, np. 1,2,4,8")
+    parser.add_argument('--fps', type=float, default=15.0)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--duration', type=float, default=20.0, help="Czas jednego poziomu w sekundach")
+    parser.add_argument('--image', help="Zdjęcie twarzy używane jako każda klatka")
+    parser.add_argument('--video', help="Nagranie wideo odtwarzane w pętli")
+    parser.add_argument('--recording', help="Nagranie klatek z trybu na żywo (frame_store.py)")
+    parser.add_argument('--max-source-frames', type=int, default=300)
+    parser.add_argument('--csv', help="Zapisz krzywę przepustowości do pliku CSV")
+    parser.add_argument('--min-fps-ratio', type=float, default=0.9,
+                        help="Poziom uznany za obsłużony, gdy FPS wyjścia >= ten ułamek docelowego")
+    parser.add_argument('--max-lag-ms', type=float, default=2000.0,
+                        help="Poziom uznany za obsłużony, gdy p95 opóźnienia wyniku <= ta wartość")
+    args = parser.parse_args()
+
+    frames = load_frames(args)
+    levels = [int(value) for value in args.streams.split(',') if value.strip()]
+
+    # Rozgrzewka modelu, żeby pierwszy poziom nie mierzył jego ładowania
+    warmup = VideoProcessor(CaptureTier('warmup', args.width, args.height, int(args.fps)))
+    warmup.recv(frames[0])
+    warmup.on_ended()
+
+    rows = []
+    header = None
+    for streams in levels:
+        row = run_level(streams, frames, args)
+        rows.append(row)
+        if header is None:
+            header = list(row)
+            print(' '.join(f"{name:>13}" for name in header))
+        print(' '.join(f"{row[name]:>13}" for name in header), flush=True)
+
+    if args.csv and rows:
+        with open(args.csv, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    served = [row['streams'] for row in rows
+              if row['output_fps'] >= args.min_fps_ratio * args.fps and row['lag_p95_ms'] <= args.max_lag_ms]
+    if served:
+        print(f"✅ Maksymalna obsłużona liczba strumieni: {max(served)} "
+              f"(FPS >= {args.min_fps_ratio:.0%} docelowego, p95 opóźnienia <= {args.max_lag_ms:.0f} ms)")
+    else:
+        print("⚠️ Żaden poziom nie spełnił progów")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
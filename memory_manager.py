@@ -0,0 +1,159 @@
+"""
+Zarządzanie pamięcią aplikacji.
+
+Zamiast bezwarunkowego gc.collect() przy każdym żądaniu mierzymy RSS procesu
+(oraz opcjonalnie największe alokacje z tracemalloc) i odzyskujemy pamięć
+tylko po przekroczeniu skonfigurowanych progów.
+"""
+import gc
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+try:
+    import psutil  # type: ignore
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+MB = 1024 * 1024
+
+# Progi w MB - można nadpisać zmiennymi środowiskowymi
+DEFAULT_SOFT_WATERMARK_MB = float(os.environ.get('EMOCJE_MEM_SOFT_MB', '1500'))
+DEFAULT_HARD_WATERMARK_MB = float(os.environ.get('EMOCJE_MEM_HARD_MB', '2500'))
+TRACEMALLOC_ENABLED = os.environ.get('EMOCJE_TRACEMALLOC', '0') == '1'
+
+
+def get_rss_mb() -> float:
+    """Zwraca bieżący RSS procesu w MB"""
+    if PSUTIL_AVAILABLE:
+        return psutil.Process().memory_info().rss / MB
+    try:
+        # Linux: drugie pole /proc/self/statm to liczba stron rezydentnych
+        with open('/proc/self/statm') as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / MB
+    except (OSError, ValueError, IndexError):
+        import resource
+        # Brak /proc (np. macOS) - szczytowy RSS to najlepsze przybliżenie
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def get_memory_breakdown(pid: Any = 'self') -> Optional[Dict[str, float]]:
+    """RSS, PSS i USS procesu w MB z /proc/<pid>/smaps_rollup (None poza Linuksem).
+
+    USS (prywatne strony) to pamięć, którą zwolniłoby zakończenie procesu -
+    miara kosztu kolejnego workera przy stronach współdzielonych copy-on-write.
+    """
+    fields: Dict[str, float] = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as smaps:
+            for line in smaps:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1]) / 1024
+    except OSError:
+        return None
+    return {
+        'rss_mb': fields.get('Rss', 0.0),
+        'pss_mb': fields.get('Pss', 0.0),
+        'uss_mb': fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0),
+        'shared_mb': fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0),
+    }
+
+
+def _take_snapshot() -> Any:
+    """Migawka tracemalloc bez alokacji samego modułu tracemalloc"""
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+
+
+class MemoryManager:
+    """Śledzi zużycie pamięci per żądanie i odzyskuje ją powyżej progów"""
+
+    def __init__(self,
+                 soft_watermark_mb: float = DEFAULT_SOFT_WATERMARK_MB,
+                 hard_watermark_mb: float = DEFAULT_HARD_WATERMARK_MB,
+                 use_tracemalloc: bool = TRACEMALLOC_ENABLED,
+                 top_allocators: int = 5,
+                 history_size: int = 200):
+        self.soft_watermark_mb = soft_watermark_mb
+        self.hard_watermark_mb = hard_watermark_mb
+        self.use_tracemalloc = use_tracemalloc
+        self.top_allocators = top_allocators
+        self.timeline: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+
+        if self.use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def reclaim(self, rss_mb: Optional[float] = None) -> str:
+        """Odzyskuje pamięć tylko gdy RSS przekracza próg; zwraca podjęte działanie"""
+        if rss_mb is None:
+            rss_mb = get_rss_mb()
+
+        if rss_mb >= self.hard_watermark_mb:
+            # Pełne odśmiecanie wszystkich generacji
+            gc.collect()
+            return 'full'
+        if rss_mb >= self.soft_watermark_mb:
+            # Tylko młodsze generacje - tańsze niż pełne odśmiecanie
+            gc.collect(1)
+            return 'young'
+        return 'none'
+
+    def _top_allocations(self, before: Any) -> List[Dict[str, Any]]:
+        """Zwraca największe przyrosty alokacji względem migawki początkowej"""
+        after = _take_snapshot()
+        stats = after.compare_to(before, 'lineno')[:self.top_allocators]
+        return [
+            {
+                'location': str(stat.traceback[0]),
+                'size_diff_kb': stat.size_diff / 1024,
+                'count_diff': stat.count_diff,
+            }
+            for stat in stats
+        ]
+
+    def begin_request(self, label: str) -> Dict[str, Any]:
+        """Rozpoczyna pomiar pamięci dla jednego żądania"""
+        sample: Dict[str, Any] = {
+            'timestamp': time.time(),
+            'label': label,
+            'rss_before_mb': get_rss_mb(),
+        }
+        if self.use_tracemalloc and tracemalloc.is_tracing():
+            sample['_snapshot'] = _take_snapshot()
+        return sample
+
+    def end_request(self, sample: Dict[str, Any]) -> Dict[str, Any]:
+        """Kończy pomiar, w razie potrzeby odzyskuje pamięć i zapisuje próbkę"""
+        snapshot = sample.pop('_snapshot', None)
+        sample['rss_end_mb'] = get_rss_mb()
+        sample['reclaim'] = self.reclaim(sample['rss_end_mb'])
+        sample['rss_after_mb'] = get_rss_mb() if sample['reclaim'] != 'none' else sample['rss_end_mb']
+        if snapshot is not None:
+            sample['top_allocators'] = self._top_allocations(snapshot)
+        with self._lock:
+            self.timeline.append(sample)
+        return sample
+
+    @contextmanager
+    def track(self, label: str) -> Iterator[Dict[str, Any]]:
+        """Mierzy pamięć wokół bloku kodu"""
+        sample = self.begin_request(label)
+        try:
+            yield sample
+        finally:
+            self.end_request(sample)
+
+    def get_timeline(self) -> List[Dict[str, Any]]:
+        """Zwraca kopię osi czasu zużycia pamięci"""
+        with self._lock:
+            return list(self.timeline)
@@ -0,0 +1,231 @@
+"""
+Metryki czasu trwania etapów analizy.
+
+Czasy są agregowane w histogramy (kubełki w stylu Prometheusa) i mogą być
+wystawione jako tekstowy endpoint /metrics oraz pokazane w ukrytym panelu
+administracyjnym aplikacji.
+
+Ten sam serwer obsługuje sondę gotowości dla orkiestratora: /ready (stan
+rozgrzanego silnika z set_readiness_probe) oraz /healthz (serwer metryk
+odpowiada). Serwer startuje punkt wejścia procesu (prefork.py), a nie
+skrypt Streamlit - inaczej sonda odpowiadałaby dopiero po pierwszej sesji
+przeglądarki. Za sondę życia służy /_stcore/health samego Streamlit.
+"""
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+# Etapy przetwarzania zdjęcia, w kolejności wykonywania
+STAGES = (
+    'frame_ingest',  # Kamera na żywo: konwersja klatki (skala szarości do analizy, BGR do nakładki)
+    'upload_read',
+    'decode',
+    'dedup_lookup',  # dHash i wyszukanie prawie-duplikatu w drzewie BK
+    'detection_classification',  # DeepFace.analyze: wykrywanie i klasyfikacja w jednym wywołaniu
+    'face_detection',
+    'classification',
+    'correction',
+    'annotation',
+    'chart_render',
+    'image_encode',
+)
+
+# Granice kubełków w sekundach
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRICS_PORT = int(os.environ.get('EMOCJE_METRICS_PORT', '9108'))
+
+
+class StageHistogram:
+    """Histogram czasów jednego etapu"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, recent_size: int = 1000):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        # Ostatnie próbki do dokładnych percentyli w panelu administracyjnym
+        self.recent: Deque[float] = deque(maxlen=recent_size)
+
+    def observe(self, seconds: float) -> None:
+        index = bisect_left(self.buckets, seconds)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Percentyl z ostatnich próbek (q w zakresie 0-100)"""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class MetricsRegistry:
+    """Rejestr histogramów dla wszystkich etapów, bezpieczny wątkowo"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms: Dict[str, StageHistogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = StageHistogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """Mierzy czas bloku kodu i zapisuje go w histogramie etapu"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def percentile(self, stage: str, q: float) -> Optional[float]:
+        """Percentyl czasu etapu w sekundach (None gdy brak próbek)"""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            return histogram.percentile(q) if histogram is not None else None
+
+    def summary(self) -> List[Dict[str, object]]:
+        """Podsumowanie etapów do wyświetlenia w panelu"""
+        with self._lock:
+            ordered = sorted(self._histograms.items(),
+                             key=lambda item: STAGES.index(item[0]) if item[0] in STAGES else len(STAGES))
+            return [
+                {
+                    'Etap': stage,
+                    'Liczba': histogram.count,
+                    'Średnia (ms)': round(1000 * histogram.total / histogram.count, 1),
+                    'p50 (ms)': round(1000 * (histogram.percentile(50) or 0.0), 1),
+                    'p95 (ms)': round(1000 * (histogram.percentile(95) or 0.0), 1),
+                }
+                for stage, histogram in ordered
+            ]
+
+    def render_prometheus(self) -> str:
+        """Zwraca metryki w formacie tekstowym Prometheusa"""
+        name = 'emocje_stage_duration_seconds'
+        lines = [
+            f'# HELP {name} Czas trwania etapów analizy emocji.',
+            f'# TYPE {name} histogram',
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+# Wspólny rejestr procesu
+REGISTRY = MetricsRegistry()
+
+# Funkcja zwracająca stan gotowości (słownik z kluczem 'ready') - rejestruje ją silnik
+_readiness_probe: Optional[Callable[[], Dict[str, Any]]] = None
+
+
+def set_readiness_probe(probe: Callable[[], Dict[str, Any]]) -> None:
+    global _readiness_probe
+    _readiness_probe = probe
+
+
+def readiness() -> Dict[str, Any]:
+    """Stan gotowości z zarejestrowanej sondy; bez sondy proces nie jest gotowy"""
+    if _readiness_probe is None:
+        return {'ready': False, 'reason': 'silnik nie został jeszcze utworzony'}
+    try:
+        return _readiness_probe()
+    except Exception as e:
+        return {'ready': False, 'reason': str(e)}
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/metrics':
+            self._send(200, REGISTRY.render_prometheus(), 'text/plain; version=0.0.4; charset=utf-8')
+        elif path == '/healthz':
+            # Tylko dowód, że proces i wątek serwera odpowiadają - bez dotykania modelu
+            self._send(200, 'ok\n', 'text/plain; charset=utf-8')
+        elif path == '/ready':
+            state = readiness()
+            self._send(200 if state.get('ready') else 503, json.dumps(state, ensure_ascii=False) + '\n',
+                       'application/json; charset=utf-8')
+        else:
+            self.send_error(404)
+
+    def _send(self, status: int, text: str, content_type: str) -> None:
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Nie zaśmiecaj logów każdym scrapem
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """Uruchamia endpointy /metrics, /healthz i /ready w wątku w tle (raz na proces).
+
+    Gdy proces ma już serwer - zwraca go bez względu na port; None jeśli port jest zajęty.
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+        try:
+            server = ThreadingHTTPServer(('0.0.0.0', port), _MetricsHandler)
+        except OSError:
+            return None
+        thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+        thread.start()
+        _server = server
+        return server
+
+
+def release_inherited_server() -> None:
+    """Po fork(): zamyka gniazdo serwera procesu nadrzędnego, proces potomny uruchomi własny"""
+    global _server
+    if _server is not None:
+        _server.socket.close()
+        _server = None
+
+
+def remote_readiness(port: int, host: str = '127.0.0.1', timeout: float = 1.0) -> Dict[str, Any]:
+    """Stan /ready serwera metryk innego procesu (np. workera prefork.py)"""
+    try:
+        with urllib.request.urlopen(f'http://{host}:{port}/ready', timeout=timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        try:
+            return json.loads(e.read().decode('utf-8'))
+        except ValueError:
+            return {'ready': False, 'reason': f'HTTP {e.code}'}
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        return {'ready': False, 'reason': str(e)}
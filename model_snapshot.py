@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Gotowy do serwowania zrzut sieci emocji (SavedModel z prześledzoną sygnaturą).
+
+Każdy nowy proces budował sieć przez DeepFace (architektura Keras + wagi
+z h5), a rozgrzewka DeepFace.analyze śledziła Model.predict - to ponad
+90% czasu do gotowości pełnego poziomu. Eksport zapisuje raz SavedModel
+z funkcją serve(faces: float32[None, 48, 48, 1]) już prześledzoną dla
+dowolnej liczby twarzy oraz snapshot.json z sumą SHA-256 plików i czasem
+modyfikacji źródłowego h5. Silnik (tiered_engine.py) ładuje zrzut przez
+tf.saved_model.load i wstawia go do cache modeli DeepFace w miejsce
+budowy; przy braku zrzutu, złej sumie kontrolnej albo nowszym h5 wraca
+do budowy przez DeepFace.
+
+Zrzut leży domyślnie obok wag DeepFace (~/.deepface/weights/emotion_snapshot);
+EMOCJE_MODEL_SNAPSHOT wskazuje inny katalog, a wartość 0 wyłącza zrzut.
+
+Użycie:
+    python model_snapshot.py export
+    python model_snapshot.py verify
+    python model_snapshot.py benchmark --repeats 3
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from emotion_engine import EMOTION_INPUT_SIZE, default_weights_path
+
+SNAPSHOT_ENV = 'EMOCJE_MODEL_SNAPSHOT'
+MANIFEST_FILE = 'snapshot.json'
+
+
+def default_snapshot_path() -> Optional[str]:
+    """Katalog zrzutu; None gdy wyłączony (EMOCJE_MODEL_SNAPSHOT=0)"""
+    path = os.environ.get(SNAPSHOT_ENV, '')
+    if path == '0':
+        return None
+    return path or os.path.join(os.path.dirname(default_weights_path()), 'emotion_snapshot')
+
+
+def snapshot_checksum(directory: str) -> str:
+    """SHA-256 ścieżek i zawartości wszystkich plików zrzutu (bez snapshot.json)"""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory)
+            if relative == MANIFEST_FILE:
+                continue
+            digest.update(relative.encode('utf-8') + b'\0')
+            with open(path, 'rb') as snapshot_file:
+                for chunk in iter(lambda: snapshot_file.read(1 << 20), b''):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SnapshotEmotionModel:
+    """Sieć emocji z SavedModel - API jak model Keras (predict i wywołanie)"""
+
+    def __init__(self, loaded, manifest: Dict[str, Any]):
+        self._loaded = loaded  # Referencja trzyma zmienne SavedModel przy życiu
+        self._serve = loaded.serve
+        self.manifest = manifest
+
+    def __call__(self, batch: np.ndarray, training: bool = False) -> np.ndarray:
+        return self._serve(np.asarray(batch, dtype=np.float32)).numpy()
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        return self(batch)
+
+
+def export_snapshot(directory: str, h5_path: Optional[str] = None) -> Dict[str, Any]:
+    """Buduje sieć przez DeepFace i zapisuje zrzut (atomowo - przez katalog tymczasowy)"""
+    import tensorflow as tf
+    from deepface import DeepFace
+
+    h5_path = h5_path or default_weights_path()
+    model = DeepFace.build_model('Emotion')
+    if isinstance(model, SnapshotEmotionModel):
+        raise ValueError("Eksport wymaga modelu Keras zbudowanego przez DeepFace, a nie zrzutu")
+
+    module = tf.Module()
+    module.model = model
+    module.serve = tf.function(
+        lambda faces: model(faces, training=False),
+        input_signature=[tf.TensorSpec([None, EMOTION_INPUT_SIZE, EMOTION_INPUT_SIZE, 1], tf.float32, name='faces')],
+    )
+    staging = f"{directory.rstrip(os.sep)}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    tf.saved_model.save(module, staging, signatures={'serving_default': module.serve})
+
+    manifest = {
+        'checksum': snapshot_checksum(staging),
+        'source_mtime': os.path.getmtime(h5_path) if os.path.exists(h5_path) else None,
+        'tensorflow': tf.__version__,
+        'created_at': time.time(),
+    }
+    with open(os.path.join(staging, MANIFEST_FILE), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.replace(staging, directory)
+    return manifest
+
+
+def load_snapshot(directory: str, h5_path: Optional[str] = None) -> SnapshotEmotionModel:
+    """Ładuje zrzut po sprawdzeniu sumy kontrolnej; ValueError gdy uszkodzony lub nieaktualny"""
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Brak zrzutu modelu: {directory}")
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if snapshot_checksum(directory) != manifest.get('checksum'):
+        raise ValueError(f"Suma kontrolna zrzutu modelu się nie zgadza: {directory}")
+    h5_path = h5_path or default_weights_path()
+    if manifest.get('source_mtime') is not None and os.path.exists(h5_path) \
+            and os.path.getmtime(h5_path) != manifest['source_mtime']:
+        raise ValueError("Zrzut modelu jest starszy niż plik wag h5 - uruchom ponownie eksport")
+
+    import tensorflow as tf
+    return SnapshotEmotionModel(tf.saved_model.load(directory), manifest)
+
+
+def install_in_deepface(model) -> None:
+    """Wstawia model (zrzut albo model NumPy na wspólnych wagach) do cache DeepFace.build_model -
+    DeepFace.analyze nie buduje już sieci"""
+    import deepface.DeepFace as deepface_module
+    cache = getattr(deepface_module, 'model_obj', None)
+    if cache is None:
+        cache = deepface_module.model_obj = {}
+    cache['Emotion'] = model
+
+
+_READY_PROBE = """
+import json
+from tiered_engine import TieredEmotionEngine
+engine = TieredEmotionEngine()
+engine.wait_for_full()
+print(json.dumps({'seconds': engine.full_ready_seconds, 'source': engine.full_source, 'error': engine.full_error}))
+"""
+
+
+def measure_ready(snapshot: Optional[str]) -> Dict[str, Any]:
+    """Czas do gotowości pełnego poziomu w świeżym procesie (z importem TensorFlow)"""
+    env = dict(os.environ)
+    env[SNAPSHOT_ENV] = snapshot or '0'
+    output = subprocess.run([sys.executable, '-c', _READY_PROBE], env=env, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Zrzut sieci emocji do szybkiego startu silnika")
+    parser.add_argument('command', choices=('export', 'verify', 'benchmark'))
+    parser.add_argument('--snapshot', default=default_snapshot_path(), help="Katalog zrzutu")
+    parser.add_argument('--repeats', type=int, default=3, help="Pomiary na wariant (benchmark)")
+    args = parser.parse_args()
+    if not args.snapshot:
+        print(f"❌ Zrzut wyłączony ({SNAPSHOT_ENV}=0) - podaj --snapshot", file=sys.stderr)
+        return 1
+
+    os.environ.setdefault('TF_USE_LEGACY_KERAS', '1')
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    os.environ.setdefault('CUDA_VISIBLE_DEVICES', '-1')
+
+    if args.command == 'export':
+        start = time.perf_counter()
+        manifest = export_snapshot(args.snapshot)
+        print(f"💾 Zrzut zapisany w {time.perf_counter() - start:.1f} s: {args.snapshot} "
+              f"(sha256 {manifest['checksum'][:16]}, TensorFlow {manifest['tensorflow']})")
+        return 0
+
+    if args.command == 'verify':
+        from deepface import DeepFace
+        try:
+            snapshot = load_snapshot(args.snapshot)
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 1
+        # Zgodność z siecią budowaną przez DeepFace na losowych twarzach
+        faces = np.random.default_rng(0).random((8, EMOTION_INPUT_SIZE, EMOTION_INPUT_SIZE, 1), dtype=np.float32)
+        reference = np.asarray(DeepFace.build_model('Emotion')(faces, training=False))
+        diff = float(np.abs(snapshot.predict(faces) - reference).max())
+        print(f"{'✅' if diff < 1e-5 else '❌'} Suma kontrolna zgodna, maks. różnica wyjść {diff:.2e}")
+        return 0 if diff < 1e-5 else 1
+
+    print(f"{'wariant':<12}{'gotowy po s':>14}  źródło")
+    for label, snapshot in (('DeepFace', None), ('zrzut', args.snapshot)):
+        for _ in range(args.repeats):
+            result = measure_ready(snapshot)
+            print(f"{label:<12}{result['seconds'] or float('nan'):>14.2f}  {result['source'] or result['error']}",
+                  flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
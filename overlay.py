@@ -0,0 +1,87 @@
+"""
+Nakładka z etykietą emocji dla klatek na żywo.
+
+Etykiety (tło + tekst) są renderowane raz dla każdej pary
+(emocja, przedział pewności) do małych bitmap i tylko wklejane w klatkę,
+więc koszt rysowania na klatkę jest stały i niewielki.
+"""
+import threading
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from emotion_engine import EmotionResult
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.6
+THICKNESS = 2
+LABEL_COLOR = (0, 255, 0)  # BGR
+TEXT_COLOR = (0, 0, 0)
+CONFIDENCE_BUCKET = 5  # Szerokość przedziału pewności w punktach procentowych
+
+
+class LabelCache:
+    """Cache bitmap etykiet kluczowany (emocja, przedział pewności)"""
+
+    def __init__(self, bucket_size: int = CONFIDENCE_BUCKET):
+        self.bucket_size = bucket_size
+        self._bitmaps: Dict[Tuple[str, int], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, confidence: float) -> int:
+        return int(round(confidence / self.bucket_size)) * self.bucket_size
+
+    def get(self, emotion: str, confidence: float) -> np.ndarray:
+        key = (emotion, self.bucket(confidence))
+        bitmap = self._bitmaps.get(key)
+        if bitmap is None:
+            bitmap = self._render(*key)
+            with self._lock:
+                self._bitmaps.setdefault(key, bitmap)
+        return bitmap
+
+    @staticmethod
+    def _render(emotion: str, bucket: int) -> np.ndarray:
+        label = f"{emotion}: {bucket}%"
+        (text_width, text_height), _ = cv2.getTextSize(label, FONT, FONT_SCALE, THICKNESS)
+        bitmap = np.empty((text_height + 10, text_width, 3), dtype=np.uint8)
+        bitmap[:] = LABEL_COLOR
+        cv2.putText(bitmap, label, (0, text_height + 5), FONT, FONT_SCALE, TEXT_COLOR, THICKNESS)
+        return bitmap
+
+
+# Wspólny cache dla wszystkich sesji w procesie
+LABEL_CACHE = LabelCache()
+
+
+class FaceOverlay:
+    """Gotowa do narysowania nakładka: ramka twarzy i bitmapa etykiety"""
+
+    __slots__ = ('box', 'label')
+
+    def __init__(self, box: Tuple[int, int, int, int], label: np.ndarray):
+        self.box = box
+        self.label = label
+
+
+def build_overlay(face_result: EmotionResult, cache: LabelCache = LABEL_CACHE) -> Optional[FaceOverlay]:
+    """Przygotowuje nakładkę raz na wynik analizy (nie na klatkę)"""
+    x, y, w, h = face_result.box
+    if not (x > 0 and y > 0 and w > 0 and h > 0):
+        return None
+    return FaceOverlay(face_result.box, cache.get(face_result.dominant_emotion, face_result.confidence))
+
+
+def draw_overlay(img: np.ndarray, overlay: FaceOverlay) -> None:
+    """Rysuje ramkę i wkleja etykietę nad twarzą (w miejscu, z przycięciem do klatki)"""
+    x, y, w, h = overlay.box
+    cv2.rectangle(img, (x, y), (x + w, y + h), LABEL_COLOR, 2)
+
+    label = overlay.label
+    top = y - label.shape[0]
+    frame_height, frame_width = img.shape[:2]
+    y0, y1 = max(top, 0), min(y, frame_height)
+    x0, x1 = max(x, 0), min(x + label.shape[1], frame_width)
+    if y1 > y0 and x1 > x0:
+        img[y0:y1, x0:x1] = label[y0 - top:y1 - top, x0 - x:x1 - x]
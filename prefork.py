@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Launcher prefork: wiele workerów Streamlit ze wspólną pamięcią modelu.
+
+Proces nadrzędny raz importuje TensorFlow, DeepFace, OpenCV i Streamlit,
+eksportuje wagi modelu emocji do plików .npy, mapuje je do pamięci
+i rozgrzewa model, a następnie tworzy workery przez fork(). Strony kodu
+i danych modułów są współdzielone copy-on-write, a wagi są stronami pliku
+(tylko do odczytu), więc nigdy nie stają się prywatne. gc.freeze() chroni
+obiekty z procesu nadrzędnego przed zapisem nagłówków GC w workerach.
+
+Runtime TensorFlow nie jest inicjalizowany przed fork() - jego pule wątków
+nie przeżywają fork() i worker zawiesiłby się na pierwszym wywołaniu modelu.
+
+Każdy worker tworzy silnik emocji i serwer metryk (port --metrics-port + 1
++ numer workera) przed startem Streamlit, więc sondy odpowiadają bez
+sesji przeglądarki. Proces nadrzędny wystawia na --metrics-port zbiorczą
+sondę /ready: gotowy, gdy gotowe są wszystkie workery. Sonda życia
+workera to /_stcore/health na jego porcie Streamlit.
+
+Użycie:
+    python prefork.py --workers 4 --port 8501
+    python prefork.py --workers 1   # pojedynczy proces z sondami (kontener)
+"""
+import argparse
+import gc
+import os
+import signal
+import sys
+import time
+from typing import Any, Dict, List
+
+# Te same ustawienia środowiska co w emocje.py - przed importem TensorFlow
+os.environ['TF_USE_LEGACY_KERAS'] = '1'
+os.environ['TF_KERAS'] = '1'
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+
+import numpy as np
+
+import emotion_engine
+from memory_manager import get_memory_breakdown
+from metrics import (METRICS_PORT, release_inherited_server, remote_readiness, set_readiness_probe,
+                     start_metrics_server)
+
+DEFAULT_WEIGHTS_DIR = os.path.join(os.path.dirname(emotion_engine.default_weights_path()), 'emotion_npy')
+
+
+def preload(weights_dir: str) -> None:
+    """Importy i model w procesie nadrzędnym - wszystko, co workery mają współdzielić"""
+    import cv2  # noqa: F401
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+    import tensorflow  # noqa: F401
+    from deepface import DeepFace  # noqa: F401
+    import streamlit  # noqa: F401
+    from streamlit.web import cli  # noqa: F401
+
+    emotion_engine.export_weights(emotion_engine.default_weights_path(), weights_dir)
+    os.environ[emotion_engine.SHARED_WEIGHTS_ENV] = weights_dir
+    model = emotion_engine.load_emotion_model()
+    # Rozgrzewka: strony wag trafiają do cache stron, bufory NumPy są zaalokowane
+    model.predict(np.zeros((1, emotion_engine.EMOTION_INPUT_SIZE, emotion_engine.EMOTION_INPUT_SIZE, 1),
+                           dtype=np.float32))
+    emotion_engine.get_face_cascade()
+
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(app: str, port: int, metrics_port: int) -> None:
+    """Uruchamia serwer Streamlit w procesie potomnym (nie wraca)"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    from streamlit.web import cli
+    from tiered_engine import get_engine
+    code = 0
+    try:
+        # Silnik i sondy od startu procesu - skrypt Streamlit przejmie ten sam silnik i serwer
+        get_engine()
+        if start_metrics_server(metrics_port) is None:
+            print(f"⚠️ Worker :{port} - port metryk {metrics_port} zajęty, sonda /ready niedostępna",
+                  file=sys.stderr, flush=True)
+        cli.main(['run', app, '--server.port', str(port), '--server.headless', 'true'], prog_name='streamlit')
+    except SystemExit as exit_status:
+        code = exit_status.code if isinstance(exit_status.code, int) else 1
+    except Exception as e:
+        print(f"❌ Worker na porcie {port} zakończył się błędem: {e}", file=sys.stderr)
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def spawn(app: str, port: int, metrics_port: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        # Gniazdo sondy zbiorczej należy do procesu nadrzędnego
+        release_inherited_server()
+        run_worker(app, port, metrics_port)
+    return pid
+
+
+def workers_readiness(metrics_ports: Dict[int, int]) -> Dict[str, Any]:
+    """Zbiorcza gotowość: port Streamlit workera -> stan jego /ready; gotowe, gdy wszystkie"""
+    states = {port: remote_readiness(metrics_port) for port, metrics_port in sorted(metrics_ports.items())}
+    reasons = [f":{port} {state.get('reason') or 'niegotowy'}" for port, state in states.items()
+               if not state.get('ready')]
+    if not states:
+        reasons.append('brak workerów')
+    return {'ready': not reasons, 'reason': '; '.join(reasons),
+            'workers': {str(port): state for port, state in states.items()}}
+
+
+def memory_report(workers: Dict[int, int]) -> List[str]:
+    """Wiersze raportu RSS / PSS / USS dla procesu nadrzędnego i workerów"""
+    lines = [f"{'proces':<18}{'RSS MB':>10}{'PSS MB':>10}{'USS MB':>10}"]
+    total_uss = 0.0
+    for label, pid in [('nadrzędny', os.getpid())] + [(f'worker :{port}', pid) for pid, port in workers.items()]:
+        breakdown = get_memory_breakdown(pid)
+        if breakdown is None:
+            continue
+        if pid != os.getpid():
+            total_uss += breakdown['uss_mb']
+        lines.append(f"{label:<18}{breakdown['rss_mb']:>10.0f}{breakdown['pss_mb']:>10.0f}{breakdown['uss_mb']:>10.0f}")
+    if workers:
+        lines.append(f"Średni USS workera: {total_uss / len(workers):.0f} MB")
+    return lines
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Workery Streamlit ze współdzielonym modelem emocji")
+    parser.add_argument('--app', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'emocje.py'))
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=8501, help="Port pierwszego workera (kolejne: +1)")
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                        help="Port zbiorczej sondy /ready (workery: kolejne porty)")
+    parser.add_argument('--weights-dir', default=DEFAULT_WEIGHTS_DIR)
+    parser.add_argument('--report-interval', type=float, default=60.0,
+                        help="Co ile sekund wypisywać raport pamięci (0 = wyłączony)")
+    args = parser.parse_args()
+
+    if not hasattr(os, 'fork'):
+        print("❌ prefork.py wymaga systemu z fork() (Linux/macOS)", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    preload(args.weights_dir)
+    print(f"✅ Model i biblioteki załadowane w {time.perf_counter() - start:.1f} s", flush=True)
+
+    # Port Streamlit workera -> port jego serwera metryk
+    metrics_ports = {args.port + index: args.metrics_port + 1 + index for index in range(args.workers)}
+    set_readiness_probe(lambda: workers_readiness(metrics_ports))
+    if start_metrics_server(args.metrics_port) is None:
+        print(f"⚠️ Port sondy {args.metrics_port} zajęty - zbiorcza sonda /ready niedostępna", flush=True)
+
+    workers: Dict[int, int] = {}
+    for port, metrics_port in metrics_ports.items():
+        workers[spawn(args.app, port, metrics_port)] = port
+        print(f"🚀 Worker na porcie {port} (metryki :{metrics_port})", flush=True)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    next_report = time.monotonic() + args.report_interval
+    while workers:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            port = workers.pop(pid, None)
+            if port is not None and not stopping:
+                # Nowy worker znów dziedziczy rozgrzany model z procesu nadrzędnego
+                print(f"⚠️ Worker :{port} zakończył się (status {status}) - uruchamiam ponownie", flush=True)
+                workers[spawn(args.app, port, metrics_ports[port])] = port
+            continue
+        if args.report_interval > 0 and time.monotonic() >= next_report:
+            print('\n'.join(memory_report(workers)), flush=True)
+            next_report = time.monotonic() + args.report_interval
+        time.sleep(0.5)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Profilowanie pojedynczej analizy na żądanie operatora.
+
+Włączane zmienną środowiskową EMOCJE_PROFILING=1 - bez niej aplikacja nie
+pokazuje przełącznika i nie wykonuje żadnego kodu profilującego. Analiza
+jest uruchamiana jednocześnie pod cProfile (plik pstats do snakeviz /
+python -m pstats) i pod próbnikiem stosu wątku, który zapisuje stosy
+w formacie collapsed (flamegraph.pl, speedscope, inferno).
+"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+PROFILING_ENABLED = os.environ.get('EMOCJE_PROFILING', '0') == '1'
+
+DEFAULT_SAMPLE_INTERVAL = 0.005  # 5 ms
+
+
+class StackSampler:
+    """Próbkuje stos wskazanego wątku z osobnego wątku demona"""
+
+    def __init__(self, thread_id: int, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='emocje-stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Stosy w formacie collapsed: 'ramka;ramka;ramka liczba' w wierszu"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileResult:
+    """Wynik profilowania gotowy do pobrania"""
+
+    def __init__(self):
+        self.wall_seconds = 0.0
+        self.pstats_bytes = b''
+        self.collapsed_stacks = ''
+        self.summary = ''
+        self.samples = 0
+
+
+@contextmanager
+def profile_block(sample_interval: float = DEFAULT_SAMPLE_INTERVAL, top: int = 20) -> Iterator[ProfileResult]:
+    """Profiluje blok kodu; wynik jest uzupełniany po wyjściu z bloku"""
+    result = ProfileResult()
+    sampler = StackSampler(threading.get_ident(), sample_interval)
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    sampler.start()
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        sampler.stop()
+        result.wall_seconds = time.perf_counter() - start
+        profiler.create_stats()
+        # Ten sam format co Profile.dump_stats - do otwarcia przez pstats.Stats(plik)
+        result.pstats_bytes = marshal.dumps(profiler.stats)
+        result.collapsed_stacks = sampler.collapsed()
+        result.samples = sum(sampler.stacks.values())
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(top)
+        result.summary = summary.getvalue()
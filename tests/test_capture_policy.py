@@ -0,0 +1,63 @@
+import pytest
+
+import capture_policy
+from capture_policy import (CAPTURE_TIERS, DEFAULT_ANALYZE_EVERY_N_FRAMES, StreamRegistry, analyze_every_n_frames,
+                            choose_tier, current_tier, load_score, media_stream_constraints)
+
+HIGH, STANDARD, SAVING = CAPTURE_TIERS
+
+
+@pytest.mark.parametrize('load, tier', [
+    (0.0, HIGH), (0.49, HIGH), (0.5, STANDARD), (0.84, STANDARD), (0.85, SAVING), (3.0, SAVING),
+])
+def test_tier_by_load_score(load, tier):
+    assert choose_tier(load) == tier
+
+
+def test_load_score_takes_worse_of_cpu_and_stream_slots(monkeypatch):
+    monkeypatch.setattr(capture_policy, 'MAX_STREAMS', 4)
+    monkeypatch.setattr(capture_policy, 'cpu_load', lambda: 0.3)
+    assert load_score(0) == 0.3
+    assert load_score(2) == 0.5
+    monkeypatch.setattr(capture_policy, 'cpu_load', lambda: 0.9)
+    assert load_score(1) == 0.9
+
+
+def test_new_stream_counts_itself(monkeypatch):
+    monkeypatch.setattr(capture_policy, 'MAX_STREAMS', 4)
+    monkeypatch.setattr(capture_policy, 'cpu_load', lambda: 0.0)
+    registry = StreamRegistry()
+    assert current_tier(registry) == HIGH
+    streams = [registry.register(HIGH) for _ in range(2)]
+    # Trzeci strumień: 3/4 slotów
+    assert current_tier(registry) == STANDARD
+    streams.append(registry.register(STANDARD))
+    assert current_tier(registry) == SAVING
+    for stats in streams:
+        registry.unregister(stats)
+    registry.unregister(streams[0])
+    assert registry.active_count() == 0
+
+
+def test_adaptive_capture_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(capture_policy, 'ADAPTIVE_CAPTURE', False)
+    assert current_tier(StreamRegistry()) is None
+    assert media_stream_constraints(None) == {'video': True, 'audio': False}
+    assert analyze_every_n_frames(None) == DEFAULT_ANALYZE_EVERY_N_FRAMES
+
+
+def test_constraints_and_analysis_interval_follow_tier():
+    video = media_stream_constraints(SAVING)['video']
+    assert video['width']['max'] == 320 and video['height']['max'] == 240 and video['frameRate']['max'] == 10
+    assert analyze_every_n_frames(SAVING) == 10
+    assert analyze_every_n_frames(HIGH) == 30
+
+
+def test_ingest_summary():
+    registry = StreamRegistry()
+    stats = registry.register(STANDARD)
+    stats.observe(0.002, 640, 480)
+    stats.observe(0.004, 640, 480)
+    (summary,) = registry.summary()
+    assert summary['Poziom'] == 'standardowa' and summary['Rozdzielczość'] == '640x480'
+    assert summary['Przyjęcie klatki (ms)'] == pytest.approx(3.0)
@@ -0,0 +1,88 @@
+import random
+
+import cv2
+import numpy as np
+import pytest
+
+from dedup_index import (BKTree, DedupSource, NearDuplicateIndex, dhash, from_sqlite, hamming, rescale_faces,
+                         to_sqlite)
+from emotion_engine import EMOTION_LABELS, EmotionBatch
+
+
+def source(name: str) -> DedupSource:
+    return DedupSource(name, 100, 50)
+
+
+def flip_bits(value: int, count: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+@pytest.mark.parametrize('max_distance', [0, 3, 8, 16])
+def test_bk_tree_nearest_matches_brute_force(max_distance):
+    rng = random.Random(max_distance)
+    stored = {}
+    tree = BKTree()
+    base = [rng.getrandbits(64) for _ in range(20)]
+    for index in range(500):
+        # Skupiska bliskich hashy (jak zdjęcia seryjne) i losowe hashe bez sąsiadów
+        value = flip_bits(rng.choice(base), rng.randint(0, 10), rng) if index % 2 else rng.getrandbits(64)
+        stored.setdefault(value, source(str(index)))
+        tree.add(value, source(str(index)))
+    assert tree.size == len(stored)
+
+    for _ in range(300):
+        query = flip_bits(rng.choice(base), rng.randint(0, 12), rng) if rng.random() < 0.8 else rng.getrandbits(64)
+        expected = min((hamming(query, value) for value in stored), default=None)
+        match = tree.nearest(query, max_distance)
+        if expected is None or expected > max_distance:
+            assert match is None
+        else:
+            assert match is not None and match.distance == expected
+            assert hamming(query, next(value for value, src in stored.items() if src == match.source)) == expected
+
+
+def test_same_hash_keeps_first_source():
+    tree = BKTree()
+    tree.add(42, source('first'))
+    tree.add(42, source('second'))
+    assert tree.size == 1
+    assert tree.nearest(42, 0).source.image_hash == 'first'
+
+
+def test_sqlite_round_trip_of_unsigned_hashes():
+    for value in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+        stored = to_sqlite(value)
+        assert -(1 << 63) <= stored < 1 << 63
+        assert from_sqlite(stored) == value
+
+
+def test_dhash_is_stable_under_rescaling_and_differs_for_other_images():
+    rng = np.random.default_rng(0)
+    image = cv2.resize(rng.integers(0, 256, (8, 9, 3), dtype=np.uint8), (360, 320), interpolation=cv2.INTER_CUBIC)
+    smaller = cv2.resize(image, (180, 160), interpolation=cv2.INTER_AREA)
+    assert hamming(dhash(image), dhash(smaller)) <= 4
+    assert dhash(image) == dhash(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+    assert hamming(dhash(image), dhash(255 - image)) > 32
+
+
+def test_index_is_per_detector_and_disabled_at_zero_distance():
+    entries = [('opencv', to_sqlite((1 << 64) - 1), 'a', 100, 50)]
+    index = NearDuplicateIndex.from_entries(entries, max_distance=4)
+    assert len(index) == 1
+    assert index.find('opencv', (1 << 64) - 2).source == DedupSource('a', 100, 50)
+    assert index.find('cascade>=50', (1 << 64) - 1) is None
+
+    disabled = NearDuplicateIndex.from_entries(entries, max_distance=0)
+    assert not disabled.enabled
+    assert disabled.find('opencv', (1 << 64) - 1) is None
+
+
+def test_rescale_faces_to_duplicate_size():
+    scores = np.eye(len(EMOTION_LABELS), dtype=np.float32)[[3]] * 100
+    faces = EmotionBatch([(10, 20, 30, 40)], scores)
+    scaled = rescale_faces(faces, DedupSource('a', 100, 50), 200, 25)
+    assert scaled.boxes.tolist() == [[20, 10, 60, 20]]
+    assert scaled.dominant.tolist() == [3]
+    assert rescale_faces(faces, DedupSource('a', 0, 0), 200, 25).boxes.tolist() == [[10, 20, 30, 40]]
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pytest
+
+from emotion_engine import (EMOTION_INPUT_SIZE, EMOTION_LABELS, SHARED_WEIGHTS_ENV, NumpyEmotionModel,
+                            default_weights_path, export_weights, load_emotion_model, load_weights_mmap,
+                            predict_emotions, read_h5_weights, _quiet_option)
+
+# Kształty wag sieci emocji DeepFace w kolejności model.get_weights()
+WEIGHT_SHAPES = [(5, 5, 1, 64), (64,), (3, 3, 64, 64), (64,), (3, 3, 64, 64), (64,), (3, 3, 64, 128), (128,),
+                 (3, 3, 128, 128), (128,), (128, 1024), (1024,), (1024, 1024), (1024,), (1024, 7), (7,)]
+
+requires_weights = pytest.mark.skipif(not os.path.exists(default_weights_path()),
+                                      reason="brak pobranych wag modelu emocji DeepFace")
+
+
+def random_weights(seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.normal(0, 0.1, shape).astype(np.float32) for shape in WEIGHT_SHAPES]
+
+
+def random_faces(count, seed=1):
+    rng = np.random.default_rng(seed)
+    return rng.random((count, EMOTION_INPUT_SIZE, EMOTION_INPUT_SIZE, 1), dtype=np.float32)
+
+
+def test_numpy_model_returns_probabilities():
+    probabilities = NumpyEmotionModel(random_weights()).predict(random_faces(3))
+    assert probabilities.shape == (3, len(EMOTION_LABELS))
+    assert np.allclose(probabilities.sum(axis=1), 1, atol=1e-5)
+    assert (probabilities >= 0).all()
+
+
+def test_numpy_model_rejects_wrong_weight_count():
+    with pytest.raises(ValueError):
+        NumpyEmotionModel(random_weights()[:-1])
+
+
+def test_predict_emotions_one_row_per_box():
+    model = NumpyEmotionModel(random_weights())
+    image = np.random.default_rng(2).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+    batch = predict_emotions(model, image, [(0, 0, 60, 60), (50, 40, 100, 80)])
+    assert batch.boxes.tolist() == [[0, 0, 60, 60], [50, 40, 100, 80]]
+    assert batch.scores.shape == (2, len(EMOTION_LABELS))
+    assert np.allclose(batch.scores.sum(axis=1), 100, atol=1e-3)
+    assert len(predict_emotions(model, image, [])) == 0
+
+
+@requires_weights
+def test_mmap_export_round_trip(tmp_path):
+    directory = str(tmp_path / 'weights')
+    export_weights(default_weights_path(), directory)
+    mapped = load_weights_mmap(directory)
+    original = read_h5_weights(default_weights_path())
+    assert [array.shape for array in mapped] == WEIGHT_SHAPES
+    assert all(np.array_equal(a, b) for a, b in zip(mapped, original))
+    assert all(isinstance(array, np.memmap) for array in mapped)
+    faces = random_faces(2)
+    assert np.array_equal(NumpyEmotionModel(mapped).predict(faces), NumpyEmotionModel(original).predict(faces))
+
+
+@requires_weights
+def test_numpy_model_matches_keras(monkeypatch):
+    pytest.importorskip('tensorflow')
+    pytest.importorskip('deepface')
+    monkeypatch.delenv(SHARED_WEIGHTS_ENV, raising=False)
+    keras_model = load_emotion_model()
+    numpy_model = NumpyEmotionModel(read_h5_weights(default_weights_path()))
+    faces = random_faces(8)
+    expected = np.asarray(keras_model.predict(faces, verbose=0))
+    actual = numpy_model.predict(faces)
+    assert np.abs(actual - expected).max() < 1e-4
+    assert (actual.argmax(axis=1) == expected.argmax(axis=1)).all()
+
+
+def test_quiet_option_follows_installed_deepface_signature():
+    def analyze_0_0_75(img_path, actions=(), models=None, enforce_detection=True, detector_backend='opencv',
+                       prog_bar=True):
+        pass
+
+    def analyze_newer(img_path, actions=(), enforce_detection=True, detector_backend='opencv', silent=False):
+        pass
+
+    def analyze_unknown(img_path, actions=()):
+        pass
+
+    assert _quiet_option(analyze_0_0_75) == (('prog_bar', False),)
+    assert _quiet_option(analyze_newer) == (('silent', True),)
+    assert _quiet_option(analyze_unknown) == ()
@@ -0,0 +1,56 @@
+import numpy as np
+
+from emotion_engine import EMOTION_LABELS
+from emotion_history import EmotionHistory
+
+
+def one_hot(index, value=1.0):
+    scores = np.zeros(len(EMOTION_LABELS), dtype=np.float32)
+    scores[index] = value
+    return scores
+
+
+def test_empty_history_has_no_aggregates():
+    history = EmotionHistory(capacity=4)
+    assert len(history) == 0
+    assert history.rolling_mean() is None
+    assert history.dominant_share() is None
+    timestamps, scores, boxes = history.snapshot()
+    assert timestamps.shape == (0,) and scores.shape == (0, len(EMOTION_LABELS)) and boxes.shape == (0, 4)
+
+
+def test_snapshot_is_chronological_after_wraparound():
+    history = EmotionHistory(capacity=3)
+    for second in range(5):
+        history.append(float(second), one_hot(second % len(EMOTION_LABELS)), (second, 0, 1, 1))
+    timestamps, scores, boxes = history.snapshot()
+    assert len(history) == 3
+    np.testing.assert_array_equal(timestamps, [2.0, 3.0, 4.0])
+    np.testing.assert_array_equal(scores.argmax(axis=1), [2, 3, 4])
+    np.testing.assert_array_equal(boxes[:, 0], [2, 3, 4])
+
+
+def test_snapshot_returns_copies():
+    history = EmotionHistory(capacity=2)
+    history.append(0.0, one_hot(0))
+    _, scores, _ = history.snapshot()
+    scores[:] = 99
+    assert history.snapshot()[1].max() == 1.0
+
+
+def test_window_keeps_only_recent_samples():
+    history = EmotionHistory(capacity=10)
+    for second in range(6):
+        history.append(float(second), one_hot(0 if second < 3 else 3))
+    timestamps, _, _ = history.snapshot(window_seconds=2)
+    np.testing.assert_array_equal(timestamps, [3.0, 4.0, 5.0])
+    np.testing.assert_allclose(history.rolling_mean(window_seconds=2), one_hot(3))
+
+
+def test_dominant_share_sums_to_one():
+    history = EmotionHistory(capacity=8)
+    for index in (3, 3, 3, 6):
+        history.append(0.0, one_hot(index))
+    share = history.dominant_share()
+    assert share.sum() == 1.0
+    assert share[3] == 0.75 and share[6] == 0.25
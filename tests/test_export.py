@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+
+import pytest
+
+from export import PARQUET_AVAILABLE, arrow_schema, available_formats, export_bytes, iter_csv
+
+ROWS = [
+    {'image_hash': 'a', 'face_index': 0, 'happy': 90.5, 'corrected_emotion': None},
+    {'image_hash': 'b', 'face_index': 1, 'happy': 10.0, 'corrected_emotion': 'sad'},
+]
+COLUMNS = [('image_hash', 'TEXT'), ('face_index', 'INTEGER'), ('happy', 'REAL'), ('corrected_emotion', 'TEXT')]
+
+requires_parquet = pytest.mark.skipif(not PARQUET_AVAILABLE, reason="brak pyarrow")
+
+
+def test_csv_has_header_and_rows():
+    data = export_bytes(iter(ROWS), 'CSV', batch_size=1).decode('utf-8')
+    parsed = list(csv.DictReader(io.StringIO(data)))
+    assert [row['image_hash'] for row in parsed] == ['a', 'b']
+    assert parsed[1]['corrected_emotion'] == 'sad'
+
+
+def test_csv_uses_given_columns_and_ignores_extra_keys():
+    data = export_bytes(iter(ROWS), 'CSV', fieldnames=['image_hash']).decode('utf-8')
+    assert data.splitlines() == ['image_hash', 'a', 'b']
+
+
+def test_empty_csv_keeps_header_when_columns_are_known():
+    assert export_bytes(iter(()), 'CSV', fieldnames=['image_hash', 'happy']).decode('utf-8').strip() == \
+        'image_hash,happy'
+    assert export_bytes(iter(()), 'CSV') == b''
+    assert list(iter_csv(iter(()), [])) == []
+
+
+def test_jsonl_one_object_per_line():
+    lines = export_bytes(iter(ROWS), 'JSONL', batch_size=1).decode('utf-8').splitlines()
+    assert [json.loads(line) for line in lines] == ROWS
+    assert export_bytes(iter(()), 'JSONL') == b''
+
+
+def test_unknown_format_raises():
+    with pytest.raises(ValueError):
+        export_bytes(iter(ROWS), 'XLSX')
+
+
+@requires_parquet
+def test_parquet_round_trip_across_batches():
+    import pyarrow.parquet as pq
+    data = export_bytes(iter(ROWS), 'Parquet', schema=arrow_schema(COLUMNS), batch_size=1)
+    table = pq.read_table(io.BytesIO(data))
+    assert table.to_pylist() == ROWS
+    assert str(table.schema.field('face_index').type) == 'int64'
+    assert 'Parquet' in available_formats()
+
+
+@requires_parquet
+def test_empty_parquet_is_valid_file_with_schema():
+    import pyarrow.parquet as pq
+    data = export_bytes(iter(()), 'Parquet', fieldnames=[name for name, _ in COLUMNS],
+                        schema=arrow_schema(COLUMNS))
+    assert data
+    table = pq.read_table(io.BytesIO(data))
+    assert table.num_rows == 0
+    assert table.schema.names == [name for name, _ in COLUMNS]
+    assert str(table.schema.field('happy').type) == 'double'
+
+
+@requires_parquet
+def test_empty_parquet_without_schema_uses_string_columns():
+    import pyarrow.parquet as pq
+    table = pq.read_table(io.BytesIO(export_bytes(iter(()), 'Parquet', fieldnames=['image_hash'])))
+    assert table.num_rows == 0
+    assert str(table.schema.field('image_hash').type) == 'string'
@@ -0,0 +1,128 @@
+import cv2
+import numpy as np
+import pytest
+
+import face_detection
+from emotion_engine import HAAR_MIN_NEIGHBORS
+from face_detection import (DETECTOR_HAAR, CascadeFaceDetector, FaceDetections, detection_image, detector_key,
+                            haar_confidence, haar_faces)
+
+
+def detections(*confidences, detector=DETECTOR_HAAR):
+    boxes = np.asarray([(10 * index, 0, 50, 50) for index in range(len(confidences))], dtype=np.int32).reshape(-1, 4)
+    return FaceDetections(boxes, np.asarray(confidences, dtype=np.float32), detector)
+
+
+@pytest.fixture
+def fake_heavy(monkeypatch):
+    """Cięższy detektor zastępczy zwracający zadane ramki; liczy wywołania"""
+    calls = []
+    found = []
+
+    def detect(model, image):
+        calls.append(image.shape)
+        return list(found)
+
+    monkeypatch.setitem(face_detection._HEAVY_DETECTORS, 'fake', (lambda: object(), detect))
+    return calls, found
+
+
+def use_haar(monkeypatch, result):
+    monkeypatch.setattr(face_detection, 'haar_faces', lambda image, max_width: result)
+
+
+def test_haar_confidence_is_calibrated_on_neighbor_excess():
+    confidences = haar_confidence(np.array([0, HAAR_MIN_NEIGHBORS, HAAR_MIN_NEIGHBORS + 1,
+                                            HAAR_MIN_NEIGHBORS + face_detection.HAAR_CONFIDENCE_HALF, 1000]))
+    assert confidences[0] == confidences[1] == 0
+    assert 0 < confidences[2] < 0.1
+    assert confidences[3] == pytest.approx(0.5)
+    assert 0.99 < confidences[4] < 1
+    assert (np.diff(confidences) >= 0).all()
+
+
+def test_gated_keeps_boxes_at_or_above_threshold():
+    gated = detections(0.2, 0.5, 0.9).gated(0.5)
+    assert gated.confidences.tolist() == pytest.approx([0.5, 0.9])
+    assert gated.boxes[:, 0].tolist() == [10, 20]
+    assert gated.detector == DETECTOR_HAAR
+
+
+def test_detector_key_includes_threshold_only_for_cascade():
+    assert detector_key('cascade', 0.5) == 'cascade>=50'
+    assert detector_key('cascade', 0.0) == 'cascade>=0'
+    assert detector_key('cascade-best', 0.0) == 'cascade-best>=0'
+    assert detector_key('opencv', 0.5) == 'opencv'
+
+
+def test_detection_image_downscales_wide_images_only():
+    image = np.zeros((480, 1280, 3), dtype=np.uint8)
+    small, scale = detection_image(image, 640)
+    assert small.shape[:2] == (240, 640) and scale == 2.0
+    same, scale = detection_image(image[:, :600], 640)
+    assert same.shape[1] == 600 and scale == 1.0
+
+
+def test_blank_image_has_no_faces():
+    result = haar_faces(np.full((200, 300, 3), 128, dtype=np.uint8))
+    assert result.boxes.shape == (0, 4) and len(result.confidences) == 0
+
+
+def test_clear_frontal_face_passes_default_threshold():
+    cbook = pytest.importorskip('matplotlib.cbook')
+    with cbook.get_sample_data('grace_hopper.jpg') as sample:
+        image = cv2.imdecode(np.frombuffer(sample.read(), dtype=np.uint8), cv2.IMREAD_COLOR)
+    result = haar_faces(image)
+    assert len(result.gated(0.5).boxes) == 1
+
+
+def test_confident_haar_skips_heavy_detector(monkeypatch, fake_heavy):
+    calls, _ = fake_heavy
+    use_haar(monkeypatch, detections(0.8))
+    result = CascadeFaceDetector(['fake']).detect(np.zeros((100, 100, 3), np.uint8), 0.5)
+    assert result.detector == DETECTOR_HAAR and len(result.boxes) == 1
+    assert calls == []
+
+
+def test_weak_haar_box_goes_to_heavy_detector(monkeypatch, fake_heavy):
+    calls, found = fake_heavy
+    found.extend([((5, 5, 40, 40), 0.97), ((60, 5, 20, 20), 0.3)])
+    use_haar(monkeypatch, detections(0.8, 0.1))
+    result = CascadeFaceDetector(['fake'], max_width=50).detect(np.zeros((100, 100, 3), np.uint8), 0.5)
+    assert result.detector == 'fake'
+    # Ramka z pomniejszonego obrazu przeliczona na oryginał, słaba ramka odrzucona
+    assert result.boxes.tolist() == [[10, 10, 80, 80]]
+    assert calls == [(50, 50, 3)]
+
+
+def test_heavy_detector_without_faces_falls_back_to_gated_haar(monkeypatch, fake_heavy):
+    use_haar(monkeypatch, detections(0.8, 0.1))
+    result = CascadeFaceDetector(['fake']).detect(np.zeros((100, 100, 3), np.uint8), 0.5)
+    assert result.detector == DETECTOR_HAAR
+    assert result.confidences.tolist() == pytest.approx([0.8])
+
+
+def test_no_fallback_and_no_faces_gives_empty_result(monkeypatch, fake_heavy):
+    calls, _ = fake_heavy
+    use_haar(monkeypatch, detections(0.1))
+    detector = CascadeFaceDetector(['fake'])
+    assert len(detector.detect(np.zeros((100, 100, 3), np.uint8), 0.5, fallback=False).boxes) == 0
+    assert len(detector.detect(np.zeros((100, 100), np.uint8), 0.5).boxes) == 0
+    assert calls == []
+
+
+def test_broken_heavy_detector_is_not_rebuilt(monkeypatch):
+    builds = []
+
+    def build():
+        builds.append(1)
+        raise ImportError('brak pakietu')
+
+    monkeypatch.setitem(face_detection._HEAVY_DETECTORS, 'broken', (build, None))
+    use_haar(monkeypatch, detections())
+    detector = CascadeFaceDetector(['broken', 'nieznany'])
+    assert detector.fallbacks == ['broken']
+    for _ in range(2):
+        assert len(detector.detect(np.zeros((100, 100, 3), np.uint8), 0.5).boxes) == 0
+    assert builds == [1]
+    assert detector.errors == {'broken': 'brak pakietu'}
@@ -0,0 +1,108 @@
+import os
+import time
+
+import av
+import numpy as np
+import pytest
+
+from capture_policy import CAPTURE_TIERS
+from frame_store import DATA_FILE, INDEX_DTYPE, INDEX_FILE, FrameRecorder, FrameStore, replay
+
+
+def gray_frame(value, pts=None, size=(32, 48)):
+    frame = av.VideoFrame.from_ndarray(np.full(size, value, dtype=np.uint8), format='gray')
+    frame.pts = pts
+    return frame
+
+
+def bgr_frame(value):
+    array = np.zeros((16, 24, 3), dtype=np.uint8)
+    array[..., 2] = value
+    return av.VideoFrame.from_ndarray(array, format='bgr24')
+
+
+@pytest.fixture
+def recording(tmp_path):
+    directory = str(tmp_path / 'nagranie')
+    recorder = FrameRecorder(directory, CAPTURE_TIERS[1])
+    for index in range(5):
+        recorder.record(gray_frame(10 * index, pts=index * 3000))
+    recorder.close()
+    return directory
+
+
+def test_record_then_read_round_trip(recording):
+    store = FrameStore(recording)
+    assert len(store) == 5
+    assert store.format == 'gray' and store.tier == CAPTURE_TIERS[1]
+    assert list(store.timestamps) == sorted(store.timestamps) and store.timestamps[0] == 0
+    for index in range(5):
+        array = store.array(index)
+        assert isinstance(array, np.memmap) and array.shape == (32, 48)
+        assert (array == 10 * index).all()
+        frame = store.frame(index)
+        assert frame.format.name == 'gray' and frame.pts == index * 3000
+    description = store.describe()
+    assert description['frames'] == 5 and description['size'] == '48x32' and description['tier'] == 'standardowa'
+
+
+def test_multi_plane_format_and_missing_pts(tmp_path):
+    directory = str(tmp_path / 'bgr')
+    recorder = FrameRecorder(directory)
+    recorder.record(bgr_frame(200))
+    recorder.record(gray_frame(0, size=(16, 24)))  # Inny format - przekonwertowany do formatu nagrania
+    recorder.close()
+    store = FrameStore(directory)
+    assert store.format == 'bgr24' and store.tier is None
+    assert store.array(0).shape == (16, 24, 3) and (store.array(0)[..., 2] == 200).all()
+    assert store.array(1).shape == (16, 24, 3)
+    assert store.frame(0).pts is None
+
+
+def test_truncated_recording_drops_incomplete_frames(recording):
+    data_path = os.path.join(recording, DATA_FILE)
+    index_path = os.path.join(recording, INDEX_FILE)
+    # Awaria w trakcie zapisu: ostatnia klatka urwana w danych, a rekord indeksu w połowie
+    with open(data_path, 'r+b') as data:
+        data.truncate(os.path.getsize(data_path) - 100)
+    with open(index_path, 'ab') as index:
+        index.write(b'\x00' * (INDEX_DTYPE.itemsize // 2))
+    store = FrameStore(recording)
+    assert len(store) == 4
+    assert (store.array(3) == 30).all()
+
+
+def test_recording_without_frames(tmp_path):
+    directory = str(tmp_path / 'puste')
+    recorder = FrameRecorder(directory)
+    recorder.record(gray_frame(0))
+    recorder.close()
+    with open(os.path.join(directory, DATA_FILE), 'wb'):
+        pass
+    store = FrameStore(directory)
+    assert len(store) == 0 and store.duration == 0.0
+    assert store.describe()['size'] == ''
+
+
+def test_recording_stops_after_max_seconds_and_after_close(tmp_path):
+    recorder = FrameRecorder(str(tmp_path / 'limit'), max_seconds=0.01)
+    recorder.record(gray_frame(0))
+    time.sleep(0.02)
+    recorder.record(gray_frame(1))
+    assert recorder.closed and recorder.frames == 1
+    recorder.record(gray_frame(2))
+    assert recorder.frames == 1
+
+
+def test_replay_feeds_every_frame_in_order(recording):
+    class Processor:
+        def __init__(self):
+            self.values = []
+
+        def recv(self, frame):
+            self.values.append(int(frame.to_ndarray()[0, 0]))
+
+    processor = Processor()
+    recv_seconds = replay(FrameStore(recording), processor, speed=0)
+    assert processor.values == [0, 10, 20, 30, 40]
+    assert len(recv_seconds) == 5
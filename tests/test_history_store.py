@@ -0,0 +1,118 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from emotion_engine import EMOTION_LABELS, EmotionBatch
+from history_store import HistoryStore, image_hash
+
+HAPPY = EMOTION_LABELS.index('happy')
+SAD = EMOTION_LABELS.index('sad')
+
+
+def faces(*dominant_confidences, box=(10, 20, 30, 40)):
+    """Paczka twarzy: dla każdej (indeks emocji, pewność w %) reszta rozłożona równo"""
+    scores = []
+    for index, confidence in dominant_confidences:
+        row = np.full(len(EMOTION_LABELS), (100 - confidence) / (len(EMOTION_LABELS) - 1), dtype=np.float32)
+        row[index] = confidence
+        scores.append(row)
+    return EmotionBatch([box] * len(scores), scores)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / 'history.db'))
+
+
+def test_image_hash_is_content_sha256():
+    assert image_hash(b'abc') == image_hash(b'abc') != image_hash(b'abd')
+    assert len(image_hash(b'')) == 64
+
+
+def test_lookup_missing_image_returns_none(store):
+    assert store.lookup('brak', 'cascade>=50') is None
+
+
+def test_record_and_lookup_round_trip(store):
+    batch = faces((HAPPY, 80.0), (SAD, 60.0))
+    store.record('img', batch, 'cascade>=50', latency_ms=12.5, image_size=(640, 480))
+    found = store.lookup('img', 'cascade>=50')
+    assert len(found) == 2
+    assert found.dominant_emotions() == ['happy', 'sad']
+    np.testing.assert_array_equal(found.boxes, batch.boxes)
+    np.testing.assert_allclose(found.scores, batch.scores, rtol=1e-6)
+
+
+def test_lookup_is_per_detector_and_returns_latest_analysis(store):
+    store.record('img', faces((HAPPY, 80.0)), 'cascade>=50')
+    store.record('img', faces((SAD, 70.0), (SAD, 65.0)), 'cascade>=50')
+    assert store.lookup('img', 'opencv') is None
+    assert store.lookup('img', 'cascade>=50').dominant_emotions() == ['sad', 'sad']
+
+
+def test_empty_batch_writes_nothing(store):
+    store.record('img', EmotionBatch.empty(), 'cascade>=50')
+    assert store.lookup('img', 'cascade>=50') is None
+    assert store.latest_id() == 0
+
+
+def test_dedup_entries_skip_copied_results(store):
+    store.record('source', faces((HAPPY, 80.0)), 'cascade>=50', perceptual_hash=-5, image_size=(100, 50))
+    store.record('copy', faces((HAPPY, 80.0)), 'cascade>=50', perceptual_hash=-4, image_size=(200, 100),
+                 deduped_from='source')
+    assert list(store.iter_dedup_entries()) == [('cascade>=50', -5, 'source', 100, 50)]
+    assert store.dedup_hit_count() == 1
+
+
+def test_emotion_distribution_per_day(store):
+    store.record('a', faces((HAPPY, 80.0), (HAPPY, 70.0), (SAD, 90.0)), 'cascade>=50')
+    counts = {emotion: count for _, emotion, count in store.emotion_distribution_per_day()}
+    assert counts == {'happy': 2, 'sad': 1}
+
+
+def test_gallery_filters_sort_and_page(store):
+    store.record('a', faces((HAPPY, 90.0), (SAD, 40.0)), 'cascade>=50')
+    store.record('b', faces((HAPPY, 60.0)), 'cascade>=50')
+    assert store.count_faces() == 3
+    assert store.count_faces(emotion='happy') == 2
+    assert store.count_faces(min_confidence=50) == 2
+    assert store.count_faces(image_hashes=['b']) == 1
+
+    by_confidence = store.query_faces(sort='confidence', descending=True)
+    assert [round(face['confidence']) for face in by_confidence] == [90, 60, 40]
+    second_page = store.query_faces(sort='confidence', descending=True, limit=2, offset=2)
+    assert [round(face['confidence']) for face in second_page] == [40]
+    newest = store.query_faces(sort='newest', descending=True, limit=1)
+    assert newest[0]['image_hash'] == 'b'
+
+
+def test_gallery_shows_only_latest_analysis_of_an_image(store):
+    store.record('a', faces((HAPPY, 90.0), (HAPPY, 80.0)), 'cascade>=50')
+    store.record('a', faces((SAD, 70.0)), 'cascade>=60')
+    assert store.count_faces() == 1
+    assert store.query_faces()[0]['dominant_emotion'] == 'sad'
+
+
+def test_iter_rows_streams_every_row(store):
+    store.record('a', faces((HAPPY, 90.0), (SAD, 80.0)), 'cascade>=50')
+    store.record('b', faces((HAPPY, 60.0)), 'cascade>=50')
+    rows = list(store.iter_rows(batch_size=1))
+    assert [row['image_hash'] for row in rows] == ['a', 'a', 'b']
+    assert set(name for name, _ in store.columns()) >= {'image_hash', 'dominant_emotion', *EMOTION_LABELS}
+
+
+def test_old_database_gets_added_columns(tmp_path):
+    path = str(tmp_path / 'old.db')
+    connection = sqlite3.connect(path)
+    connection.execute(
+        f"CREATE TABLE analyses (id INTEGER PRIMARY KEY, image_hash TEXT NOT NULL, created_at REAL NOT NULL, "
+        f"day TEXT NOT NULL, detector TEXT NOT NULL, latency_ms REAL, face_index INTEGER NOT NULL, "
+        f"x INTEGER, y INTEGER, w INTEGER, h INTEGER, {', '.join(f'{label} REAL' for label in EMOTION_LABELS)}, "
+        f"dominant_emotion TEXT NOT NULL, corrected_emotion TEXT)"
+    )
+    connection.commit()
+    connection.close()
+    store = HistoryStore(path)
+    store.record('a', faces((HAPPY, 90.0)), 'opencv', perceptual_hash=1, image_size=(10, 10))
+    assert list(store.iter_dedup_entries()) == [('opencv', 1, 'a', 10, 10)]
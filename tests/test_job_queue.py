@@ -0,0 +1,159 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from job_queue import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobQueue
+
+
+def noop(params, report):
+    return params
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'jobs.db')
+
+
+@pytest.fixture
+def queue(db_path):
+    queue = JobQueue(db_path)
+    queue.register('noop', noop)
+    return queue
+
+
+def wait_for(queue, job_id, statuses, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Zadanie {job_id} nie osiągnęło stanu {statuses}: {queue.get(job_id)['status']}")
+
+
+def test_claim_takes_highest_priority_then_oldest(queue):
+    low = queue.submit('noop', {}, priority=0)
+    first_high = queue.submit('noop', {}, priority=5)
+    second_high = queue.submit('noop', {}, priority=5)
+    assert [queue._claim()['id'] for _ in range(3)] == [first_high, second_high, low]
+    assert queue._claim() is None
+    job = queue.get(low)
+    assert job['status'] == RUNNING and job['owner_token'] == queue.token and job['heartbeat_at'] is not None
+
+
+def test_submit_with_same_key_reuses_active_or_done_job(queue):
+    job_id = queue.submit('noop', {'a': 1}, key='k')
+    assert queue.submit('noop', {'a': 1}, key='k') == job_id
+    queue.cancel(job_id)
+    assert queue.get(job_id)['status'] == CANCELLED
+    assert queue.submit('noop', {'a': 1}, key='k') != job_id
+
+
+def test_unknown_kind_is_rejected(queue):
+    with pytest.raises(ValueError):
+        queue.submit('brak', {})
+
+
+def test_cancel_running_job_is_cooperative(queue):
+    job_id = queue.submit('noop', {})
+    queue._claim()
+    queue.cancel(job_id)
+    job = queue.get(job_id)
+    assert job['status'] == RUNNING and job['cancel_requested'] == 1
+
+
+def test_workers_run_jobs_to_completion(queue):
+    def failing(params, report):
+        raise RuntimeError('zepsute')
+
+    submitted = threading.Event()
+    job_ids = {}
+
+    def cancelled_midway(params, report):
+        submitted.wait(5)
+        queue.cancel(job_ids['cancelled'])
+        time.sleep(0.6)
+        report(0.5)
+        return 'nie powinno dojść'
+
+    queue.register('failing', failing)
+    queue.register('cancelled', cancelled_midway)
+    done = queue.submit('noop', {'x': [1, 2]})
+    failed = queue.submit('failing', {})
+    queue.start()
+    assert wait_for(queue, done, (DONE,))['result'] == {'x': [1, 2]}
+    assert wait_for(queue, done, (DONE,))['progress'] == 1
+    assert wait_for(queue, failed, (FAILED,))['error'] == 'zepsute'
+
+    cancelled = job_ids['cancelled'] = queue.submit('cancelled', {})
+    submitted.set()
+    assert wait_for(queue, cancelled, (CANCELLED, DONE))['status'] == CANCELLED
+    assert queue.queue_depth() == 0
+
+
+def test_recover_orphans_requeues_only_silent_foreign_jobs(db_path):
+    owner = JobQueue(db_path, heartbeat_timeout=30)
+    owner.register('noop', noop)
+    alive = owner.submit('noop', {})
+    silent = owner.submit('noop', {})
+    owner._claim()
+    owner._claim()
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - 60, silent))
+
+    # Nowa instancja (np. inny worker prefork.py albo proces po restarcie) przejmuje tylko zadanie bez sygnału
+    other = JobQueue(db_path, heartbeat_timeout=30)
+    assert owner.get(silent)['status'] == QUEUED
+    assert owner.get(silent)['owner_token'] is None
+    assert owner.get(alive)['status'] == RUNNING
+    # Własnych zadań instancja nie przejmuje, nawet gdy sygnał jest stary
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - 60, alive))
+    assert owner.recover_orphans() == 0
+    owner.heartbeat()
+    assert other.recover_orphans() == 0
+    assert owner.get(alive)['heartbeat_at'] > time.time() - 5
+
+
+def test_old_database_is_migrated_and_running_jobs_recovered(db_path):
+    connection = sqlite3.connect(db_path)
+    connection.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, job_key TEXT, priority INTEGER NOT NULL DEFAULT 0, "
+        "status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, params TEXT NOT NULL, result TEXT, error TEXT, "
+        "cancel_requested INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+    )
+    connection.execute("INSERT INTO jobs (id, kind, status, params, created_at) VALUES ('old', 'noop', ?, '{}', ?)",
+                       (RUNNING, time.time()))
+    connection.commit()
+    connection.close()
+    queue = JobQueue(db_path)
+    job = queue.get('old')
+    assert job['status'] == QUEUED
+    assert 'owner_token' in job and 'heartbeat_at' in job
+
+
+def test_taken_over_job_is_not_overwritten_by_previous_owner(db_path):
+    stale = JobQueue(db_path)
+    reports = []
+
+    def slow(params, report):
+        # Po przejęciu zadania przez inną instancję raport postępu przerywa pracę
+        reports.append(1)
+        report(0.5)
+        reports.append(2)
+        return 'stary wynik'
+
+    stale.register('slow', slow)
+    job_id = stale.submit('slow', {})
+    job = stale._claim()
+    new_owner = JobQueue(db_path)
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("UPDATE jobs SET owner_token = ?, progress = 0.25 WHERE id = ?", (new_owner.token, job_id))
+
+    stale._run(job['id'], job['kind'], {})
+    job = stale.get(job_id)
+    assert reports == [1]
+    assert job['status'] == RUNNING and job['owner_token'] == new_owner.token
+    assert job['result'] is None and job['progress'] == 0.25
@@ -0,0 +1,79 @@
+import av
+import numpy as np
+import pytest
+
+import live_processor
+from capture_policy import CAPTURE_TIERS
+from emotion_engine import EMOTION_LABELS, EmotionBatch
+from live_processor import VideoProcessor, analysis_gray
+
+
+def yuv_frame(width, height, value=128):
+    return av.VideoFrame.from_ndarray(np.full((height, width, 3), value, dtype=np.uint8),
+                                      format='bgr24').reformat(format='yuv420p')
+
+
+class StubEngine:
+    """analyze_lean zwracające zadane ramki (w pikselach obrazu analizy)"""
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+        self.inputs = []
+
+    def analyze_lean(self, gray):
+        self.inputs.append(gray.shape)
+        scores = np.eye(len(EMOTION_LABELS), dtype=np.float32)[[EMOTION_LABELS.index('happy')] * len(self.boxes)]
+        return EmotionBatch(self.boxes, 100 * scores), 'numpy'
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    stub = StubEngine([(40, 30, 100, 100)])
+    monkeypatch.setattr(live_processor, 'get_engine', lambda: stub)
+    return stub
+
+
+def test_analysis_gray_downscales_wide_frames():
+    gray, scale = analysis_gray(yuv_frame(1280, 720), max_width=640)
+    assert gray.shape == (360, 640) and gray.dtype == np.uint8 and scale == 2.0
+    assert abs(int(gray.mean()) - 128) <= 2
+
+
+def test_analysis_gray_keeps_small_frames():
+    gray, scale = analysis_gray(yuv_frame(320, 240), max_width=640)
+    assert gray.shape == (240, 320) and scale == 1.0
+
+
+def test_only_every_nth_frame_is_analysed_and_boxes_scaled(engine, monkeypatch):
+    monkeypatch.setattr(live_processor, 'ANALYSIS_MAX_WIDTH', 640)
+    processor = VideoProcessor(CAPTURE_TIERS[2])  # 10 FPS - analiza co 10 klatek
+    try:
+        for _ in range(21):
+            processor.recv(yuv_frame(1280, 720))
+    finally:
+        processor.on_ended()
+    assert engine.inputs == [(360, 640)] * 3
+    # Ramka z obrazu analizy przeliczona na pełną klatkę
+    assert processor.latest_emotion_result.box == (80, 60, 200, 200)
+    assert len(processor.history) == 3
+
+
+def test_frame_without_overlay_is_returned_unchanged(monkeypatch):
+    monkeypatch.setattr(live_processor, 'get_engine', lambda: StubEngine([]))
+    processor = VideoProcessor(CAPTURE_TIERS[2])
+    frame = yuv_frame(320, 240)
+    try:
+        assert processor.recv(frame) is frame
+    finally:
+        processor.on_ended()
+    assert processor.overlay is None and len(processor.history) == 0
+
+
+def test_frame_with_overlay_is_drawn(engine):
+    processor = VideoProcessor(CAPTURE_TIERS[2])
+    try:
+        result = processor.recv(yuv_frame(320, 240, value=0))
+    finally:
+        processor.on_ended()
+    assert result.format.name == 'bgr24'
+    assert result.to_ndarray().any()
@@ -0,0 +1,82 @@
+import gc
+import tracemalloc
+
+import pytest
+
+import memory_manager
+from memory_manager import MemoryManager, get_memory_breakdown, get_rss_mb
+
+
+@pytest.fixture
+def gc_calls(monkeypatch):
+    """Wywołania gc.collect zamiast faktycznego odśmiecania"""
+    calls = []
+    monkeypatch.setattr(gc, 'collect', lambda *generation: calls.append(generation) or 0)
+    return calls
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    """Sterowany RSS procesu w MB: lista kolejnych odczytów (ostatni się powtarza)"""
+    readings = [100.0]
+
+    def read():
+        return readings.pop(0) if len(readings) > 1 else readings[0]
+
+    monkeypatch.setattr(memory_manager, 'get_rss_mb', read)
+    return readings
+
+
+@pytest.mark.parametrize('rss_mb, action, expected_calls', [
+    (100.0, 'none', []),
+    (1000.0, 'young', [(1,)]),
+    (1500.0, 'full', [()]),
+    (9000.0, 'full', [()]),
+])
+def test_reclaim_by_watermark(gc_calls, rss_mb, action, expected_calls):
+    manager = MemoryManager(soft_watermark_mb=1000, hard_watermark_mb=1500, use_tracemalloc=False)
+    assert manager.reclaim(rss_mb) == action
+    assert gc_calls == expected_calls
+
+
+def test_reclaim_reads_rss_when_not_given(gc_calls, rss):
+    rss[:] = [1200.0]
+    manager = MemoryManager(soft_watermark_mb=1000, hard_watermark_mb=1500, use_tracemalloc=False)
+    assert manager.reclaim() == 'young'
+
+
+def test_tracked_request_records_rss_and_reclaim(gc_calls, rss):
+    manager = MemoryManager(soft_watermark_mb=1000, hard_watermark_mb=1500, use_tracemalloc=False,
+                            history_size=2)
+    rss[:] = [100.0, 1600.0, 900.0]
+    with manager.track('analiza') as sample:
+        pass
+    assert sample['label'] == 'analiza'
+    assert (sample['rss_before_mb'], sample['rss_end_mb'], sample['rss_after_mb']) == (100.0, 1600.0, 900.0)
+    assert sample['reclaim'] == 'full'
+
+    rss[:] = [100.0, 200.0]
+    sample = manager.end_request(manager.begin_request('lekka'))
+    # Bez odśmiecania RSS po żądaniu to ten sam odczyt - bez ponownego pomiaru
+    assert sample['reclaim'] == 'none' and sample['rss_after_mb'] == 200.0
+    manager.end_request(manager.begin_request('trzecia'))
+    assert [entry['label'] for entry in manager.get_timeline()] == ['lekka', 'trzecia']
+    assert gc_calls == [()]
+
+
+def test_tracemalloc_reports_top_allocators(gc_calls):
+    manager = MemoryManager(soft_watermark_mb=1e9, hard_watermark_mb=1e9, use_tracemalloc=True, top_allocators=3)
+    try:
+        with manager.track('alokacja') as sample:
+            kept = [bytearray(1024) for _ in range(100)]
+        assert kept and 0 < len(sample['top_allocators']) <= 3
+        assert '_snapshot' not in sample
+    finally:
+        tracemalloc.stop()
+
+
+def test_real_rss_readings_are_positive():
+    assert get_rss_mb() > 0
+    breakdown = get_memory_breakdown()
+    if breakdown is not None:
+        assert breakdown['rss_mb'] > 0 and breakdown['uss_mb'] <= breakdown['rss_mb']
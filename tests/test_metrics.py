@@ -0,0 +1,152 @@
+import json
+import socket
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import metrics
+import tiered_engine
+from emotion_engine import SHARED_WEIGHTS_ENV, NumpyEmotionModel
+from metrics import MetricsRegistry, StageHistogram, remote_readiness
+from test_emotion_engine import random_weights
+from tiered_engine import TIER_LIGHT, TieredEmotionEngine
+
+BUCKETS = (0.01, 0.1, 1.0)
+
+
+def test_percentiles_from_recent_samples():
+    histogram = StageHistogram(BUCKETS)
+    assert histogram.percentile(50) is None
+    for milliseconds in range(1, 101):
+        histogram.observe(milliseconds / 1000)
+    assert histogram.percentile(0) == pytest.approx(0.001)
+    assert histogram.percentile(50) == pytest.approx(0.051)
+    assert histogram.percentile(95) == pytest.approx(0.095)
+    assert histogram.percentile(100) == pytest.approx(0.1)
+
+
+def test_recent_window_drops_old_samples_but_counts_all():
+    histogram = StageHistogram(BUCKETS, recent_size=3)
+    for seconds in (5.0, 0.001, 0.002, 0.003):
+        histogram.observe(seconds)
+    assert histogram.count == 4
+    assert histogram.percentile(100) == pytest.approx(0.003)
+
+
+def test_registry_percentile_and_summary_order():
+    registry = MetricsRegistry(BUCKETS)
+    assert registry.percentile('decode', 50) is None
+    registry.observe('annotation', 0.2)
+    registry.observe('decode', 0.02)
+    registry.observe('decode', 0.04)
+    with registry.time('własny_etap'):
+        pass
+    summary = registry.summary()
+    # Kolejność etapów jak w STAGES, nieznane etapy na końcu
+    assert [row['Etap'] for row in summary] == ['decode', 'annotation', 'własny_etap']
+    assert summary[0]['Liczba'] == 2 and summary[0]['Średnia (ms)'] == pytest.approx(30.0)
+
+
+def test_prometheus_buckets_are_cumulative():
+    registry = MetricsRegistry(BUCKETS)
+    for seconds in (0.005, 0.01, 0.05, 0.5, 3.0):
+        registry.observe('decode', seconds)
+    lines = registry.render_prometheus().splitlines()
+    name = 'emocje_stage_duration_seconds'
+    assert lines[:2] == [f'# HELP {name} Czas trwania etapów analizy emocji.', f'# TYPE {name} histogram']
+    assert lines[2:] == [
+        f'{name}_bucket{{stage="decode",le="0.01"}} 2',
+        f'{name}_bucket{{stage="decode",le="0.1"}} 3',
+        f'{name}_bucket{{stage="decode",le="1.0"}} 4',
+        f'{name}_bucket{{stage="decode",le="+Inf"}} 5',
+        f'{name}_sum{{stage="decode"}} 3.565000',
+        f'{name}_count{{stage="decode"}} 5',
+    ]
+
+
+def test_empty_registry_renders_only_header():
+    assert MetricsRegistry().render_prometheus().count('\n') == 2
+
+
+@pytest.fixture
+def probe_server(monkeypatch):
+    """Serwer sond na wolnym porcie (bez singletonu procesu); zwraca (port, ustawienie sondy)"""
+    monkeypatch.setattr(metrics, '_readiness_probe', None)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), metrics._MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1], metrics.set_readiness_probe
+    server.shutdown()
+    server.server_close()
+
+
+def get_status(port, path):
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=5) as response:
+            return response.status, response.read().decode('utf-8')
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode('utf-8')
+
+
+def stub_engine(ready=True, in_flight=0):
+    engine = TieredEmotionEngine(weights_path='/brak/wag.h5')
+    if ready:
+        engine.light_model = NumpyEmotionModel(random_weights())
+    engine.in_flight = in_flight
+    return engine
+
+
+def test_healthz_and_metrics_answer_without_engine(probe_server):
+    port, _ = probe_server
+    assert get_status(port, '/healthz') == (200, 'ok\n')
+    status, body = get_status(port, '/metrics')
+    assert status == 200 and body.startswith('# HELP emocje_stage_duration_seconds')
+    assert get_status(port, '/nieznana')[0] == 404
+    status, body = get_status(port, '/ready')
+    assert status == 503 and json.loads(body)['ready'] is False
+
+
+def test_ready_follows_engine_state(probe_server, monkeypatch):
+    monkeypatch.delenv(SHARED_WEIGHTS_ENV, raising=False)
+    port, set_probe = probe_server
+
+    set_probe(stub_engine(ready=False).readiness)
+    status, body = get_status(port, '/ready')
+    assert status == 503 and 'ładuje' in json.loads(body)['reason']
+
+    set_probe(stub_engine().readiness)
+    status, body = get_status(port, '/ready')
+    assert status == 200 and json.loads(body)['tier'] == TIER_LIGHT
+
+    monkeypatch.setattr(tiered_engine, 'READY_MAX_IN_FLIGHT', 2)
+    set_probe(stub_engine(in_flight=2).readiness)
+    status, body = get_status(port, '/ready')
+    assert status == 503 and json.loads(body)['reason'] == '2 analiz w toku (limit 2)'
+
+
+def test_failing_probe_reports_not_ready(probe_server):
+    port, set_probe = probe_server
+
+    def broken():
+        raise RuntimeError('zepsuta sonda')
+
+    set_probe(broken)
+    assert remote_readiness(port) == {'ready': False, 'reason': 'zepsuta sonda'}
+
+
+def test_workers_readiness_needs_every_worker(probe_server):
+    from prefork import workers_readiness
+    port, set_probe = probe_server
+    set_probe(lambda: {'ready': True, 'reason': ''})
+    closed_port = socket.socket()
+    closed_port.bind(('127.0.0.1', 0))
+    unused = closed_port.getsockname()[1]
+    closed_port.close()
+
+    assert workers_readiness({8501: port})['ready'] is True
+    state = workers_readiness({8501: port, 8502: unused})
+    assert state['ready'] is False and state['reason'].startswith(':8502')
+    assert state['workers']['8501']['ready'] is True
+    assert workers_readiness({}) == {'ready': False, 'reason': 'brak workerów', 'workers': {}}
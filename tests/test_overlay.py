@@ -0,0 +1,49 @@
+import numpy as np
+
+from emotion_engine import EMOTION_LABELS, EmotionResult
+from overlay import LABEL_COLOR, FaceOverlay, LabelCache, build_overlay, draw_overlay
+
+
+def happy(confidence, box=(40, 60, 50, 50)):
+    scores = np.zeros(len(EMOTION_LABELS), dtype=np.float32)
+    scores[EMOTION_LABELS.index('happy')] = confidence
+    return EmotionResult(scores, box)
+
+
+def test_confidences_in_one_bucket_share_a_bitmap(monkeypatch):
+    cache = LabelCache(bucket_size=5)
+    renders = []
+    render = LabelCache._render
+    monkeypatch.setattr(LabelCache, '_render', staticmethod(lambda *key: renders.append(key) or render(*key)))
+    first = cache.get('happy', 81.0)
+    assert cache.get('happy', 79.0) is first
+    assert cache.get('happy', 82.4) is first
+    assert cache.get('happy', 83.0) is not first
+    assert cache.get('sad', 80.0) is not first
+    assert renders == [('happy', 80), ('happy', 85), ('sad', 80)]
+
+
+def test_label_bitmap_has_background_and_text():
+    bitmap = LabelCache().get('happy', 90.0)
+    assert bitmap.dtype == np.uint8 and bitmap.ndim == 3
+    assert (bitmap == LABEL_COLOR).all(axis=2).any()
+    assert not (bitmap == LABEL_COLOR).all()
+
+
+def test_build_overlay_skips_invalid_boxes():
+    cache = LabelCache()
+    overlay = build_overlay(happy(77.0), cache)
+    assert overlay.box == (40, 60, 50, 50) and overlay.label is cache.get('happy', 75.0)
+    assert build_overlay(happy(77.0, box=(0, 0, 100, 100)), cache) is None
+
+
+def test_label_is_pasted_above_face_and_clipped_to_frame():
+    label = np.full((10, 30, 3), 7, dtype=np.uint8)
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    draw_overlay(frame, FaceOverlay((20, 40, 30, 30), label))
+    assert (frame[30:40, 20:50] == 7).all()
+
+    # Twarz przy górnej i prawej krawędzi - etykieta przycięta, bez wyjątku
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    draw_overlay(frame, FaceOverlay((85, 5, 10, 10), label))
+    assert (frame[0:5, 85:100] == 7).all()
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+import tiered_engine
+from emotion_engine import SHARED_WEIGHTS_ENV, NumpyEmotionModel
+from face_detection import DETECTOR_HAAR, FaceDetections
+from test_emotion_engine import random_weights
+from tiered_engine import TIER_LIGHT, TieredEmotionEngine, _is_layer_name_collision, light_analyze
+
+IMAGE = np.random.default_rng(0).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+
+
+class StubDetector:
+    """Detektor zwracający zadane ramki; zapisuje argumenty wywołań"""
+
+    def __init__(self, boxes, on_detect=None):
+        self.boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        self.calls = []
+        self.on_detect = on_detect
+
+    def detect(self, image, min_confidence=0.0, fallback=True):
+        self.calls.append((min_confidence, fallback))
+        if self.on_detect is not None:
+            self.on_detect()
+        return FaceDetections(self.boxes, np.ones(len(self.boxes), dtype=np.float32), DETECTOR_HAAR)
+
+
+class ForbiddenModel:
+    def predict(self, batch, verbose=0):
+        raise AssertionError("Model nie powinien być uruchamiany bez twarzy")
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """Silnik z lekkim modelem na losowych wagach; pełny poziom nigdy się nie ładuje"""
+    monkeypatch.delenv(SHARED_WEIGHTS_ENV, raising=False)
+    engine = TieredEmotionEngine(weights_path='/brak/wag.h5')
+    assert engine.light_error is not None and engine.tier is None
+    engine.light_model = NumpyEmotionModel(random_weights())
+    monkeypatch.setattr(engine, 'start_full_load', lambda: pytest.fail("pełny poziom nie powinien się ładować"))
+    return engine
+
+
+def use_detector(monkeypatch, detector):
+    monkeypatch.setattr(tiered_engine, 'get_face_detector', lambda: detector)
+    return detector
+
+
+def test_light_tier_serves_before_full_tier_is_ready(engine, monkeypatch):
+    detector = use_detector(monkeypatch, StubDetector([(10, 10, 50, 50), (80, 20, 60, 60)]))
+    faces, tier = engine.analyze(IMAGE, min_confidence=0.5)
+    assert tier == TIER_LIGHT and not engine.full_ready
+    assert faces.boxes.tolist() == [[10, 10, 50, 50], [80, 20, 60, 60]]
+    assert np.allclose(faces.scores.sum(axis=1), 100, atol=1e-3)
+    # Bez pełnego poziomu cięższe detektory (TensorFlow) nie są używane
+    assert detector.calls == [(0.5, False)]
+
+
+def test_other_detector_falls_back_to_light_tier(engine, monkeypatch):
+    use_detector(monkeypatch, StubDetector([(10, 10, 50, 50)]))
+    faces, tier = engine.analyze(IMAGE, detector='retinaface')
+    assert tier == TIER_LIGHT and len(faces) == 1
+
+
+def test_light_analyze_without_faces_skips_model(monkeypatch):
+    use_detector(monkeypatch, StubDetector([]))
+    faces = light_analyze(ForbiddenModel(), IMAGE)
+    assert len(faces) == 0 and faces.scores.shape == (0, 7)
+
+
+def test_in_flight_is_tracked_during_analysis(engine, monkeypatch):
+    seen = []
+    use_detector(monkeypatch, StubDetector([(10, 10, 50, 50)], on_detect=lambda: seen.append(engine.in_flight)))
+    engine.analyze(IMAGE)
+    engine.analyze_lean(IMAGE)
+    assert seen == [1, 1]
+    assert engine.in_flight == 0
+    assert engine.latency_seconds is not None and engine.last_inference_at is not None
+
+
+def test_in_flight_is_released_when_analysis_fails(engine, monkeypatch):
+    def fail():
+        raise RuntimeError('błąd detekcji')
+
+    use_detector(monkeypatch, StubDetector([], on_detect=fail))
+    with pytest.raises(RuntimeError):
+        engine.analyze(IMAGE)
+    assert engine.in_flight == 0
+
+
+def test_readiness_fields(engine, monkeypatch):
+    state = engine.readiness()
+    assert state['ready'] is True and state['reason'] == ''
+    assert state['tier'] == TIER_LIGHT and state['light_ready'] is True
+    assert state['full_ready'] is False and state['full_source'] is None
+    assert state['in_flight'] == 0 and state['latency_ms'] is None and state['last_inference_age_s'] is None
+
+    monkeypatch.setattr(tiered_engine, 'READY_REQUIRE_FULL', True)
+    assert engine.readiness()['reason'] == 'DeepFace jeszcze się ładuje'
+    monkeypatch.setattr(tiered_engine, 'READY_REQUIRE_FULL', False)
+    monkeypatch.setattr(tiered_engine, 'READY_MAX_IN_FLIGHT', 1)
+    engine.in_flight = 1
+    assert engine.readiness()['ready'] is False
+
+
+def test_analyze_without_any_tier_raises(monkeypatch):
+    monkeypatch.delenv(SHARED_WEIGHTS_ENV, raising=False)
+    engine = TieredEmotionEngine(weights_path='/brak/wag.h5')
+
+    def failed_load():
+        engine.full_error = 'No module named deepface'
+
+    monkeypatch.setattr(engine, '_load_full', failed_load)
+    with pytest.raises(RuntimeError, match='deepface'):
+        engine.analyze(IMAGE)
+    assert engine.readiness()['ready'] is False
+
+
+def test_only_layer_name_collision_is_retried():
+    assert _is_layer_name_collision(ValueError("All layer names should be unique. The model has 2 layers ..."))
+    assert not _is_layer_name_collision(TypeError("analyze() got an unexpected keyword argument 'silent'"))
+    assert not _is_layer_name_collision(ValueError("Invalid weights file"))
@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+import pytest
+
+import video_analysis
+from emotion_engine import EMOTION_LABELS
+from video_analysis import EmotionTimeline, analyze_video, iter_video_frames
+
+
+class UniformModel:
+    def predict(self, batch, verbose=0):
+        return np.full((len(batch), len(EMOTION_LABELS)), 1 / len(EMOTION_LABELS), dtype=np.float32)
+
+
+@pytest.fixture
+def video_path(tmp_path):
+    """Dwie sekundy szarych klatek 10 fps (bez twarzy)"""
+    path = str(tmp_path / 'clip.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("OpenCV bez kodeka MJPG")
+    for index in range(20):
+        writer.write(np.full((48, 64, 3), 10 * index, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_frames_are_sampled_at_requested_rate(video_path):
+    timestamps = [timestamp for timestamp, _ in iter_video_frames(video_path, sample_fps=2)]
+    assert timestamps == pytest.approx([0.0, 0.5, 1.0, 1.5])
+
+
+def test_progress_reaches_end_when_duration_is_known(video_path):
+    reports = []
+    result = analyze_video(video_path, UniformModel(), sample_fps=5, progress_callback=reports.append)
+    assert result['sampled_frames'] == 10
+    assert len(reports) == 10 and reports == sorted(reports)
+    assert reports[-1] == pytest.approx(0.9)
+
+
+def test_callback_runs_without_duration_so_cancellation_still_works(video_path, monkeypatch):
+    monkeypatch.setattr(video_analysis, 'get_video_duration', lambda path: 0.0)
+    reports = []
+
+    def cancel_on_third(fraction):
+        reports.append(fraction)
+        if len(reports) == 3:
+            raise RuntimeError('anulowano')
+
+    with pytest.raises(RuntimeError):
+        analyze_video(video_path, UniformModel(), sample_fps=5, progress_callback=cancel_on_third)
+    assert reports == [0.0, 0.0, 0.0]
+
+
+def test_timeline_averages_per_second():
+    timeline = EmotionTimeline()
+    happy = np.eye(len(EMOTION_LABELS))[EMOTION_LABELS.index('happy')] * 100
+    sad = np.eye(len(EMOTION_LABELS))[EMOTION_LABELS.index('sad')] * 100
+    timeline.add(0.2, happy)
+    timeline.add(0.7, happy)
+    timeline.add(1.1, sad)
+    rows = timeline.rows()
+    assert [(row['second'], row['faces'], row['dominant_emotion']) for row in rows] == [(0, 2, 'happy'), (1, 1, 'sad')]
+    assert timeline.to_csv().splitlines()[0].startswith('second,faces,angry')
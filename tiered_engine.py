@@ -0,0 +1,302 @@
+"""
+Dwupoziomowy silnik emocji: natychmiastowy model NumPy i pełny DeepFace.
+
+Lekki poziom czyta wagi modelu emocji wprost z pliku h5 (h5py, bez
+TensorFlow), wykrywa twarze kaskadą Haara i liczy przebieg w przód w NumPy -
+jest gotowy po ułamku sekundy od startu procesu. Import TensorFlow
+i DeepFace oraz rozgrzewka pełnego modelu odbywają się w wątku w tle;
+gdy się zakończą, analizy przechodzą na DeepFace. Jeśli pełny poziom nie
+załaduje się wcale (np. błąd importu TensorFlow), aplikacja dalej działa
+na poziomie lekkim. Zrzut sieci z model_snapshot.py (jeśli wyeksportowany)
+skraca ładowanie pełnego poziomu o budowę sieci i śledzenie Model.predict.
+W workerach prefork.py pełny poziom to ta sama sieć na wagach zmapowanych
+w procesie nadrzędnym - bez prywatnej kopii w TensorFlow na każdy worker.
+
+Twarze wykrywa kaskada z face_detection.py (Haar, a gdy to za mało - MTCNN
+lub RetinaFace); obraz bez twarzy daje pusty wynik bez przebiegu modelu.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from emotion_engine import (EmotionBatch, NumpyEmotionModel, SHARED_WEIGHTS_ENV, deepface_analyze,
+                            default_weights_path, load_shared_emotion_model, predict_emotions, read_h5_weights)
+from face_detection import DETECTOR_CASCADE, get_face_detector
+from metrics import REGISTRY as metrics, set_readiness_probe
+
+TIER_LIGHT = 'numpy'
+TIER_FULL = 'deepface'
+
+SOURCE_SNAPSHOT = 'snapshot'
+SOURCE_DEEPFACE = 'build'
+SOURCE_SHARED = 'shared'
+
+FULL_LOAD_ATTEMPTS = 3
+
+# Sonda /ready: gotowość dopiero po załadowaniu DeepFace (domyślnie wystarcza model lekki)
+READY_REQUIRE_FULL = os.environ.get('EMOCJE_READY_REQUIRE_FULL', '0') == '1'
+# Sonda /ready: powyżej tylu analiz w toku węzeł zgłasza niegotowość (0 = bez limitu)
+READY_MAX_IN_FLIGHT = int(os.environ.get('EMOCJE_READY_MAX_IN_FLIGHT', '8'))
+
+_LATENCY_SMOOTHING = 0.2
+
+
+def _is_layer_name_collision(error: Exception) -> bool:
+    """Błąd Keras po clear_session() w trakcie budowy modelu (powtórzone nazwy warstw)"""
+    return isinstance(error, ValueError) and 'layer names should be unique' in str(error)
+
+
+def light_analyze(model, img_bgr: np.ndarray, min_confidence: float = 0.0, fallback: bool = False) -> EmotionBatch:
+    """Detekcja kaskadą + bezpośredni przebieg modelu; wyniki wszystkich twarzy w jednej paczce.
+
+    Obraz BGR albo już w skali szarości (klatki na żywo - tylko Haar).
+    Bez twarzy z pewnością >= min_confidence - pusty wynik, model nie jest uruchamiany.
+    """
+    with metrics.time('face_detection'):
+        detections = get_face_detector().detect(img_bgr, min_confidence, fallback)
+    if not len(detections.boxes):
+        return EmotionBatch.empty()
+    with metrics.time('classification'):
+        return predict_emotions(model, img_bgr, detections.boxes)
+
+
+class TieredEmotionEngine:
+    """Serwuje wyniki od razu modelem lekkim, a po załadowaniu - pełnym DeepFace"""
+
+    def __init__(self, weights_path: Optional[str] = None):
+        self.weights_path = weights_path or default_weights_path()
+        self.light_model: Optional[NumpyEmotionModel] = None
+        self.light_error: Optional[str] = None
+        self.full_error: Optional[str] = None
+        self.light_ready_seconds: Optional[float] = None
+        self.full_ready_seconds: Optional[float] = None
+        # Skąd pochodzi sieć pełnego poziomu: zrzut SavedModel albo budowa przez DeepFace
+        self.full_source = SOURCE_DEEPFACE
+        self.snapshot_error: Optional[str] = None
+        self._full_ready = threading.Event()
+        self._full_thread: Optional[threading.Thread] = None
+        self._started = time.perf_counter()
+        # Analizy w toku i wygładzony czas ostatnich analiz - dla sondy gotowości
+        self.in_flight = 0
+        self.latency_seconds: Optional[float] = None
+        self.last_inference_at: Optional[float] = None
+        self._stats_lock = threading.Lock()
+        self._load_light()
+
+    def _load_light(self) -> None:
+        try:
+            shared_weights = os.environ.get(SHARED_WEIGHTS_ENV)
+            if shared_weights:
+                # Worker z prefork.py - wagi już zmapowane w procesie nadrzędnym
+                self.light_model = load_shared_emotion_model(shared_weights)
+            else:
+                self.light_model = NumpyEmotionModel(read_h5_weights(self.weights_path))
+            self.light_ready_seconds = time.perf_counter() - self._started
+        except Exception as e:
+            # Brak pliku wag (pobiera go dopiero DeepFace) lub brak h5py
+            self.light_error = str(e)
+
+    def start_full_load(self) -> None:
+        """Uruchamia ładowanie DeepFace w tle (tylko raz)"""
+        if self._full_thread is None:
+            self._full_thread = threading.Thread(target=self._load_full, name='emocje-deepface-loader', daemon=True)
+            self._full_thread.start()
+
+    def _load_full(self) -> None:
+        if os.environ.get(SHARED_WEIGHTS_ENV):
+            self._install_shared()
+            return
+        for attempt in range(FULL_LOAD_ATTEMPTS):
+            try:
+                import deepface  # noqa: F401 - brak pakietu to ImportError bez ponawiania
+                self._install_snapshot()
+                # Rozgrzewka: budowa modelu (bez zrzutu) i pierwszy przebieg (śledzenie grafu TF)
+                deepface_analyze(np.zeros((224, 224, 3), dtype=np.uint8), actions=['emotion'],
+                                 enforce_detection=False)
+                self.full_ready_seconds = time.perf_counter() - self._started
+                self._full_ready.set()
+                break
+            except ImportError as e:
+                self.full_error = str(e)
+                break
+            except Exception as e:
+                # Streamlit wywołuje keras.backend.clear_session() po każdym przebiegu skryptu;
+                # jeśli trafi w budowę modelu w tym wątku, nazwy warstw się powtarzają - ponawiamy.
+                # Każdy inny błąd jest trwały - zapisujemy go od razu
+                if attempt == FULL_LOAD_ATTEMPTS - 1 or not _is_layer_name_collision(e):
+                    self.full_error = f'{type(e).__name__}: {e}'
+                    break
+                time.sleep(0.5)
+        if self.light_model is None and self.light_error is not None and self._full_ready.is_set():
+            # Plik wag pojawił się po pobraniu przez DeepFace - lekki poziom też może już działać
+            self.light_error = None
+            self._load_light()
+
+    def _install_shared(self) -> None:
+        """Worker prefork.py: model na wspólnych wagach w cache DeepFace zamiast budowy sieci TF"""
+        if self.light_model is None:
+            self.full_error = self.light_error
+            return
+        try:
+            from model_snapshot import install_in_deepface
+            install_in_deepface(self.light_model)
+        except ImportError as e:
+            self.full_error = str(e)
+            return
+        self.full_source = SOURCE_SHARED
+        self.full_ready_seconds = time.perf_counter() - self._started
+        self._full_ready.set()
+
+    def _install_snapshot(self) -> None:
+        """Zrzut sieci z model_snapshot.py zamiast budowy przez DeepFace - gdy jest i jest poprawny"""
+        from model_snapshot import default_snapshot_path, install_in_deepface, load_snapshot
+        directory = default_snapshot_path()
+        if directory is None or self.full_source == SOURCE_SNAPSHOT:
+            return
+        try:
+            install_in_deepface(load_snapshot(directory, self.weights_path))
+            self.full_source = SOURCE_SNAPSHOT
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # Uszkodzony lub nieaktualny zrzut - budowa przez DeepFace jak bez zrzutu
+            self.snapshot_error = str(e)
+
+    @property
+    def full_ready(self) -> bool:
+        return self._full_ready.is_set()
+
+    @property
+    def tier(self) -> Optional[str]:
+        """Poziom, który obsłuży następną analizę (None gdy żaden nie jest gotowy)"""
+        if self.full_ready:
+            return TIER_FULL
+        if self.light_model is not None:
+            return TIER_LIGHT
+        return None
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Czeka na pełny poziom, gdy lekki jest niedostępny"""
+        if self.tier is not None:
+            return True
+        self.start_full_load()
+        # Czekamy na zakończenie wątku, a nie na sukces - nieudane ładowanie nie zawiesza analizy
+        self._full_thread.join(timeout)
+        return self.tier is not None
+
+    def wait_for_full(self, timeout: Optional[float] = None) -> bool:
+        """Czeka na pełny poziom DeepFace (np. przetwarzanie wsadowe zapisujące historię)"""
+        self.start_full_load()
+        self._full_thread.join(timeout)
+        return self.full_ready
+
+    @contextmanager
+    def _tracked(self) -> Iterator[None]:
+        with self._stats_lock:
+            self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._stats_lock:
+                self.in_flight -= 1
+                self.last_inference_at = time.time()
+                if self.latency_seconds is None:
+                    self.latency_seconds = seconds
+                else:
+                    self.latency_seconds += _LATENCY_SMOOTHING * (seconds - self.latency_seconds)
+
+    def analyze(self, img_bgr: np.ndarray, detector: str = DETECTOR_CASCADE,
+                min_confidence: float = 0.0) -> Tuple[EmotionBatch, str]:
+        """Analizuje obraz BGR; zwraca (wyniki twarzy, użyty poziom).
+
+        Domyślnie kaskada detekcji z progiem pewności ramek i klasyfikacją
+        modelem bieżącego poziomu; inna nazwa detektora - DeepFace.analyze
+        z tym backendem (gdy pełny poziom gotowy).
+        """
+        if not self.wait_until_ready():
+            raise RuntimeError(f"Model emocji niedostępny: {self.full_error or self.light_error}")
+        with self._tracked():
+            if detector == DETECTOR_CASCADE:
+                tier = self.tier
+                with metrics.time('detection_classification'):
+                    # Cięższe detektory importują TensorFlow - dopiero po załadowaniu pełnego poziomu
+                    return light_analyze(self.classification_model(), img_bgr, min_confidence,
+                                         fallback=tier == TIER_FULL), tier
+            if self.full_ready:
+                with metrics.time('detection_classification'):
+                    result = deepface_analyze(img_bgr, actions=['emotion'], enforce_detection=False,
+                                              detector_backend=detector)
+                return EmotionBatch.from_dicts(result if isinstance(result, list) else [result]), TIER_FULL
+            return light_analyze(self.light_model, img_bgr), TIER_LIGHT
+
+    def analyze_lean(self, img_bgr: np.ndarray) -> Tuple[EmotionBatch, str]:
+        """Jak analyze, ale zawsze ścieżką bezpośrednią (Haar + przebieg modelu, bez wyrównania).
+
+        Dla klatek na żywo - po załadowaniu pełnego poziomu używa sieci
+        Keras, lecz z pominięciem narzutu DeepFace.analyze na każde wywołanie.
+        Przyjmuje też obraz w skali szarości (bez ponownej konwersji).
+        """
+        if not self.wait_until_ready():
+            raise RuntimeError(f"Model emocji niedostępny: {self.full_error or self.light_error}")
+        tier = self.tier
+        with self._tracked():
+            return light_analyze(self.classification_model(), img_bgr), tier
+
+    def readiness(self) -> Dict[str, Any]:
+        """Stan dla sondy /ready - tylko odczyt pól, bez uruchamiania modelu"""
+        with self._stats_lock:
+            in_flight = self.in_flight
+            latency = self.latency_seconds
+            last_inference_at = self.last_inference_at
+        tier = self.tier
+        reasons = []
+        if tier is None:
+            reasons.append('model emocji jeszcze się ładuje')
+        elif READY_REQUIRE_FULL and tier != TIER_FULL:
+            reasons.append('DeepFace jeszcze się ładuje')
+        if READY_MAX_IN_FLIGHT and in_flight >= READY_MAX_IN_FLIGHT:
+            reasons.append(f'{in_flight} analiz w toku (limit {READY_MAX_IN_FLIGHT})')
+        return {
+            'ready': not reasons,
+            'reason': '; '.join(reasons),
+            'tier': tier,
+            'light_ready': self.light_model is not None,
+            'full_ready': self.full_ready,
+            'full_error': self.full_error,
+            'full_source': self.full_source if self.full_ready else None,
+            'full_ready_s': round(self.full_ready_seconds, 2) if self.full_ready_seconds is not None else None,
+            'in_flight': in_flight,
+            'latency_ms': round(1000 * latency, 1) if latency is not None else None,
+            'last_inference_age_s': round(time.time() - last_inference_at, 1) if last_inference_at else None,
+            'uptime_s': round(time.perf_counter() - self._started, 1),
+        }
+
+    def classification_model(self):
+        """Model do klasyfikacji paczek twarzy (classify_faces) - pełny, gdy gotowy"""
+        if self.full_ready:
+            from emotion_engine import load_emotion_model
+            return load_emotion_model()
+        if self.light_model is None:
+            self.wait_until_ready()
+        return self.light_model
+
+
+_engine: Optional[TieredEmotionEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> TieredEmotionEngine:
+    """Silnik wspólny dla procesu (aplikacja, procesory kamery, analiza wideo)"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = TieredEmotionEngine()
+            _engine.start_full_load()
+            set_readiness_probe(_engine.readiness)
+        return _engine
@@ -0,0 +1,139 @@
+"""
+Strumieniowa analiza emocji w plikach wideo.
+
+Klatki są dekodowane generatorem (plik nigdy nie jest wczytywany w całości),
+próbkowane z zadaną częstotliwością, a wycięte twarze trafiają do modelu
+paczkami. Wynikiem jest oś czasu emocji z rozdzielczością jednej sekundy.
+"""
+import csv
+import io
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from emotion_engine import EMOTION_LABELS, classify_faces, detect_faces_haar, preprocess_face
+
+DEFAULT_SAMPLE_FPS = 2.0
+DEFAULT_BATCH_SIZE = 32
+
+
+def iter_video_frames(video_path: str, sample_fps: float = DEFAULT_SAMPLE_FPS) -> Iterator[Tuple[float, np.ndarray]]:
+    """Generator próbkowanych klatek wideo: (czas w sekundach, klatka BGR).
+
+    Klatki pomijane są tylko pobierane (grab) bez dekodowania do tablicy.
+    """
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError("Nie udało się otworzyć pliku wideo")
+    try:
+        source_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, int(round(source_fps / sample_fps)))
+        frame_index = 0
+        while capture.grab():
+            if frame_index % step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                yield frame_index / source_fps, frame
+            frame_index += 1
+    finally:
+        capture.release()
+
+
+def get_video_duration(video_path: str) -> float:
+    """Długość wideo w sekundach na podstawie metadanych kontenera"""
+    capture = cv2.VideoCapture(video_path)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        return capture.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+    finally:
+        capture.release()
+
+
+class EmotionTimeline:
+    """Przyrostowa agregacja wyników do osi czasu z krokiem 1 s"""
+
+    def __init__(self):
+        self._sums: Dict[int, np.ndarray] = {}
+        self._counts: Dict[int, int] = {}
+
+    def add(self, timestamp: float, scores: np.ndarray) -> None:
+        second = int(timestamp)
+        if second not in self._sums:
+            self._sums[second] = np.zeros(len(EMOTION_LABELS), dtype=np.float64)
+            self._counts[second] = 0
+        self._sums[second] += scores
+        self._counts[second] += 1
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Wiersze osi czasu: sekunda, liczba twarzy, średnie wyniki i emocja dominująca"""
+        rows = []
+        for second in sorted(self._sums):
+            mean_scores = self._sums[second] / self._counts[second]
+            row: Dict[str, Any] = {'second': second, 'faces': self._counts[second]}
+            row.update({label: round(float(score), 2) for label, score in zip(EMOTION_LABELS, mean_scores)})
+            row['dominant_emotion'] = EMOTION_LABELS[int(np.argmax(mean_scores))]
+            rows.append(row)
+        return rows
+
+    def to_csv(self) -> str:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=['second', 'faces', *EMOTION_LABELS, 'dominant_emotion'])
+        writer.writeheader()
+        writer.writerows(self.rows())
+        return buffer.getvalue()
+
+
+def analyze_video(video_path: str,
+                  model,
+                  sample_fps: float = DEFAULT_SAMPLE_FPS,
+                  batch_size: int = DEFAULT_BATCH_SIZE,
+                  progress_callback: Optional[Callable[[float], None]] = None) -> Dict[str, Any]:
+    """Analizuje plik wideo; w pamięci trzymana jest najwyżej jedna paczka twarzy"""
+    timeline = EmotionTimeline()
+    duration = get_video_duration(video_path)
+    pending_faces: List[np.ndarray] = []
+    pending_timestamps: List[float] = []
+    sampled_frames = 0
+    last_timestamp = 0.0
+    progress = 0.0
+    start = time.perf_counter()
+
+    def flush():
+        scores = classify_faces(model, pending_faces)
+        for timestamp, face_scores in zip(pending_timestamps, scores):
+            timeline.add(timestamp, face_scores)
+        pending_faces.clear()
+        pending_timestamps.clear()
+
+    for timestamp, frame in iter_video_frames(video_path, sample_fps):
+        sampled_frames += 1
+        last_timestamp = timestamp
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        for x, y, w, h in detect_faces_haar(gray):
+            pending_faces.append(preprocess_face(gray[y:y + h, x:x + w]))
+            pending_timestamps.append(timestamp)
+        if len(pending_faces) >= batch_size:
+            flush()
+        if progress_callback is not None:
+            # Bez długości w metadanych (webm, strumienie) postęp stoi, ale wywołanie zostaje -
+            # kolejka zadań sprawdza w nim anulowanie
+            if duration > 0:
+                progress = min(1.0, timestamp / duration)
+            progress_callback(progress)
+
+    if pending_faces:
+        flush()
+
+    wall_seconds = time.perf_counter() - start
+    processed_seconds = max(duration, last_timestamp)
+    return {
+        'timeline': timeline,
+        'video_seconds': processed_seconds,
+        'wall_seconds': wall_seconds,
+        'sampled_frames': sampled_frames,
+        # Ile sekund wideo przetwarzamy na sekundę czasu rzeczywistego
+        'throughput': processed_seconds / wall_seconds if wall_seconds > 0 else 0.0,
+    }